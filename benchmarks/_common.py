@@ -0,0 +1,135 @@
+"""Shared helpers for the benchmark scripts: resource usage and baselines."""
+
+import json
+import os
+import platform
+import resource
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of another process (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15; fields[0] is field 3 (state)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def process_status(pid: int) -> Dict[str, int]:
+    """Threads and VmRSS/VmHWM (KiB) of another process (Linux /proc only)."""
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Threads", "VmRSS", "VmHWM"):
+                    status[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return status
+
+
+def machine_info() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def load_baseline(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(path: Path, results: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", "utf-8")
+
+
+def find_regressions(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    directions: Dict[str, str],
+    tolerance: float,
+) -> List[str]:
+    """
+    Compare gated results with a baseline.
+
+    `directions` maps result keys to "lower" or "higher" (which way is
+    better); a key regresses when it is worse than the baseline by more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    for key, direction in directions.items():
+        if key not in results or not baseline.get(key):
+            continue
+        current, reference = results[key], baseline[key]
+        change = (current - reference) / reference
+        worse = change > tolerance if direction == "lower" else -change > tolerance
+        if worse:
+            regressions.append(
+                f"{key}: {current:.4g} vs baseline {reference:.4g} ({change:+.1%})"
+            )
+    return regressions
+
+
+def print_table(title: str, rows: Dict[str, object]) -> None:
+    print(f"\n{title}")
+    width = max(len(key) for key in rows)
+    for key, value in rows.items():
+        if isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"  {key:<{width}}  {value}")
+
+
+def gate(
+    name: str,
+    results: Dict[str, float],
+    directions: Dict[str, str],
+    baseline_path: Optional[Path] = None,
+    save: bool = False,
+    tolerance: float = 0.2,
+) -> int:
+    """
+    Save or check a baseline; returns the process exit code (1 on regression).
+    """
+    baseline_path = baseline_path or BASELINE_DIR / f"{name}.json"
+    if save:
+        save_baseline(baseline_path, {**results, "machine": machine_info()})
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline first.")
+        return 0
+
+    regressions = find_regressions(results, baseline, directions, tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {tolerance:.0%} against {baseline_path}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {tolerance:.0%} against {baseline_path}.")
+    return 0
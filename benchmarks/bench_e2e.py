@@ -0,0 +1,306 @@
+"""
+End-to-end pipeline benchmark against a local fake Bilibili API and CDN.
+
+Runs `data_initialize` for N feeds x M episodes, then publishes new videos
+and drives `update_pod` + `update_episodes` until they are in the feeds.
+Reports wall time, episode and byte throughput, peak RSS, CPU time and API
+call counts, and compares them with a saved baseline.
+
+    python -m benchmarks.bench_e2e --feeds 5 --episodes 10 --new-episodes 2
+    python -m benchmarks.bench_e2e --save-baseline
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from bilibili_api import Credential, request_settings
+from bilibili_api.clients.AioHTTPClient import AioHTTPClient
+from bilibili_api.utils.network import register_client
+
+from src.bilipod.bp_class import Pod
+from src.bilipod.executing import data_initialize
+from src.bilipod.executing import update
+from src.bilipod.utils import metrics
+from src.bilipod.utils.bp_log import Logger
+from src.bilipod.utils.config_parser import (
+    BiliPodConfig,
+    FeedConfig,
+    LoginConfig,
+    ServerConfig,
+    StorageConfig,
+)
+from src.bilipod.utils.storage import close_database, open_database
+from src.bilipod.utils.stream_cache import STREAM_CACHE
+from src.bilipod.utils.tracing import latency_percentiles
+
+from ._common import cpu_seconds, gate, peak_rss_mb, print_table
+from .fake_bilibili import FakeBilibili, FakeConfig, serve
+
+downloader = importlib.import_module("src.bilipod.downloader.downloader")
+# The package re-exports functions under the module names, so import by path
+video_downloader = importlib.import_module(
+    "src.bilipod.downloader.video_downloader"
+)
+
+GATED = {
+    "init_wall_seconds": "lower",
+    "update_wall_seconds": "lower",
+    "init_episodes_per_second": "higher",
+    "download_mb_per_second": "higher",
+    "peak_rss_mb": "lower",
+    "cpu_seconds": "lower",
+}
+
+FFMPEG_COPY = """\
+import shutil, sys
+args = sys.argv[1:]
+inputs = [args[i + 1] for i, arg in enumerate(args) if arg == "-i"]
+shutil.copyfile(inputs[-1], args[-1])
+"""
+
+
+class RoutingClient(AioHTTPClient):
+    """bilibili_api client sending every request to the fake server."""
+
+    target = ""
+
+    async def request(self, method: str = "", url: str = "", **kwargs):
+        _, _, rest = url.partition("://")
+        url = f"{self.target}/{rest}"
+        return await super().request(method=method, url=url, **kwargs)
+
+
+def _ffmpeg_copy_shim(workdir: Path) -> str:
+    shim = workdir / "ffmpeg"
+    shim.write_text(f"#!{sys.executable}\n{FFMPEG_COPY}", encoding="utf-8")
+    shim.chmod(0o755)
+    return str(shim)
+
+
+def _real_audio_payload(workdir: Path, seconds: int) -> bytes:
+    """A fragmented AAC stream ffmpeg can transcode, like a DASH audio m4s."""
+    out = workdir / "payload.m4s"
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:a", "aac", "-b:a", "64k",
+            "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", str(out),
+        ],
+        check=True,
+    )  # fmt: skip
+    return out.read_bytes()
+
+
+def _start_fake_server(config: FakeConfig, payload):
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    process = context.Process(
+        target=serve, args=(config, payload, port_queue), daemon=True
+    )
+    process.start()
+    return process, port_queue.get(timeout=30)
+
+
+async def _fake_request(base_url: str, method: str, path: str, body=None) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.request(method, f"{base_url}{path}", json=body) as resp:
+            return await resp.json()
+
+
+def _download_bytes() -> float:
+    return sum(metrics.DOWNLOAD_BYTES._values.values())
+
+
+def _api_calls() -> dict:
+    return {
+        f"{endpoint} {code}": count
+        for (endpoint, code), count in sorted(metrics.API_CALLS._values.items())
+    }
+
+
+async def _run(args, base_url: str, workdir: Path) -> dict:
+    data_dir = workdir / "data"
+    page_size = args.episodes + args.new_episodes
+    (data_dir / "media").mkdir(parents=True)
+    config = BiliPodConfig(
+        server=ServerConfig(hostname="http://localhost:5728"),
+        storage=StorageConfig(type="local", data_dir=str(data_dir)),
+        token=None,
+        login=LoginConfig(),
+        feeds={
+            f"bench{index}": FeedConfig(
+                uid=FakeBilibili.uid(index), page_size=page_size, keep_last=page_size
+            )
+            for index in range(args.feeds)
+        },
+        log=None,
+    )
+    if args.stream_cache is not None:
+        STREAM_CACHE.configure(workdir / "cache", max_size=args.stream_cache)
+    db = open_database(workdir / "db.json", config.storage.flush_interval)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+    credential = Credential()
+    results = {}
+
+    # Initial sync: list every feed, download every episode, write feeds
+    started, bytes_before = time.perf_counter(), _download_bytes()
+    await data_initialize(config, pod_tbl, episode_tbl, credential)
+    elapsed = time.perf_counter() - started
+    downloaded = len(episode_tbl)
+    results["init_wall_seconds"] = elapsed
+    results["init_episodes"] = downloaded
+    results["init_episodes_per_second"] = downloaded / elapsed
+    results["download_mb_per_second"] = (
+        (_download_bytes() - bytes_before) / 1024 / 1024 / elapsed
+    )
+
+    # Incremental update: new uploads on every feed
+    if args.new_episodes:
+        await _fake_request(
+            base_url, "POST", "/__config", {"rate_412": args.rate_412}
+        )
+        await _fake_request(
+            base_url, "POST", "/__add_episodes", {"count": args.new_episodes}
+        )
+        expected = downloaded + args.feeds * args.new_episodes
+        updater = asyncio.create_task(
+            update.update_episodes(pod_tbl, episode_tbl, credential)
+        )
+        started = time.perf_counter()
+        while len(episode_tbl) < expected:
+            if time.perf_counter() - started > args.timeout:
+                print(f"Update timed out with {len(episode_tbl)}/{expected} episodes")
+                break
+            # Listings rejected with 412 are retried, like the next scheduled run
+            for pod_info in pod_tbl.all():
+                if len(pod_info["episodes"]) < page_size:
+                    pod = Pod.from_dict(pod_info)
+                    await update.update_pod(pod, pod_tbl, credential)
+            await asyncio.sleep(0.05)
+        results["update_wall_seconds"] = time.perf_counter() - started
+        results["update_episodes"] = len(episode_tbl) - downloaded
+        updater.cancel()
+
+    latency = latency_percentiles(episode_tbl)
+    results["publish_latency_p50_seconds"] = latency[50]
+    results["publish_latency_p95_seconds"] = latency[95]
+    results["download_retries"] = sum(metrics.DOWNLOAD_RETRIES._values.values())
+    results["api_calls"] = _api_calls()
+    results["fake_server_stats"] = await _fake_request(base_url, "GET", "/__stats")
+    close_database(db)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--feeds", type=int, default=5)
+    parser.add_argument("--episodes", type=int, default=10, help="per feed")
+    parser.add_argument("--new-episodes", type=int, default=2, help="per feed")
+    parser.add_argument("--stream-size", type=int, default=512 * 1024)
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--cdn-latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-412", type=float, default=0.0, help="applied during the update phase"
+    )
+    parser.add_argument(
+        "--ffmpeg",
+        choices=("copy", "real"),
+        default="copy",
+        help="'real' transcodes a generated AAC stream with the system ffmpeg",
+    )
+    parser.add_argument(
+        "--batch-pause",
+        type=float,
+        default=None,
+        help="override the pause between download batches (seconds)",
+    )
+    parser.add_argument(
+        "--stream-cache",
+        type=int,
+        default=None,
+        help="enable the stream cache with this many bytes of reuse",
+    )
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    logger = Logger().get_logger()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    workdir = Path(tempfile.mkdtemp(prefix="bilipod-bench-"))
+    payload = None
+    if args.ffmpeg == "real":
+        payload = _real_audio_payload(workdir, seconds=30)
+    else:
+        video_downloader.FFMPEG_PATH = _ffmpeg_copy_shim(workdir)
+
+    fake_config = FakeConfig(
+        feeds=args.feeds,
+        episodes=args.episodes,
+        stream_size=args.stream_size,
+        api_latency=args.api_latency,
+        cdn_latency=args.cdn_latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+    )
+    process, port = _start_fake_server(fake_config, payload)
+    base_url = f"http://127.0.0.1:{port}"
+
+    RoutingClient.target = base_url
+    register_client("bilipod_bench", RoutingClient)
+    request_settings.set_enable_auto_buvid(False)
+    request_settings.set_enable_bili_ticket(False)
+    update.COALESCE_WINDOW = 0
+    if args.batch_pause is not None:
+        downloader.CHUNK_INTERVAL = args.batch_pause
+
+    try:
+        cpu_before = cpu_seconds()
+        results = asyncio.run(_run(args, base_url, workdir))
+        results["cpu_seconds"] = cpu_seconds() - cpu_before
+        results["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_table(
+            f"End-to-end: {args.feeds} feeds x {args.episodes} episodes",
+            {k: v for k, v in results.items() if not isinstance(v, dict)},
+        )
+        print_table("API calls (endpoint code)", results["api_calls"])
+
+    gated = {key: results[key] for key in GATED if results.get(key) is not None}
+    return gate(
+        "e2e",
+        gated,
+        GATED,
+        baseline_path=args.baseline,
+        save=args.save_baseline,
+        tolerance=args.tolerance,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Micro-benchmarks for the data-model, query and URL/XML helper hot paths.
+
+Each case runs once per episode (or pod) per update cycle somewhere in the
+service; they are timed here at realistic sizes with `timeit` and reported
+in microseconds per item (best of --repeat runs).
+
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --only episode --save-baseline
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode, Pod
+from src.bilipod.feed.podcast_rss import sanitize_for_xml
+from src.bilipod.utils.biliuser import get_episode_list
+from src.bilipod.utils.db_query import query_episode
+from src.bilipod.utils.url import join_url, sanitize_url
+
+from ._common import gate, print_table
+
+BASE_URL = "http://localhost:5728/bilipod/"
+DATA_DIR = Path("/data")
+
+
+def _listing(index: int) -> dict:
+    return {
+        "bvid": f"BV1micro{index:07d}",
+        "title": f"Episode {index} \x0b<&>\x1f 测试标题",
+        "description": "Line one of a typical uploader description.\n" * 10,
+        "image": "http://i0.hdslb.com/bfs/archive/cover.jpg",
+        "duration": "1200",
+        "pubdate": 1_700_000_000 + index,
+        "timings": {"discovered_at": 1_700_000_000.0 + index},
+    }
+
+
+def build_fixtures(episodes: int, pods: int) -> dict:
+    listings = [_listing(index) for index in range(episodes)]
+    episode_objs = [
+        Episode(
+            **listing,
+            base_url=BASE_URL,
+            format="audio",
+            quality="low",
+            data_dir=DATA_DIR,
+        )
+        for listing in listings
+    ]
+    episode_rows = [episode.to_dict() for episode in episode_objs]
+    per_pod = max(episodes // pods, 1)
+    pod_objs = [
+        Pod(
+            feed_id=f"micro{index:04d}",
+            base_url=BASE_URL,
+            data_dir=DATA_DIR,
+            title=f"Pod {index}",
+            page_size=per_pod,
+            episodes=listings[index * per_pod : (index + 1) * per_pod],
+        )
+        for index in range(pods)
+    ]
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    episode_tbl.insert_multiple(episode_rows)
+    return {
+        "listings": listings,
+        "episodes": episode_objs,
+        "episode_rows": episode_rows,
+        "pods": pod_objs,
+        "pod_rows": [pod.to_dict() for pod in pod_objs],
+        "episode_tbl": episode_tbl,
+    }
+
+
+def build_cases(fx: dict, lookups: int) -> Dict[str, Tuple[Callable, int]]:
+    """Case name -> (callable, items processed per call)."""
+    episodes, rows = fx["episodes"], fx["episode_rows"]
+    pods, pod_rows = fx["pods"], fx["pod_rows"]
+    episode_tbl = fx["episode_tbl"]
+    # Spread the lookups over the table so the scan position is representative
+    step = max(len(rows) // lookups, 1)
+    lookup_rows = rows[::step][:lookups]
+    urls = [episode.url.replace("/media/", "//media//") for episode in episodes]
+    texts = [listing["title"] + listing["description"] for listing in fx["listings"]]
+
+    return {
+        "episode_from_dict": (
+            lambda: [Episode.from_dict(row) for row in rows],
+            len(rows),
+        ),
+        "episode_to_dict": (
+            lambda: [episode.to_dict() for episode in episodes],
+            len(episodes),
+        ),
+        "episode_init": (
+            lambda: [
+                Episode(
+                    **listing,
+                    base_url=BASE_URL,
+                    format="audio",
+                    quality="low",
+                    data_dir=DATA_DIR,
+                )
+                for listing in fx["listings"]
+            ],
+            len(fx["listings"]),
+        ),
+        "pod_from_dict": (
+            lambda: [Pod.from_dict(row) for row in pod_rows],
+            len(pod_rows),
+        ),
+        "pod_to_dict": (lambda: [pod.to_dict() for pod in pods], len(pods)),
+        "get_episode_list": (
+            lambda: [get_episode_list(pod) for pod in pods],
+            sum(len(pod.episodes) for pod in pods),
+        ),
+        "query_episode_build": (
+            lambda: [query_episode(row) for row in rows],
+            len(rows),
+        ),
+        "query_episode_search": (
+            lambda: [episode_tbl.search(query_episode(row)) for row in lookup_rows],
+            len(lookup_rows),
+        ),
+        "sanitize_url": (lambda: [sanitize_url(url) for url in urls], len(urls)),
+        "join_url": (
+            lambda: [join_url(BASE_URL, "media", e.bvid + ".mp3") for e in episodes],
+            len(episodes),
+        ),
+        "sanitize_for_xml": (
+            lambda: [sanitize_for_xml(text) for text in texts],
+            len(texts),
+        ),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--episodes", type=int, default=10_000)
+    parser.add_argument("--pods", type=int, default=500)
+    parser.add_argument(
+        "--lookups", type=int, default=200, help="table searches per run"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", default="", help="run only cases containing this substring"
+    )
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    cases = build_cases(build_fixtures(args.episodes, args.pods), args.lookups)
+    results = {}
+    for name, (func, items) in cases.items():
+        if args.only not in name:
+            continue
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        results[f"{name}_us"] = best * 1e6 / items
+
+    print_table(
+        f"Micro-benchmarks: {args.episodes} episodes, {args.pods} pods "
+        f"(us per item, best of {args.repeat})",
+        results,
+    )
+    return gate(
+        "micro",
+        results,
+        {key: "lower" for key in results},
+        baseline_path=args.baseline,
+        save=args.save_baseline,
+        tolerance=args.tolerance,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
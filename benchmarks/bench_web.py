@@ -0,0 +1,363 @@
+"""
+Load benchmark for the web server: feed polls, conditional GETs, media ranges.
+
+Generates a data_dir with N feeds x M episodes (real feed XML, sparse media
+files), starts `run_web_server` on it in a separate process and drives it
+with concurrent keep-alive clients from one or more load processes. Reports
+requests/s, latency percentiles per request kind, server thread count, RSS
+and CPU time per request, and compares them with a saved baseline.
+
+    python -m benchmarks.bench_web --feeds 300 --episodes 10 --duration 10
+    python -m benchmarks.bench_web --save-baseline
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode, Pod
+from src.bilipod.executing.web_server import run_web_server
+from src.bilipod.feed.podcast_rss import generate_feed_xml
+from src.bilipod.utils.bp_log import Logger
+from src.bilipod.utils.config_parser import ServerConfig
+from src.bilipod.utils.tracing import percentile
+
+from ._common import gate, print_table, process_cpu_seconds, process_status
+
+KINDS = ("poll", "conditional", "range")
+GATED = {
+    "requests_per_second": "higher",
+    "poll_p95_ms": "lower",
+    "conditional_p95_ms": "lower",
+    "range_p95_ms": "lower",
+    "server_cpu_ms_per_request": "lower",
+    "server_peak_rss_mb": "lower",
+}
+
+
+def generate_data_dir(
+    data_dir: Path, feeds: int, episodes: int, media_size: int, base_url: str
+) -> List[dict]:
+    """Write feed XML and sparse media files; returns the pod rows."""
+    (data_dir / "media").mkdir(parents=True, exist_ok=True)
+    db = TinyDB(storage=MemoryStorage)
+    episode_tbl = db.table("episode")
+    pods = []
+    now = int(time.time())
+    for feed_index in range(feeds):
+        listing = [
+            {
+                "bvid": f"BV1bench{feed_index:05d}{episode_index:04d}",
+                "title": f"Feed {feed_index} episode {episode_index} <&> 测试",
+                "description": "Synthetic episode for the web benchmark. " * 8,
+                "image": "https://i0.hdslb.com/bfs/archive/fake.jpg",
+                "duration": "600",
+                "pubdate": now - episode_index * 3600,
+            }
+            for episode_index in range(episodes)
+        ]
+        pod = Pod(
+            feed_id=f"bench{feed_index:05d}",
+            base_url=base_url,
+            data_dir=data_dir,
+            title=f"Benchmark feed {feed_index}",
+            description="Synthetic feed for the web benchmark.",
+            cover_art="https://i0.hdslb.com/bfs/face/fake.jpg",
+            author="bilipod",
+            link="https://space.bilibili.com/1",
+            category="Technology",
+            page_size=episodes,
+            update_period="2h",
+            episodes=listing,
+        )
+        rows = []
+        for info in listing:
+            episode = Episode(
+                **info,
+                base_url=base_url,
+                format=pod.format,
+                quality=pod.quality,
+                data_dir=data_dir,
+            )
+            with open(episode.location, "wb") as f:
+                f.truncate(media_size)
+            episode.size = media_size
+            episode.status = "downloaded"
+            rows.append(episode.to_dict())
+        episode_tbl.insert_multiple(rows)
+        generate_feed_xml(pod, episode_tbl)
+        pods.append(pod.to_dict())
+    return pods
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(server_config: ServerConfig, data_dir: Path, pods: List[dict]) -> None:
+    """Server process entry point."""
+    Logger().get_logger().remove()
+    pod_tbl = TinyDB(storage=MemoryStorage).table("pod")
+    pod_tbl.insert_multiple(pods)
+    asyncio.run(run_web_server(server_config, data_dir, pod_tbl))
+
+
+async def _wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/auth/status") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Web server at {base_url} did not start")
+            await asyncio.sleep(0.1)
+
+
+async def _feed_etags(base_url: str, feeds: List[str]) -> Dict[str, str]:
+    etags = {}
+    async with aiohttp.ClientSession() as session:
+        for feed in feeds:
+            headers = {"Accept-Encoding": "gzip"}
+            async with session.get(f"{base_url}/{feed}", headers=headers) as response:
+                await response.read()
+                etags[feed] = response.headers["ETag"]
+    return etags
+
+
+async def _client(
+    session, base_url, plan, deadline, latencies, errors, seed, range_size
+):
+    rng = random.Random(seed)
+    feeds, media, media_size, etags, weights = plan
+    while time.perf_counter() < deadline:
+        kind = rng.choices(KINDS, weights)[0]
+        headers = {"Accept-Encoding": "gzip"}
+        if kind == "range":
+            path = f"/media/{rng.choice(media)}"
+            start = rng.randrange(max(media_size - range_size, 1))
+            headers = {"Range": f"bytes={start}-{start + range_size - 1}"}
+            expected = 206
+        else:
+            feed = rng.choice(feeds)
+            path = f"/{feed}"
+            expected = 200
+            if kind == "conditional":
+                headers["If-None-Match"] = etags[feed]
+                expected = 304
+        started = time.perf_counter()
+        try:
+            async with session.get(f"{base_url}{path}", headers=headers) as response:
+                await response.read()
+                ok = response.status == expected
+        except aiohttp.ClientError:
+            ok = False
+        if ok:
+            latencies[kind].append(time.perf_counter() - started)
+        else:
+            errors[kind] += 1
+
+
+async def _load(base_url, plan, connections, duration, seed, range_size):
+    latencies = {kind: [] for kind in KINDS}
+    errors = {kind: 0 for kind in KINDS}
+    connector = aiohttp.TCPConnector(limit=connections)
+    # Automatic decompression would charge gunzip time to the latency
+    async with aiohttp.ClientSession(
+        connector=connector, auto_decompress=False
+    ) as session:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                _client(
+                    session,
+                    base_url,
+                    plan,
+                    deadline,
+                    latencies,
+                    errors,
+                    seed * 10_000 + index,
+                    range_size,
+                )
+                for index in range(connections)
+            )
+        )
+    return latencies, errors
+
+
+def _load_process(base_url, plan, connections, duration, seed, range_size, queue):
+    """Load generator process entry point."""
+    queue.put(
+        asyncio.run(_load(base_url, plan, connections, duration, seed, range_size))
+    )
+
+
+def _summarize(
+    latencies: Dict[str, List[float]], errors: Dict[str, int], duration: float
+) -> dict:
+    results = {}
+    total = sum(len(values) for values in latencies.values())
+    results["requests"] = total
+    results["requests_per_second"] = total / duration
+    results["errors"] = sum(errors.values())
+    for kind in KINDS:
+        values = latencies[kind]
+        results[f"{kind}_requests_per_second"] = len(values) / duration
+        for percent in (50, 95, 99):
+            value = percentile(values, percent)
+            results[f"{kind}_p{percent}_ms"] = None if value is None else value * 1000
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--feeds", type=int, default=300)
+    parser.add_argument("--episodes", type=int, default=10, help="per feed")
+    parser.add_argument("--media-size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--range-size", type=int, default=256 * 1024)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument(
+        "--connections", type=int, default=64, help="per load process"
+    )
+    parser.add_argument("--processes", type=int, default=2, help="load processes")
+    parser.add_argument(
+        "--mix",
+        default="6,3,1",
+        help="weights of feed polls, conditional GETs and media ranges",
+    )
+    parser.add_argument("--max-connections", type=int, default=1024)
+    parser.add_argument("--file-cache-size", type=int, default=32 * 1024 * 1024)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    weights = [float(weight) for weight in args.mix.split(",")]
+    if len(weights) != len(KINDS):
+        parser.error("--mix needs three weights")
+
+    Logger().get_logger().remove()
+    workdir = Path(tempfile.mkdtemp(prefix="bilipod-bench-web-"))
+    data_dir = workdir / "data"
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    context = multiprocessing.get_context("spawn")
+    server = None
+    try:
+        started = time.perf_counter()
+        pods = generate_data_dir(
+            data_dir, args.feeds, args.episodes, args.media_size, base_url
+        )
+        print(
+            f"Generated {args.feeds} feeds, {args.feeds * args.episodes} media "
+            f"files in {time.perf_counter() - started:.1f}s"
+        )
+
+        server_config = ServerConfig(
+            port=port,
+            bind_address="127.0.0.1",
+            max_connections=args.max_connections,
+            file_cache_size=args.file_cache_size,
+        )
+        server = context.Process(
+            target=_serve, args=(server_config, data_dir, pods), daemon=True
+        )
+        server.start()
+        asyncio.run(_wait_until_up(base_url))
+
+        feeds = [Path(pod["xml_url"]).name for pod in pods]
+        media = sorted(path.name for path in (data_dir / "media").iterdir())
+        etags = asyncio.run(_feed_etags(base_url, feeds))
+        plan = (feeds, media, args.media_size, etags, weights)
+
+        queue = context.Queue()
+        loaders = [
+            context.Process(
+                target=_load_process,
+                args=(
+                    base_url,
+                    plan,
+                    args.connections,
+                    args.duration,
+                    index,
+                    args.range_size,
+                    queue,
+                ),
+                daemon=True,
+            )
+            for index in range(args.processes)
+        ]
+        cpu_before = process_cpu_seconds(server.pid)
+        for loader in loaders:
+            loader.start()
+
+        # Sample the server while the load runs
+        peak_threads = 0
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            peak_threads = max(
+                peak_threads, process_status(server.pid).get("Threads", 0)
+            )
+            time.sleep(0.2)
+
+        latencies = {kind: [] for kind in KINDS}
+        errors = {kind: 0 for kind in KINDS}
+        for _ in loaders:
+            worker_latencies, worker_errors = queue.get(timeout=args.duration + 60)
+            for kind in KINDS:
+                latencies[kind].extend(worker_latencies[kind])
+                errors[kind] += worker_errors[kind]
+        cpu_after = process_cpu_seconds(server.pid)
+        status = process_status(server.pid)
+        for loader in loaders:
+            loader.join()
+    finally:
+        if server is not None:
+            server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = _summarize(latencies, errors, args.duration)
+    results["server_threads"] = peak_threads or None
+    results["server_peak_rss_mb"] = (
+        status["VmHWM"] / 1024 if "VmHWM" in status else None
+    )
+    if cpu_before is not None and results["requests"]:
+        server_cpu = cpu_after - cpu_before
+        results["server_cpu_seconds"] = server_cpu
+        results["server_cpu_ms_per_request"] = server_cpu * 1000 / results["requests"]
+
+    print_table(
+        f"Web load: {args.feeds} feeds x {args.episodes} episodes, "
+        f"{args.processes} x {args.connections} connections, {args.duration:g}s",
+        results,
+    )
+    gated = {key: results[key] for key in GATED if results.get(key) is not None}
+    return gate(
+        "web",
+        gated,
+        GATED,
+        baseline_path=args.baseline,
+        save=args.save_baseline,
+        tolerance=args.tolerance,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Local stand-in for the Bilibili web API and media CDN, used by the benchmarks.
+
+API requests arrive host-prefixed (`/api.bilibili.com/x/...`,
+`/space.bilibili.com/<uid>/dynamic`) through `RoutingClient`; streams are
+served from `/cdn/<bvid>-<kind>.m4s` under two host names (127.0.0.1 as the
+primary URL, localhost as the backup) so per-host metrics stay meaningful.
+
+Control endpoints:
+    GET  /__stats           API and CDN request counts
+    POST /__config          update latency/bandwidth/error knobs (JSON body)
+    POST /__add_episodes    publish `count` new videos on every feed
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import jwt
+from aiohttp import web
+from bilibili_api.utils.aid_bvid_transformer import aid2bvid
+
+WBI_IMG = {
+    "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+    "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png",
+}
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class FakeConfig:
+    feeds: int = 5
+    episodes: int = 10
+    stream_size: int = 512 * 1024
+    api_latency: float = 0.0  # seconds per API response
+    cdn_latency: float = 0.0  # seconds before the first stream byte
+    bandwidth: int = 0  # bytes/s per stream, 0 for unlimited
+    error_rate: float = 0.0  # share of CDN requests answered with 503
+    rate_412: float = 0.0  # share of API requests rejected with HTTP 412
+    seed: int = 0
+
+
+@dataclass
+class FakeVideo:
+    aid: int
+    bvid: str
+    title: str
+    pubdate: int
+    duration: int
+
+    @property
+    def cid(self) -> int:
+        return self.aid + 10_000_000
+
+
+class FakeBilibili:
+    def __init__(self, config: FakeConfig, payload: Optional[bytes] = None):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.payload = payload or self.random.randbytes(config.stream_size)
+        self.stats: Counter = Counter()
+        self.next_aid = 100_000
+        self.videos: Dict[int, List[FakeVideo]] = {}
+        for feed_index in range(config.feeds):
+            uid = self.uid(feed_index)
+            self.videos[uid] = []
+            self.publish(uid, config.episodes)
+        self.by_bvid = {
+            video.bvid: video for videos in self.videos.values() for video in videos
+        }
+
+    @staticmethod
+    def uid(feed_index: int) -> int:
+        return 1_000 + feed_index
+
+    def publish(self, uid: int, count: int) -> None:
+        for _ in range(count):
+            self.next_aid += 1
+            video = FakeVideo(
+                aid=self.next_aid,
+                bvid=aid2bvid(self.next_aid),
+                title=f"Episode {self.next_aid}",
+                pubdate=int(time.time()) - 3600 + self.next_aid % 3600,
+                duration=600,
+            )
+            self.videos[uid].insert(0, video)
+            if hasattr(self, "by_bvid"):
+                self.by_bvid[video.bvid] = video
+
+    # --- helpers -------------------------------------------------------------
+
+    async def _api_gate(self, endpoint: str) -> Optional[web.Response]:
+        if self.config.api_latency:
+            await asyncio.sleep(self.config.api_latency)
+        if self.config.rate_412 and self.random.random() < self.config.rate_412:
+            self.stats[f"api {endpoint} 412"] += 1
+            return web.Response(status=412, text="Precondition Failed")
+        self.stats[f"api {endpoint} 200"] += 1
+        return None
+
+    @staticmethod
+    def _ok(data) -> web.Response:
+        return web.json_response({"code": 0, "message": "0", "ttl": 1, "data": data})
+
+    def _stream(self, request: web.Request, bvid: str, kind: str) -> dict:
+        host = "127.0.0.1" if kind == "audio" else "localhost"
+        port = request.url.port
+        primary = f"http://{host}:{port}/cdn/{bvid}-{kind}.m4s"
+        backup = f"http://localhost:{port}/cdn/{bvid}-{kind}.m4s?backup=1"
+        stream = {
+            "id": 30216 if kind == "audio" else 16,
+            "base_url": primary,
+            "baseUrl": primary,
+            "backup_url": [backup],
+            "backupUrl": [backup],
+            "bandwidth": 64000 if kind == "audio" else 400000,
+            "mime_type": f"{kind}/mp4",
+            "codecs": "mp4a.40.2" if kind == "audio" else "avc1.64001E",
+            "segment_base": {"initialization": "0-900", "index_range": "901-1500"},
+        }
+        if kind == "video":
+            stream.update(
+                {"frame_rate": "25", "width": 640, "height": 360, "sar": "1:1"}
+            )
+        return stream
+
+    # --- API -----------------------------------------------------------------
+
+    async def api(self, request: web.Request) -> web.StreamResponse:
+        host = request.match_info["host"]
+        path = "/" + request.match_info["path"]
+        query = request.query
+
+        if host == "space.bilibili.com" and path.endswith("/dynamic"):
+            rejected = await self._api_gate("space.dynamic")
+            if rejected:
+                return rejected
+            access_id = jwt.encode(
+                {"iat": int(time.time()), "ttl": 86400}, "bench", algorithm="HS256"
+            )
+            render_data = json.dumps({"access_id": access_id})
+            return web.Response(
+                text=(
+                    '<html><script id="__RENDER_DATA__" type="application/json">'
+                    f"{render_data}</script></html>"
+                ),
+                content_type="text/html",
+            )
+
+        if path == "/x/web-interface/nav":
+            self.stats["api nav 200"] += 1
+            return web.json_response({"code": -101, "data": {"wbi_img": WBI_IMG}})
+
+        if path == "/x/space/wbi/acc/info":
+            rejected = await self._api_gate("user.info")
+            if rejected:
+                return rejected
+            uid = int(query["mid"])
+            return self._ok(
+                {
+                    "mid": uid,
+                    "name": f"Fake user {uid}",
+                    "sign": "Synthetic benchmark feed",
+                    "face": "https://i0.hdslb.com/bfs/face/fake.jpg",
+                    "official": {"title": ""},
+                }
+            )
+
+        if path == "/x/v2/medialist/resource/list":
+            rejected = await self._api_gate("user.media_list")
+            if rejected:
+                return rejected
+            videos = self.videos.get(int(query["biz_id"]), [])
+            if query.get("desc") in ("0", "false"):
+                videos = list(reversed(videos))
+            videos = videos[: int(query.get("ps", 20))]
+            return self._ok(
+                {
+                    "media_list": [
+                        {
+                            "bv_id": video.bvid,
+                            "title": video.title,
+                            "intro": "Synthetic episode",
+                            "duration": video.duration,
+                            "cover": "https://i0.hdslb.com/bfs/archive/fake.jpg",
+                            "pubtime": video.pubdate,
+                        }
+                        for video in videos
+                    ],
+                    "has_more": False,
+                }
+            )
+
+        if path == "/x/web-interface/view":
+            rejected = await self._api_gate("video.info")
+            if rejected:
+                return rejected
+            video = self.by_bvid.get(query.get("bvid"))
+            if video is None:
+                return web.json_response({"code": -404, "message": "啥都木有"})
+            return self._ok(
+                {
+                    "bvid": video.bvid,
+                    "aid": video.aid,
+                    "cid": video.cid,
+                    "title": video.title,
+                    "dynamic": "",
+                    "pages": [{"cid": video.cid, "page": 1, "part": video.title}],
+                }
+            )
+
+        if path == "/x/player/wbi/playurl":
+            rejected = await self._api_gate("video.playurl")
+            if rejected:
+                return rejected
+            video = self.by_bvid.get(query.get("bvid"))
+            if video is None:
+                return web.json_response({"code": -404, "message": "啥都木有"})
+            return self._ok(
+                {
+                    "quality": 16,
+                    "format": "mp4",
+                    "dash": {
+                        "duration": video.duration,
+                        "video": [self._stream(request, video.bvid, "video")],
+                        "audio": [self._stream(request, video.bvid, "audio")],
+                    },
+                }
+            )
+
+        self.stats[f"api unknown {host}{path}"] += 1
+        return web.json_response({"code": -404, "message": f"Unknown {path}"})
+
+    # --- CDN -----------------------------------------------------------------
+
+    async def cdn(self, request: web.Request) -> web.StreamResponse:
+        host = request.url.host
+        if self.config.cdn_latency:
+            await asyncio.sleep(self.config.cdn_latency)
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self.stats[f"cdn {host} 503"] += 1
+            return web.Response(status=503)
+
+        self.stats[f"cdn {host} 200"] += 1
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "video/mp4",
+                "Content-Length": str(len(self.payload)),
+            }
+        )
+        await response.prepare(request)
+        for offset in range(0, len(self.payload), CHUNK_SIZE):
+            chunk = self.payload[offset : offset + CHUNK_SIZE]
+            await response.write(chunk)
+            if self.config.bandwidth:
+                await asyncio.sleep(len(chunk) / self.config.bandwidth)
+        await response.write_eof()
+        self.stats["cdn bytes"] += len(self.payload)
+        return response
+
+    # --- control -------------------------------------------------------------
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def set_config(self, request: web.Request) -> web.Response:
+        for key, value in (await request.json()).items():
+            setattr(self.config, key, value)
+        return web.json_response(asdict(self.config))
+
+    async def add_episodes(self, request: web.Request) -> web.Response:
+        count = int((await request.json()).get("count", 1))
+        for uid in self.videos:
+            self.publish(uid, count)
+        return web.json_response({"published": count * len(self.videos)})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/__stats", self.get_stats)
+        app.router.add_post("/__config", self.set_config)
+        app.router.add_post("/__add_episodes", self.add_episodes)
+        app.router.add_get("/cdn/{name}", self.cdn)
+        app.router.add_route("*", "/{host}/{path:.*}", self.api)
+        return app
+
+
+async def _serve(config: FakeConfig, payload: Optional[bytes], port_queue) -> None:
+    runner = web.AppRunner(FakeBilibili(config, payload).app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port_queue.put(site._server.sockets[0].getsockname()[1])
+    await asyncio.Event().wait()
+
+
+def serve(config: FakeConfig, payload: Optional[bytes], port_queue) -> None:
+    """Process entry point: serve until terminated, reporting the bound port."""
+    asyncio.run(_serve(config, payload, port_queue))
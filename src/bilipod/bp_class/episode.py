@@ -1,11 +1,13 @@
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Literal, Optional, Sequence, Union
 
+from ..utils.media_layout import media_relpath
+from ..utils.records import field_converters, intern_str, plain_copy, shared_path
 from ..utils.url import join_url, sanitize_url
 
 
-@dataclass
+@dataclass(slots=True)
 class Episode:
     """
     Class representing an episode of a video or audio podcast.
@@ -32,6 +34,7 @@ class Episode:
         size: Size of the episode in bytes.
         status: Download status of the episode ('downloaded', 'deleted', or None).
         tracking: Flag to indicate if the episode is being tracked for download/management.
+        timings: Unix timestamps of pipeline stages (discovered_at, download_started, ...).
     """
 
     bvid: str
@@ -56,20 +59,20 @@ class Episode:
     size: Optional[int] = field(default=None, repr=False, init=False)
     status: Optional[Literal["downloaded", "deleted"]] = None
     tracking: bool = True
+    timings: Optional[dict] = None
 
     @classmethod
     def from_dict(cls, data: dict):
         # Create a new instance without calling __post_init__
         obj = cls.__new__(cls)
-        for field_name, field_type in cls.__annotations__.items():
-            value = data.get(field_name, None)
-            if isinstance(value, str) and "Path" in str(field_type):
-                value = Path(value)
-            setattr(obj, field_name, value)
+        for field_name, convert in _CONVERTERS:
+            value = data.get(field_name)
+            setattr(obj, field_name, value if convert is None else convert(value))
         obj.url = sanitize_url(obj.url)
         return obj
 
     def __post_init__(self):
+        self.base_url = intern_str(self.base_url)
         self._set_link()
         self._set_type()
         self._set_quality()
@@ -83,10 +86,12 @@ class Episode:
         if self.data_dir is None:
             return None
 
-        self.data_dir = Path(self.data_dir)
+        self.data_dir = shared_path(self.data_dir)
         suffix = "mp3" if self.format == "audio" else "mp4"
         quility = self.video_quality if self.format == "video" else self.audio_quality
-        self.location = self.data_dir / "media" / f"{self.bvid}_{quility}.{suffix}"
+        self.location = (
+            self.data_dir / "media" / media_relpath(f"{self.bvid}_{quility}.{suffix}")
+        )
 
     def _set_url(self):
         suffix = "mp3" if self.format == "audio" else "mp4"
@@ -111,7 +116,7 @@ class Episode:
 
     def to_dict(self) -> dict:
         # Convert the instance to a dictionary, excluding non-serializable fields
-        data = asdict(self)
+        data = {name: plain_copy(getattr(self, name)) for name, _ in _CONVERTERS}
         data["data_dir"] = str(self.data_dir)
         data["location"] = str(self.location) if self.location else None
         return data
@@ -140,3 +145,6 @@ class Episode:
 
     def __hash__(self) -> int:
         return hash((self.bvid, self.quality, self.format))
+
+
+_CONVERTERS = field_converters(Episode, base_url=intern_str, data_dir=shared_path)
@@ -1,11 +1,12 @@
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Literal, Optional, Sequence, Union
 
+from ..utils.records import field_converters, intern_str, plain_copy, shared_path
 from ..utils.url import join_url
 
 
-@dataclass
+@dataclass(slots=True)
 class Pod:
     """Represents a video or audio podcast.
 
@@ -77,11 +78,9 @@ class Pod:
 
         # Create a new instance without calling __post_init__
         obj = cls.__new__(cls)
-        for field_name, field_type in cls.__annotations__.items():
-            value = data.get(field_name, None)
-            if isinstance(value, str) and "Path" in str(field_type):
-                value = Path(value)
-            setattr(obj, field_name, value)
+        for field_name, convert in _CONVERTERS:
+            value = data.get(field_name)
+            setattr(obj, field_name, value if convert is None else convert(value))
         if obj.xml_url is None:
             obj.xml_url = obj._build_xml_url()
         return obj
@@ -90,19 +89,23 @@ class Pod:
         if not self.base_url:
             raise ValueError("Pod base_url is required.")
 
+        self.base_url = intern_str(self.base_url)
         self.xml_url = self._build_xml_url()
         if self.data_dir is not None:
-            self.data_dir = Path(self.data_dir)
+            self.data_dir = shared_path(self.data_dir)
 
     def _build_xml_url(self) -> str:
         feed_name = self.feed_id.replace("feed.", "", 1)
         return join_url(self.base_url, f"{feed_name}.xml")
 
     def to_dict(self) -> dict:
-        data = asdict(self)
+        data = {name: plain_copy(getattr(self, name)) for name, _ in _CONVERTERS}
         data["data_dir"] = str(self.data_dir) if self.data_dir is not None else None
         return data
 
     def update(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
+
+
+_CONVERTERS = field_converters(Pod, base_url=intern_str, data_dir=shared_path)
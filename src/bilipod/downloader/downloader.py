@@ -1,16 +1,22 @@
 import asyncio
 from typing import List, Optional, Sequence
 
-from bilibili_api import Credential, ResponseCodeException, video
+from bilibili_api import Credential, NetworkException, ResponseCodeException, video
 
 from ..bp_class import Episode
 from ..exceptions.DownloadError import DownloadError
 from ..utils.bp_log import Logger
 from ..utils.endorse import endorse
+from ..utils.metrics import EPISODE_RETRIES, QUEUE_DEPTH, track_api_call
+from ..utils.quota import STORAGE_BUDGET
+from ..utils.tracing import mark
 from .video_downloader import video_downloader
 
 logger = Logger().get_logger()
 
+# Seconds to pause between download batches
+CHUNK_INTERVAL = 5
+
 
 async def download_episode(
     episode: Episode, credential: Optional[Credential]
@@ -21,14 +27,21 @@ async def download_episode(
     download_status = False
     try:
         v_obj = video.Video(episode.bvid, credential=credential)
-        v_info = await v_obj.get_info()
-    except ResponseCodeException as e:
+        v_info = await track_api_call("video.get_info", v_obj.get_info())
+    except (ResponseCodeException, NetworkException) as e:
         logger.error(f"Failed to get {episode.bvid} info: {e}")
         return episode
 
     if episode.exists():
         logger.debug(f"Episode {episode.bvid} already exists.")
     else:
+        # Copy so marks don't leak into the pod's listing the episode came from
+        episode.timings = dict(episode.timings or {})
+        reserved = await STORAGE_BUDGET.reserve(episode)
+        if reserved is None:
+            logger.error(f"Episode {episode.bvid} does not fit in the storage budget.")
+            return episode
+        mark(episode.timings, "download_started")
         try:
             await video_downloader(
                 name=episode.bvid,
@@ -38,6 +51,7 @@ async def download_episode(
                 video_quality=episode.video_quality,
                 audio_quality=episode.audio_quality,
                 credential=credential,
+                timings=episode.timings,
             )
             download_status = True
 
@@ -52,6 +66,8 @@ async def download_episode(
                 f"An unexpected error occurred when downloading {episode.bvid}: {e}"
             )
             return episode
+        finally:
+            STORAGE_BUDGET.settle(reserved, episode.location)
 
         try:
             await endorse(episode.endorse, v_obj, credential)
@@ -70,6 +86,7 @@ async def process_chunks(
     episodes: List[Episode], chunk_size, credential: Optional[Credential]
 ) -> List[Episode]:
     failed_downloads = []
+    remaining = len(episodes)
     chunks = [
         episodes[i : min(i + chunk_size, len(episodes))]
         for i in range(0, len(episodes), chunk_size)
@@ -79,7 +96,9 @@ async def process_chunks(
             *[download_episode(episode, credential) for episode in chunk]
         )
         failed_downloads.extend([episode for episode in results if episode is not None])
-        await asyncio.sleep(5)  # Sleep between batches
+        remaining -= len(chunk)
+        QUEUE_DEPTH.set(remaining + len(failed_downloads), queue="download")
+        await asyncio.sleep(CHUNK_INTERVAL)  # Sleep between batches
     return failed_downloads
 
 
@@ -98,10 +117,15 @@ async def download_episodes(
     while attempts < max_attempts and current_to_download:
         attempts += 1
         logger.debug(f"Attempt {attempts}/{max_attempts}")
+        QUEUE_DEPTH.set(len(current_to_download), queue="download")
+        if attempts > 1:
+            EPISODE_RETRIES.inc(len(current_to_download))
         current_to_download = await process_chunks(
             current_to_download, chunk_size=chunk_size, credential=credential
         )
 
+    QUEUE_DEPTH.set(0, queue="download")
+
     # Optionally handle the failed downloads after all retries
     if current_to_download:
         logger.error(
@@ -1,9 +1,11 @@
 import asyncio
+import os
 import shutil
 import tempfile
+import time
 from collections.abc import MutableMapping, Sequence
 from pathlib import Path
-from typing import List, Literal, Union
+from typing import Dict, List, Literal, Optional, Union
 
 import aiohttp
 from bilibili_api import (
@@ -16,6 +18,17 @@ from bilibili_api import (
 
 from ..exceptions.DownloadError import DownloadError
 from ..utils.bp_log import Logger
+from ..utils.metrics import (
+    DOWNLOAD_BYTES,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_SECONDS,
+    DOWNLOAD_THROUGHPUT,
+    FFMPEG_SECONDS,
+    track_api_call,
+    url_host,
+)
+from ..utils.stream_cache import STREAM_CACHE, stream_key
+from ..utils.tracing import mark, record_stage, span
 
 FFMPEG_PATH = "ffmpeg"
 DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
@@ -126,9 +139,11 @@ async def download_url(
     last_error = None
     last_cause = None
     for url_index, url in enumerate(url_options, start=1):
+        host = url_host(url)
         for attempt in range(1, max_attempts + 1):
             process = 0
             length = 0
+            started = time.perf_counter()
             try:
                 if out.exists():
                     out.unlink()
@@ -158,6 +173,12 @@ async def download_url(
                         raise DownloadError(
                             "Incomplete download", url, process, length
                         )
+                duration = time.perf_counter() - started
+                record_stage("cdn_transfer", duration, name)
+                DOWNLOAD_BYTES.inc(process, host=host)
+                DOWNLOAD_SECONDS.observe(duration, host=host)
+                if duration > 0:
+                    DOWNLOAD_THROUGHPUT.observe(process / duration, host=host)
                 return
             except DownloadError as e:
                 error = e
@@ -177,10 +198,12 @@ async def download_url(
 
             last_error = error
             last_cause = cause
+            DOWNLOAD_BYTES.inc(process, host=host)
             if attempt == max_attempts and url_index == len(url_options):
                 if cause is not None:
                     raise error from cause
                 raise error
+            DOWNLOAD_RETRIES.inc(host=host, reason=error.message)
             if attempt == max_attempts:
                 logger.debug(
                     f"Downloading {name} failed after {max_attempts} attempts: "
@@ -201,6 +224,7 @@ async def download_url(
 
 
 async def run_ffmpeg(args):
+    started = time.perf_counter()
     process = await asyncio.create_subprocess_exec(
         FFMPEG_PATH,
         *args,
@@ -208,11 +232,41 @@ async def run_ffmpeg(args):
         stderr=asyncio.subprocess.PIPE,
     )
     stdout, stderr = await process.communicate()
+    elapsed = time.perf_counter() - started
+    FFMPEG_SECONDS.observe(
+        elapsed, result="ok" if process.returncode == 0 else "error"
+    )
+    record_stage("transcode", elapsed)
     if process.returncode != 0:
         # logger.error(f"FFmpeg error: {stderr.decode()}")
         raise RuntimeError(f"FFmpeg error: {stderr.decode()}")
 
 
+async def transcode(args: list, sources: Dict[Path, str]) -> None:
+    """
+    Run ffmpeg with `args` (output path last), or hardlink an identical output
+    made earlier from the same cached source streams.
+    """
+    outfile = Path(args[-1])
+    output_key = STREAM_CACHE.output_key(args, sources)
+    if STREAM_CACHE.link_output(output_key, outfile):
+        logger.debug(f"Linked {outfile.name} from an identical cached output")
+        return
+    # Never write through a hardlink shared with other files
+    outfile.unlink(missing_ok=True)
+    await run_ffmpeg(args)
+    STREAM_CACHE.store_output(output_key, outfile)
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """Hardlink `source` to `target`, copying across file systems."""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy(source, target)
+
+
 async def video_downloader(
     name: str,
     video_obj: video.Video,
@@ -232,6 +286,7 @@ async def video_downloader(
         "8K",
     ] = "1080P",
     audio_quality: Literal["64K", "132K", "192K", "HI_RES", "DOLBY"] = "192K",
+    timings: Optional[dict] = None,
 ) -> None:
     """
     Get video download url
@@ -250,12 +305,17 @@ async def video_downloader(
         audio_quality (Literal["64K", "132K", "192K", "HI_RES", "DOLBY"], optional) : audio quality. Defaults to "192K".
 
         format (Literal["video", "audio"], optional) : download format. Defaults to "audio".
+
+        timings (dict, optional) : episode timings to mark download_finished and transcode_finished in.
     """
     if format not in ["video", "audio"]:
         raise ValueError("format must be 'video', 'audio'")
 
     try:
-        v_url_data = await video_obj.get_download_url(0)
+        with span("download_url", name):
+            v_url_data = await track_api_call(
+                "video.get_download_url", video_obj.get_download_url(0)
+            )
     except ResponseCodeException:
         logger.debug(f"Failed to get video {name}, skipping.")
         return None
@@ -272,125 +332,131 @@ async def video_downloader(
     async with aiohttp.ClientSession() as session:
         tempdir = tempfile.TemporaryDirectory()
         tempdir_path = Path(tempdir.name)
-
-        # flv stream
-        if v_detecter.check_flv_mp4_stream() is True:
-            if isinstance(streams[0], video.FLVStreamDownloadURL):
-                temp_flv = tempdir_path / f"{name}_flv_temp.flv"
-                await download_url(
+        # Cached streams in use -> their cache key, for transcode()
+        sources: Dict[Path, str] = {}
+
+        async def fetch(stream, label: str, suffix: str, any_audio=False) -> Path:
+            path = await STREAM_CACHE.fetch(
+                name,
+                stream_key(stream),
+                suffix,
+                lambda out: download_url(
                     session,
-                    get_stream_urls(v_url_data, streams[0]),
-                    temp_flv,
-                    f"{name} FLV stream",
-                )
+                    get_stream_urls(v_url_data, stream),
+                    out,
+                    f"{name} {label}",
+                ),
+                tempdir_path,
+                any_audio=any_audio,
+            )
+            sources[path] = f"{name}/{path.name}"
+            return path
+
+        try:
+            # flv stream
+            if v_detecter.check_flv_mp4_stream() is True:
+                if isinstance(streams[0], video.FLVStreamDownloadURL):
+                    temp_flv = await fetch(streams[0], "FLV stream", ".flv")
+                    mark(timings, "download_finished")
+                    if format == "video":
+                        await transcode(
+                            [
+                                "-y",
+                                "-i",
+                                temp_flv,
+                                "-vcodec",
+                                "copy",
+                                "-acodec",
+                                "copy",
+                                str(outfile),
+                            ],
+                            sources,
+                        )
+                    elif format == "audio":
+                        await transcode(
+                            [
+                                "-y",
+                                "-i",
+                                temp_flv,
+                                "-vn",
+                                "-acodec",
+                                "copy",
+                                str(outfile),
+                            ],
+                            sources,
+                        )
+                    else:
+                        pass
+
+                # html5 mp4 stream
+                else:
+                    temp_mp4 = await fetch(streams[0], "HTML5 MP4 stream", ".mp4")
+                    mark(timings, "download_finished")
+                    if format == "video":
+                        # the stream is the output as is
+                        link_or_copy(temp_mp4, outfile)
+                    elif format == "audio":
+                        await transcode(
+                            [
+                                "-y",
+                                "-i",
+                                temp_mp4,
+                                "-vn",
+                                "-acodec",
+                                "libmp3lame",
+                                "-q:a",
+                                "2",
+                                str(outfile),
+                            ],
+                            sources,
+                        )
+            else:
+                # mp4 stream
                 if format == "video":
-                    await run_ffmpeg(
+                    temp_video, temp_audio = await asyncio.gather(
+                        fetch(streams[0], "Video stream", ".m4s"),
+                        fetch(streams[1], "Audio stream", ".m4s"),
+                    )
+                    mark(timings, "download_finished")
+                    # merge
+                    await transcode(
                         [
                             "-y",
                             "-i",
-                            temp_flv,
+                            temp_video,
+                            "-i",
+                            temp_audio,
                             "-vcodec",
                             "copy",
                             "-acodec",
                             "copy",
                             str(outfile),
-                        ]
+                        ],
+                        sources,
                     )
                 elif format == "audio":
-                    await run_ffmpeg(
-                        [
-                            "-y",
-                            "-i",
-                            temp_flv,
-                            "-vn",
-                            "-acodec",
-                            "copy",
-                            str(outfile),
-                        ]
+                    # Any cached audio stream at least as good will transcode
+                    temp_audio = await fetch(
+                        streams[1], "Audio stream", ".m4s", any_audio=True
                     )
-                else:
-                    pass
-
-            # html5 mp4 stream
-            else:
-                temp_mp4 = tempdir_path / f"{name}_mp4_temp.mp4"
-                await download_url(
-                    session,
-                    get_stream_urls(v_url_data, streams[0]),
-                    temp_mp4,
-                    f"{name} HTML5 MP4 stream",
-                )
-                if format == "video":
-                    # copy temp_mp4 to outfile
-                    shutil.copy(temp_mp4, outfile)
-                elif format == "audio":
-                    await run_ffmpeg(
+                    mark(timings, "download_finished")
+                    await transcode(
                         [
                             "-y",
                             "-i",
-                            temp_mp4,
+                            temp_audio,
                             "-vn",
                             "-acodec",
                             "libmp3lame",
-                            "-q:a",
-                            "2",
                             str(outfile),
-                        ]
+                        ],
+                        sources,
                     )
-        else:
-            # mp4 stream
-            temp_audio = tempdir_path / f"{name}_audio_temp.m4s"
-            temp_video = tempdir_path / f"{name}_video_temp.m4s"
-            if format == "video":
-
-                await asyncio.gather(
-                    download_url(
-                        session,
-                        get_stream_urls(v_url_data, streams[0]),
-                        temp_video,
-                        f"{name} Video stream",
-                    ),
-                    download_url(
-                        session,
-                        get_stream_urls(v_url_data, streams[1]),
-                        temp_audio,
-                        f"{name} Audio stream",
-                    ),
-                )
-                # merge
-                await run_ffmpeg(
-                    [
-                        "-y",
-                        "-i",
-                        temp_video,
-                        "-i",
-                        temp_audio,
-                        "-vcodec",
-                        "copy",
-                        "-acodec",
-                        "copy",
-                        str(outfile),
-                    ]
-                )
-            elif format == "audio":
-                await download_url(
-                    session,
-                    get_stream_urls(v_url_data, streams[1]),
-                    temp_audio,
-                    f"{name} Audio stream",
-                )
-                await run_ffmpeg(
-                    [
-                        "-y",
-                        "-i",
-                        temp_audio,
-                        "-vn",
-                        "-acodec",
-                        "libmp3lame",
-                        str(outfile),
-                    ]
-                )
-            else:
-                pass
+                else:
+                    pass
 
-        tempdir.cleanup()
+            mark(timings, "transcode_finished")
+        finally:
+            STREAM_CACHE.release(sources)
+            tempdir.cleanup()
+            STREAM_CACHE.prune()
@@ -0,0 +1,219 @@
+"""
+Admin jobs: work requested through the web server's /admin endpoints.
+
+The web server validates a request and `submit`s a job, answering with the
+job id at once; `run_admin_jobs` runs the jobs one at a time on the main
+event loop. A job does its work directly (listing, pipeline, feed
+generation) instead of waiting for the scheduler or the episode diff queue,
+so it is not held up by background polling.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bilibili_api import Credential
+from tinydb import Query, table
+
+from ..bp_class import Pod
+from ..feed import generate_feed_xml
+from ..utils.biliuser import get_episode_list
+from ..utils.bp_log import Logger
+from ..utils.db_query import query_episode
+from ..utils.metrics import QUEUE_DEPTH
+from .initialize import episode_needs_download
+from .pipeline import listed, run_pipeline
+from .retention import prune_expired_episodes
+from .update import EPISODE_DIFFS, update_pod
+
+logger = Logger().get_logger()
+
+# Jobs waiting to run; more are refused with 503
+MAX_PENDING_JOBS = 100
+# Finished jobs kept for status requests
+JOB_HISTORY = 100
+JOB_KINDS = ("refresh", "regenerate", "retry")
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    target: str
+    status: str = "queued"  # queued, running, done or failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobQueue:
+    """Bounded FIFO of admin jobs plus the recent job records."""
+
+    def __init__(self, maxsize: int = MAX_PENDING_JOBS, history: int = JOB_HISTORY):
+        self.maxsize = maxsize
+        self.history = history
+        self._queue: Optional[asyncio.Queue] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def start(self) -> None:
+        """Accept jobs, to be run in the running event loop."""
+        self._queue = asyncio.Queue(self.maxsize)
+
+    def submit(self, kind: str, target: str) -> Optional[Job]:
+        """Queue a job; None if jobs are not running yet or the queue is full."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None or self._queue.full():
+            return None
+        job = Job(id=uuid.uuid4().hex, kind=kind, target=target)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        QUEUE_DEPTH.set(self._queue.qsize(), queue="admin_jobs")
+        self._trim()
+        return job
+
+    def _trim(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("done", "failed")
+        ]
+        for job_id in finished[: max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def status(self) -> dict:
+        """Jobs and the depth of the queues they bypass, for /admin/jobs."""
+        return {
+            "queues": {
+                "admin_jobs": self._queue.qsize() if self._queue is not None else 0,
+                "episode_diffs": EPISODE_DIFFS.qsize(),
+            },
+            "jobs": [job.to_dict() for job in reversed(self.jobs())],
+        }
+
+    async def run(self, handlers: Dict[str, Callable[[str], Awaitable[str]]]) -> None:
+        while True:
+            job = await self._queue.get()
+            QUEUE_DEPTH.set(self._queue.qsize(), queue="admin_jobs")
+            job.status, job.started_at = "running", time.time()
+            logger.info(f"Admin job {job.id}: {job.kind} {job.target}")
+            try:
+                job.result = await handlers[job.kind](job.target)
+                job.status = "done"
+            except Exception as e:
+                logger.exception(f"Admin job {job.id} failed: {e}")
+                job.result, job.status = str(e), "failed"
+            job.finished_at = time.time()
+            self._trim()
+
+
+ADMIN_JOBS = JobQueue()
+
+
+def stored_pod(pod_tbl: table.Table, feed_name: str) -> Optional[Pod]:
+    """The pod of a feed id, or of a feed XML name without the "feed." prefix."""
+    matches = pod_tbl.search(Query().feed_id.one_of([feed_name, f"feed.{feed_name}"]))
+    return Pod.from_dict(matches[0]) if matches else None
+
+
+def pods_listing(pod_tbl: table.Table, bvid: str) -> List[Pod]:
+    return [
+        Pod.from_dict(pod_info)
+        for pod_info in pod_tbl.all()
+        if any(episode["bvid"] == bvid for episode in pod_info.get("episodes") or [])
+    ]
+
+
+async def refresh_feed(
+    feed_id: str,
+    pod_tbl: table.Table,
+    episode_tbl: table.Table,
+    credential: Credential,
+) -> str:
+    """List a feed now, then download and publish what it added."""
+    pod = stored_pod(pod_tbl, feed_id)
+    if pod is None:
+        raise LookupError(f"Feed {feed_id} not found")
+    added = await update_pod(pod, pod_tbl, credential, queue_diff=False)
+    if added is None:
+        raise RuntimeError(f"Failed to list feed {feed_id}")
+    await prune_expired_episodes(pod_tbl, episode_tbl)
+    episode_list = [
+        episode
+        for episode in get_episode_list(pod)
+        if episode.bvid in added and not episode_tbl.search(query_episode(episode))
+    ]
+    downloaded = await run_pipeline(
+        listed([(pod, episode_list)]), episode_tbl, credential
+    )
+    return f"{len(added)} new episodes, {downloaded} downloaded"
+
+
+async def regenerate_feed(
+    feed_id: str, pod_tbl: table.Table, episode_tbl: table.Table
+) -> str:
+    pod = stored_pod(pod_tbl, feed_id)
+    if pod is None:
+        raise LookupError(f"Feed {feed_id} not found")
+    await asyncio.to_thread(generate_feed_xml, pod=pod, episode_tbl=episode_tbl)
+    return f"Feed {pod.feed_id} regenerated"
+
+
+async def retry_episode(
+    bvid: str,
+    pod_tbl: table.Table,
+    episode_tbl: table.Table,
+    credential: Credential,
+) -> str:
+    """Download an episode again for every feed listing it without its media."""
+    listing = []
+    for pod in pods_listing(pod_tbl, bvid):
+        episode_list = [
+            episode
+            for episode in get_episode_list(pod)
+            if episode.bvid == bvid and episode_needs_download(episode, episode_tbl)
+        ]
+        listing.append((pod, episode_list))
+    if not listing:
+        raise LookupError(f"Episode {bvid} is not in any feed")
+    if not any(episode_list for _, episode_list in listing):
+        return f"Episode {bvid} is already downloaded"
+    downloaded = await run_pipeline(listed(listing), episode_tbl, credential)
+    return f"{downloaded} variants of {bvid} downloaded"
+
+
+async def run_admin_jobs(
+    pod_tbl: table.Table, episode_tbl: table.Table, credential: Credential
+) -> None:
+    """Run admin jobs submitted to ADMIN_JOBS until cancelled."""
+    ADMIN_JOBS.start()
+    await ADMIN_JOBS.run(
+        {
+            "refresh": lambda feed_id: refresh_feed(
+                feed_id, pod_tbl, episode_tbl, credential
+            ),
+            "regenerate": lambda feed_id: regenerate_feed(
+                feed_id, pod_tbl, episode_tbl
+            ),
+            "retry": lambda bvid: retry_episode(
+                bvid, pod_tbl, episode_tbl, credential
+            ),
+        }
+    )
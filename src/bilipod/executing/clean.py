@@ -1,43 +1,102 @@
+import os
+import time
 from pathlib import Path
 
 from tinydb import Query, table
 
-from ..bp_class import Episode, Pod
-from ..utils.biliuser import get_episode_list
 from ..utils.bp_log import Logger
-from ..utils.db_query import query_episode
+from ..utils.compress import remove_precompressed
+from ..utils.db_writer import db_write
+from ..utils.file_cache import invalidate_cached_file
+from ..utils.quota import STORAGE_BUDGET
 
 logger = Logger().get_logger()
 
 
-def clean_unused_episodes(episode_tbl: table.Table, data_dir: Path):
+def _orphaned_media(media_dir, known: set, cutoff: float) -> list:
+    orphans = []
+    with os.scandir(media_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                # Subdirectories of the hashed media layout
+                orphans.extend(_orphaned_media(entry.path, known, cutoff))
+                continue
+            if not entry.is_file(follow_symlinks=False) or entry.path in known:
+                continue
+            # Recently written files may belong to a download still in progress
+            if cutoff and entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            orphans.append(entry.path)
+    return orphans
+
+
+def clean_unused_episodes(
+    episode_tbl: table.Table, data_dir: Path, grace_period: float = 0
+):
+    """
+    Delete media files no episode row points at. Files modified within the
+    last `grace_period` seconds are kept.
+    """
     media_dir = Path(data_dir) / "media"
-    for media in media_dir.iterdir():
-        if media.is_file():
-            query = episode_tbl.search(Query().location == str(media))
-            if not query:
-                media.unlink()
-                logger.debug(f"Deleted unused episode: {media}")
+    if not media_dir.is_dir():
+        return
+    known = {
+        episode_info.get("location")
+        for episode_info in episode_tbl.all()
+        if episode_info.get("location")
+    }
+    cutoff = time.time() - grace_period if grace_period > 0 else 0
+    orphans = _orphaned_media(media_dir, known, cutoff)
+    for media in orphans:
+        STORAGE_BUDGET.remove_file(media)
+        logger.debug(f"Deleted unused episode: {media}")
+
+    logger.debug(f"Cleaned {len(orphans)} unused media files.")
 
 
-def clean_untracked_episodes(
+def episode_key(episode_info: dict) -> tuple:
+    return (
+        episode_info.get("bvid"),
+        episode_info.get("quality"),
+        episode_info.get("format"),
+    )
+
+
+def tracked_episode_keys(pod_tbl: table.Table) -> set:
+    """(bvid, quality, format) of every episode listed by a pod."""
+    keys = set()
+    for pod_info in pod_tbl.all():
+        quality, format = pod_info.get("quality"), pod_info.get("format")
+        for episode_info in pod_info.get("episodes") or []:
+            keys.add((episode_info["bvid"], quality, format))
+    return keys
+
+
+def _remove_untracked(pod_tbl: table.Table, episode_tbl: table.Table) -> list:
+    tracked = tracked_episode_keys(pod_tbl)
+    untracked = [
+        episode_info
+        for episode_info in episode_tbl.all()
+        if episode_key(episode_info) not in tracked
+    ]
+    if untracked:
+        episode_tbl.remove(doc_ids=[episode_info.doc_id for episode_info in untracked])
+    return untracked
+
+
+async def clean_untracked_episodes(
     pod_tbl: table.Table,
     episode_tbl: table.Table,
 ):
-    episode_tbl.update({"tracking": False})
-    for pod_info in pod_tbl.all():
-        pod = Pod.from_dict(pod_info)
-        for episode in get_episode_list(pod):
-            episode_tbl.update({"tracking": True}, query_episode(episode))
-
-    for episode_info in episode_tbl.search(Query().tracking == False):  # noqa E712
-        episode = Episode.from_dict(episode_info)
-        if episode.location is not None and episode.location.exists():
-            episode.clean()
-            logger.debug(f"Deleted untracked episode: {episode.location}")
-        episode_tbl.remove(query_episode(episode))
+    # One pass and one write: reconcile rows on the writer, then delete files
+    removed = await db_write(episode_tbl, _remove_untracked, pod_tbl, episode_tbl)
+    for episode_info in removed:
+        location = episode_info.get("location")
+        if location and Path(location).exists():
+            STORAGE_BUDGET.remove_file(location)
+            logger.debug(f"Deleted untracked episode: {location}")
 
-    logger.debug("Cleaned untracked episodes.")
+    logger.debug(f"Cleaned {len(removed)} untracked episodes.")
 
 
 def clean_unused_rss(pod_tbl: table.Table, data_dir):
@@ -47,4 +106,6 @@ def clean_unused_rss(pod_tbl: table.Table, data_dir):
         feed_id2 = f"feed.{filename.stem}"
         if not pod_tbl.search(Query().feed_id.one_of([feed_id1, feed_id2])):
             filename.unlink()
+            remove_precompressed(filename)
+            invalidate_cached_file(filename)
             logger.debug(f"Deleted unused RSS file: {filename.stem}")
@@ -1,6 +1,8 @@
 import asyncio
+import hashlib
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 from bilibili_api import Credential
 from tinydb import Query, table
@@ -9,13 +11,125 @@ from ..bp_class import Pod
 from ..feed import generate_opml
 from ..utils.bp_log import Logger
 from ..utils.config_parser import FeedConfig, ServerConfig, load_feed_configs
+from ..utils.db_writer import db_write
+from ..utils.storage import flush_storage
 from .clean import clean_untracked_episodes, clean_unused_rss
-from .initialize import initialize_or_update_feed
-from .scheduler import clear_feed_job, feed_job_tag, schedule_job
+from .initialize import apply_feed_settings, initialize_or_update_feed
+from .scheduler import clear_feed_job, feed_job_tag, schedule_job, set_feed_period
 from .update import update_pod
 
 logger = Logger().get_logger()
-FEED_CONFIG_WATCH_INTERVAL = 30
+# Seconds between stat() checks of the config file
+FEED_CONFIG_POLL_INTERVAL = 1
+# Seconds the file must stay unchanged before a burst of writes is applied
+FEED_CONFIG_DEBOUNCE = 1
+
+
+def config_file_state(config_path: str | Path) -> Optional[tuple]:
+    """mtime, size and inode of the config file; None if it is missing."""
+    try:
+        file_stat = os.stat(config_path)
+    except OSError:
+        return None
+    return (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino)
+
+
+def config_file_digest(config_path: str | Path) -> Optional[str]:
+    try:
+        with open(config_path, "rb") as file:
+            return hashlib.sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class ConfigFileWatcher:
+    """
+    Wait for the content of a file to change. The file is only stat()ed
+    while idle; once its stat changes and then stays the same for `debounce`
+    seconds, its content hash decides whether it really changed, so saves
+    that only touch the file and the partial writes of an editor are ignored.
+    """
+
+    def __init__(
+        self,
+        config_path: str | Path,
+        poll_interval: float = FEED_CONFIG_POLL_INTERVAL,
+        debounce: float = FEED_CONFIG_DEBOUNCE,
+    ):
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._state = config_file_state(config_path)
+        self._digest = config_file_digest(config_path)
+
+    async def _settled_state(self, state: Optional[tuple]) -> Optional[tuple]:
+        while True:
+            await asyncio.sleep(self.debounce)
+            latest = config_file_state(self.config_path)
+            if latest == state:
+                return state
+            state = latest
+
+    async def wait_for_change(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            state = config_file_state(self.config_path)
+            if state == self._state:
+                continue
+            self._state = await self._settled_state(state)
+            digest = config_file_digest(self.config_path)
+            # A missing file is a replace in progress, not an empty config
+            if digest is None or digest == self._digest:
+                continue
+            self._digest = digest
+            return
+
+
+# What a change to each feed field takes, from cheapest to dearest; each
+# action includes the ones before it. Fields not listed (uid, sid, fid,
+# playlist_type, page_size, keyword, playlist_sort, keep_last) change the
+# listing itself and refresh the feed from bilibili.
+FEED_CHANGE_ACTIONS = ("reschedule", "feed_xml", "variants", "refresh")
+FEED_FIELD_ACTIONS = {
+    "update_period": "reschedule",
+    "endorse": "reschedule",
+    "private_feed": "reschedule",
+    "title": "feed_xml",
+    "description": "feed_xml",
+    "author": "feed_xml",
+    "cover_art": "feed_xml",
+    "category": "feed_xml",
+    "subcategories": "feed_xml",
+    "explicit": "feed_xml",
+    "lang": "feed_xml",
+    "link": "feed_xml",
+    "opml": "feed_xml",
+    "quality": "variants",
+    "format": "variants",
+}
+
+
+def changed_feed_fields(current: FeedConfig, latest: FeedConfig) -> list[str]:
+    current_values, latest_values = current.to_dict(), latest.to_dict()
+    return sorted(
+        name
+        for name, value in latest_values.items()
+        if current_values.get(name) != value
+    )
+
+
+def feed_change_action(current: FeedConfig, latest: FeedConfig) -> str:
+    """The cheapest of FEED_CHANGE_ACTIONS that applies the change of a feed."""
+    latest_values = latest.to_dict()
+    action = FEED_CHANGE_ACTIONS[0]
+    for name in changed_feed_fields(current, latest):
+        # Without the override the value comes from bilibili again
+        if latest_values[name] is None:
+            field_action = "refresh"
+        else:
+            field_action = FEED_FIELD_ACTIONS.get(name, "refresh")
+        action = max(action, field_action, key=FEED_CHANGE_ACTIONS.index)
+    return action
 
 
 def feed_config_snapshot(feeds: Dict[str, FeedConfig]) -> dict:
@@ -27,6 +141,7 @@ def _format_feed_ids(feed_ids: list[str]) -> str:
 
 
 def schedule_pod_update(pod: Pod, pod_tbl: table.Table, credential: Credential):
+    set_feed_period(pod.feed_id, pod.update_period)
     return schedule_job(
         update_interval=pod.update_period,
         job=update_pod,
@@ -67,24 +182,44 @@ async def sync_feed_config(
     applied_added_feed_ids = []
     applied_updated_feed_ids = []
     changed = False
+    # Only feeds that were removed or listed again can leave episodes behind
+    needs_cleanup = bool(removed_feed_ids)
 
     for feed_id in removed_feed_ids:
         clear_feed_job(feed_id)
-        pod_tbl.remove(Query().feed_id == feed_id)
+        await db_write(pod_tbl, pod_tbl.remove, Query().feed_id == feed_id)
         applied_feeds.pop(feed_id, None)
         changed = True
 
     for feed_id in added_feed_ids + updated_feed_ids:
+        action = "refresh"
+        if feed_id in updated_feed_ids:
+            current, latest = current_feeds[feed_id], latest_feeds[feed_id]
+            action = feed_change_action(current, latest)
+            changed_fields = ", ".join(changed_feed_fields(current, latest))
+            logger.debug(f"Feed {feed_id} changed ({changed_fields}): {action}")
         try:
-            pod = await initialize_or_update_feed(
-                feed_id=feed_id,
-                feed_config=latest_feeds[feed_id],
-                server_config=server_config,
-                data_dir=data_dir,
-                pod_tbl=pod_tbl,
-                episode_tbl=episode_tbl,
-                credential=credential,
-            )
+            pod = None
+            if action != "refresh":
+                pod = await apply_feed_settings(
+                    feed_id=feed_id,
+                    feed_config=latest_feeds[feed_id],
+                    action=action,
+                    pod_tbl=pod_tbl,
+                    episode_tbl=episode_tbl,
+                    credential=credential,
+                )
+            if pod is None:
+                action = "refresh"
+                pod = await initialize_or_update_feed(
+                    feed_id=feed_id,
+                    feed_config=latest_feeds[feed_id],
+                    server_config=server_config,
+                    data_dir=data_dir,
+                    pod_tbl=pod_tbl,
+                    episode_tbl=episode_tbl,
+                    credential=credential,
+                )
         except Exception as e:
             logger.exception(f"Failed to apply feed config for {feed_id}: {e}")
             continue
@@ -96,12 +231,16 @@ async def sync_feed_config(
             applied_added_feed_ids.append(feed_id)
         else:
             applied_updated_feed_ids.append(feed_id)
+        needs_cleanup = needs_cleanup or action == "refresh"
         changed = True
 
     if changed:
         generate_opml(pod_tbl=pod_tbl, filename=Path(data_dir) / "podcast.opml")
-        clean_unused_rss(pod_tbl, data_dir)
-        clean_untracked_episodes(pod_tbl, episode_tbl)
+        if removed_feed_ids:
+            clean_unused_rss(pod_tbl, data_dir)
+        if needs_cleanup:
+            await clean_untracked_episodes(pod_tbl, episode_tbl)
+        flush_storage(pod_tbl)
         logger.info(
             "Feed config reloaded. "
             f"added: {_format_feed_ids(applied_added_feed_ids)}, "
@@ -120,13 +259,16 @@ async def watch_feed_config_changes(
     episode_tbl: table.Table,
     credential: Credential,
     initial_feeds: Dict[str, FeedConfig],
-    interval: int = FEED_CONFIG_WATCH_INTERVAL,
+    poll_interval: float = FEED_CONFIG_POLL_INTERVAL,
+    debounce: float = FEED_CONFIG_DEBOUNCE,
 ) -> None:
     current_feeds = dict(initial_feeds)
-    logger.info(f"Watching feed config changes every {interval} seconds.")
+    watcher = ConfigFileWatcher(config_path, poll_interval, debounce)
+    logger.info(f"Watching feed config changes in {config_path}.")
 
+    # The first pass applies edits made while the service was starting, which
+    # the watcher's initial state already includes
     while True:
-        await asyncio.sleep(interval)
         try:
             current_feeds = await sync_feed_config(
                 config_path=config_path,
@@ -139,3 +281,4 @@ async def watch_feed_config_changes(
             )
         except Exception as e:
             logger.exception(f"Failed to reload feed config: {e}")
+        await watcher.wait_for_change()
@@ -0,0 +1,118 @@
+"""
+Least-recently-served eviction for the storage budget (see utils/quota.py).
+
+When a download does not fit, the budget calls `evict_least_recently_served`
+with the bytes it needs. Downloaded episodes are removed in order of when the
+web server last served them (download time if never served since startup),
+except each feed's newest `keep_last` episodes. Evicted rows stay in the
+table marked `status: deleted`, so they are not downloaded again while their
+feed still lists them; those feeds are regenerated without them.
+"""
+
+import asyncio
+import os
+from functools import partial
+
+from tinydb import table
+
+from ..bp_class import Pod
+from ..feed import generate_feed_xml
+from ..utils.bp_log import Logger
+from ..utils.db_writer import db_write
+from ..utils.metrics import EVICTED_EPISODES
+from ..utils.quota import STORAGE_BUDGET
+from ..utils.stream_cache import STREAM_CACHE
+from .clean import episode_key
+from .retention import retention_limit
+
+logger = Logger().get_logger()
+
+
+def _pod_keys(pod_info: dict, episodes) -> set:
+    quality, format = pod_info.get("quality"), pod_info.get("format")
+    return {(episode["bvid"], quality, format) for episode in episodes}
+
+
+def protected_episode_keys(pod_tbl: table.Table) -> set:
+    """(bvid, quality, format) of the newest keep_last episodes of every feed."""
+    protected = set()
+    for pod_info in pod_tbl.all():
+        limit = retention_limit(pod_info.get("keep_last"))
+        if limit is None:
+            continue
+        newest = sorted(
+            pod_info.get("episodes") or [],
+            key=lambda episode: episode.get("pubdate") or 0,
+            reverse=True,
+        )
+        protected |= _pod_keys(pod_info, newest[:limit])
+    return protected
+
+
+def _select_evictions(
+    pod_tbl: table.Table, episode_tbl: table.Table, needed: int
+) -> list:
+    protected = protected_episode_keys(pod_tbl)
+    candidates = []
+    for episode_info in episode_tbl.all():
+        location = episode_info.get("location")
+        if (
+            not location
+            or episode_info.get("status") == "deleted"
+            or episode_key(episode_info) in protected
+        ):
+            continue
+        try:
+            media_stat = os.stat(location)
+        except OSError:
+            continue
+        served = STORAGE_BUDGET.last_served(location, media_stat.st_mtime)
+        candidates.append((served, media_stat.st_size, episode_info))
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    evicted, freed = [], 0
+    for _, size, episode_info in candidates:
+        if freed >= needed:
+            break
+        evicted.append(episode_info)
+        freed += size
+    if evicted:
+        episode_tbl.update(
+            {"status": "deleted"},
+            doc_ids=[episode_info.doc_id for episode_info in evicted],
+        )
+    return evicted
+
+
+async def evict_least_recently_served(
+    pod_tbl: table.Table, episode_tbl: table.Table, needed: int
+) -> int:
+    """Evict episodes until `needed` bytes are freed; returns the bytes freed."""
+    evicted = await db_write(
+        episode_tbl, _select_evictions, pod_tbl, episode_tbl, needed
+    )
+    if not evicted:
+        return 0
+
+    freed = 0
+    for episode_info in evicted:
+        # A cache link to the same inode would keep the bytes on disk
+        STREAM_CACHE.unlink_shared(episode_info["location"])
+        freed += STORAGE_BUDGET.remove_file(episode_info["location"])
+        logger.debug(f"Evicted episode: {episode_info['location']}")
+    EVICTED_EPISODES.inc(len(evicted))
+
+    evicted_keys = {episode_key(episode_info) for episode_info in evicted}
+    for pod_info in pod_tbl.all():
+        if _pod_keys(pod_info, pod_info.get("episodes") or []) & evicted_keys:
+            await asyncio.to_thread(
+                generate_feed_xml, pod=Pod.from_dict(pod_info), episode_tbl=episode_tbl
+            )
+
+    logger.info(f"Evicted {len(evicted)} episodes, freed {freed} bytes.")
+    return freed
+
+
+def enable_eviction(pod_tbl: table.Table, episode_tbl: table.Table) -> None:
+    """Let the storage budget evict from these tables when it runs out."""
+    STORAGE_BUDGET.evict = partial(evict_least_recently_served, pod_tbl, episode_tbl)
@@ -1,19 +1,25 @@
 import asyncio
 import time
 from pathlib import Path
+from typing import Optional
 
 from bilibili_api import Credential
 from tinydb import Query, table
 
 from ..bp_class import Episode, Pod
-from ..downloader import download_episodes
 from ..feed import generate_feed_xml, generate_opml
 from ..utils.biliuser import get_episode_list, get_pod_info
 from ..utils.bp_log import Logger
 from ..utils.config_parser import BiliPodConfig, FeedConfig, ServerConfig
 from ..utils.db_query import query_episode
+from ..utils.db_writer import db_write
+from ..utils.media_layout import migrate_media_layout
+from ..utils.storage import flush_storage
+from ..utils.tracing import stamp_discovered
 from ..utils.url import join_url, sanitize_url
 from .clean import clean_unused_episodes, clean_unused_rss
+from .pipeline import listed, run_pipeline
+from .retention import expire_episodes, prune_expired_episodes, retain_episodes
 
 logger = Logger().get_logger()
 
@@ -61,14 +67,32 @@ async def initialize_feed_pod(
         playlist_sort=feed_config.playlist_sort,
     )
 
+    previous_pod = pod_tbl.get(Query().feed_id == feed_id)
+    previous_episodes = previous_pod.get("episodes") if previous_pod else None
+    stamp_discovered(pod_info["episodes"], previous_episodes)
     pod.update(**pod_info)
     pod.update(**{k: v for k, v in feed_config.to_dict().items() if v is not None})
+    pod.episodes = retain_episodes(pod, pod.episodes, previous_episodes)
     pod.update_at = time.time()
-    pod_tbl.upsert(pod.to_dict(), Query().feed_id == feed_id)
+    await db_write(pod_tbl, pod_tbl.upsert, pod.to_dict(), Query().feed_id == feed_id)
     return pod
 
 
-def _episode_needs_download(episode: Episode, episode_tbl: table.Table) -> bool:
+def _relocate_episodes(episode_tbl: table.Table, moved: dict) -> None:
+    def relocate(episode_info):
+        episode_info["location"] = moved[episode_info["location"]]
+
+    episode_tbl.update(relocate, Query().location.one_of(list(moved)))
+
+
+async def migrate_media(data_dir: Path | str, episode_tbl: table.Table) -> None:
+    """Move media files into the configured layout and update their rows."""
+    moved = migrate_media_layout(Path(data_dir) / "media")
+    if moved:
+        await db_write(episode_tbl, _relocate_episodes, episode_tbl, moved)
+
+
+def episode_needs_download(episode: Episode, episode_tbl: table.Table) -> bool:
     matches = episode_tbl.search(query_episode(episode))
     if not matches:
         return True
@@ -77,9 +101,23 @@ def _episode_needs_download(episode: Episode, episode_tbl: table.Table) -> bool:
     return stored_episode.status != "downloaded" or not stored_episode.exists()
 
 
-def _upsert_episodes(episode_list: list[Episode], episode_tbl: table.Table) -> None:
-    for episode in episode_list:
-        episode_tbl.upsert(episode.to_dict(), query_episode(episode))
+async def download_feed_episodes(
+    pod: Pod, episode_tbl: table.Table, credential: Credential
+) -> None:
+    """
+    Download the episodes of a pod's listing that are not downloaded yet,
+    publishing the feed as they are committed.
+    """
+    episode_to_update = [
+        episode
+        for episode in set(get_episode_list(pod))
+        if episode_needs_download(episode, episode_tbl)
+    ]
+    if episode_to_update:
+        logger.info(
+            f"Downloading {len(episode_to_update)} episodes for feed {pod.feed_id}."
+        )
+    await run_pipeline(listed([(pod, episode_to_update)]), episode_tbl, credential)
 
 
 async def initialize_or_update_feed(
@@ -100,23 +138,42 @@ async def initialize_or_update_feed(
         credential=credential,
     )
 
-    episode_list = list(set(get_episode_list(pod)))
-    episode_to_update = [
-        episode
-        for episode in episode_list
-        if _episode_needs_download(episode, episode_tbl)
-    ]
+    await prune_expired_episodes(pod_tbl, episode_tbl)
+    await download_feed_episodes(pod, episode_tbl, credential)
+    return pod
 
-    if episode_to_update:
-        logger.info(
-            f"Downloading {len(episode_to_update)} episodes for feed {feed_id}."
-        )
-        await download_episodes(
-            episode_to_update, credential=credential, max_attempts=10
-        )
-        _upsert_episodes(episode_to_update, episode_tbl)
 
-    generate_feed_xml(pod=pod, episode_tbl=episode_tbl)
+async def apply_feed_settings(
+    feed_id: str,
+    feed_config: FeedConfig,
+    action: str,
+    pod_tbl: table.Table,
+    episode_tbl: table.Table,
+    credential: Credential,
+) -> Optional[Pod]:
+    """
+    Apply a feed config change that keeps the feed's listing (see
+    `config_watcher.feed_change_action`) to the stored pod, without fetching
+    the listing again. None if the pod is not stored yet.
+    """
+    pod_info = pod_tbl.get(Query().feed_id == feed_id)
+    if pod_info is None:
+        return None
+
+    pod = Pod.from_dict(pod_info)
+    previous_variant = (pod.quality, pod.format)
+    pod.update(**{k: v for k, v in feed_config.to_dict().items() if v is not None})
+    await db_write(pod_tbl, pod_tbl.update, pod.to_dict(), doc_ids=[pod_info.doc_id])
+
+    if action == "variants":
+        await download_feed_episodes(pod, episode_tbl, credential)
+        if (pod.quality, pod.format) != previous_variant:
+            expire_episodes(
+                (episode["bvid"], *previous_variant) for episode in pod.episodes or []
+            )
+            await prune_expired_episodes(pod_tbl, episode_tbl)
+    if action != "reschedule":
+        await asyncio.to_thread(generate_feed_xml, pod=pod, episode_tbl=episode_tbl)
     return pod
 
 
@@ -127,36 +184,26 @@ async def data_initialize(
     credential: Credential,
 ) -> None:
 
-    for feed_id, feed_config in config.feeds.items():
-        await initialize_feed_pod(
-            feed_id=feed_id,
-            feed_config=feed_config,
-            server_config=config.server,
-            data_dir=config.storage.data_dir,
-            pod_tbl=pod_tbl,
-            credential=credential,
-        )
-
-    # init episode list
-    episode_list = []
-    for pod_info in pod_tbl.all():
-        pod = Pod.from_dict(pod_info)
-        pod_episode_list = get_episode_list(pod)
-        episode_list.extend(pod_episode_list)
-
-    logger.info(f"Initializing download, {len(episode_list)} episodes found.")
-    if episode_list:
-        await download_episodes(episode_list, credential=credential, max_attempts=10)
-
-    if episode_list:
-        episode_tbl.insert_multiple(
-            [episode.to_dict() for episode in set(episode_list)]
-        )
-
-    # init feed xml
-    for pod_info in pod_tbl.all():
-        pod = Pod.from_dict(pod_info)
-        generate_feed_xml(pod=pod, episode_tbl=episode_tbl)
+    await migrate_media(config.storage.data_dir, episode_tbl)
+
+    # List the feeds one by one; each feed's downloads start while the next
+    # one is listed, and each feed is published as its episodes are ready
+    async def listing():
+        for feed_id, feed_config in config.feeds.items():
+            pod = await initialize_feed_pod(
+                feed_id=feed_id,
+                feed_config=feed_config,
+                server_config=config.server,
+                data_dir=config.storage.data_dir,
+                pod_tbl=pod_tbl,
+                credential=credential,
+            )
+            episode_list = get_episode_list(pod)
+            logger.info(f"Feed {feed_id}: {len(episode_list)} episodes found.")
+            yield pod, episode_list
+
+    downloaded = await run_pipeline(listing(), episode_tbl, credential)
+    logger.info(f"Initialized {downloaded} episodes.")
 
     generate_opml(
         pod_tbl=pod_tbl,
@@ -164,4 +211,9 @@ async def data_initialize(
     )
 
     clean_unused_rss(pod_tbl, config.storage.data_dir)
-    clean_unused_episodes(episode_tbl, config.storage.data_dir)
+    clean_unused_episodes(
+        episode_tbl,
+        config.storage.data_dir,
+        grace_period=config.storage.orphan_grace_period,
+    )
+    flush_storage(episode_tbl)
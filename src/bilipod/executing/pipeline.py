@@ -0,0 +1,187 @@
+"""
+Staged episode pipeline from listing to publishing.
+
+    list -> download -> commit -> publish
+
+The list stage is an async iterator of (pod, episodes to download). Download
+workers fetch each episode's metadata, download its streams and transcode
+them (`download_episode`); the commit stage writes finished episodes to the
+episode table in batches, and the publish stage regenerates the feeds that
+list them. The stages are joined by bounded queues, so a listing that is
+faster than the downloads waits for them instead of holding every pending
+episode in memory, and an episode is in its feed as soon as its batch is
+committed rather than when the whole run ends.
+"""
+
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from bilibili_api import Credential
+from tinydb import table
+
+from ..bp_class import Episode, Pod
+from ..downloader import downloader
+from ..feed import generate_feed_xml
+from ..utils.bp_log import Logger
+from ..utils.db_writer import db_write
+from ..utils.metrics import EPISODE_RETRIES, QUEUE_DEPTH
+from ..utils.tracing import span
+from .clean import episode_key
+
+logger = Logger().get_logger()
+
+# Concurrent downloads
+DOWNLOAD_WORKERS = 20
+# Items held between two stages
+STAGE_QUEUE_SIZE = 2 * DOWNLOAD_WORKERS
+
+Listing = AsyncIterator[Tuple[Pod, List[Episode]]]
+_DONE = object()
+
+
+async def listed(items: Iterable[Tuple[Pod, List[Episode]]]) -> Listing:
+    """A list stage over (pod, episodes) that are already listed."""
+    for pod, episodes in items:
+        yield pod, episodes
+
+
+def _commit_episodes(episodes: List[Episode], episode_tbl: table.Table) -> None:
+    rows = {}
+    for episode in episodes:
+        row = episode.to_dict()
+        rows[episode_key(row)] = row
+    stored = {
+        episode_key(episode_info): episode_info.doc_id
+        for episode_info in episode_tbl.all()
+        if episode_key(episode_info) in rows
+    }
+    for key, doc_id in stored.items():
+        episode_tbl.update(rows.pop(key), doc_ids=[doc_id])
+    if rows:
+        episode_tbl.insert_multiple(rows.values())
+
+
+async def _download(
+    episode: Episode, credential: Optional[Credential], max_attempts: int
+) -> bool:
+    for attempt in range(1, max_attempts + 1):
+        if attempt > 1:
+            EPISODE_RETRIES.inc()
+            await asyncio.sleep(downloader.CHUNK_INTERVAL * (attempt - 1))
+        if await downloader.download_episode(episode, credential) is None:
+            return True
+    logger.error(f"Episode {episode.bvid} failed to download after all retries.")
+    return False
+
+
+async def run_pipeline(
+    listing: Listing,
+    episode_tbl: table.Table,
+    credential: Optional[Credential] = None,
+    max_attempts: int = 10,
+    workers: int = DOWNLOAD_WORKERS,
+) -> int:
+    """
+    Download, commit and publish the episodes of `listing`; every listed
+    feed is published at least once. Returns the number of episodes
+    downloaded. Failed episodes are committed too, as before, so they are not
+    retried on every refresh.
+    """
+    download_queue: asyncio.Queue = asyncio.Queue(STAGE_QUEUE_SIZE)
+    commit_queue: asyncio.Queue = asyncio.Queue(STAGE_QUEUE_SIZE)
+    publish_queue: asyncio.Queue = asyncio.Queue(STAGE_QUEUE_SIZE)
+    pods: Dict[str, Pod] = {}
+    # Feeds waiting for each queued episode, by (bvid, quality, format)
+    waiting: Dict[tuple, set] = {}
+    committed: set = set()
+    downloaded = 0
+
+    async def list_stage():
+        async for pod, episodes in listing:
+            pods[pod.feed_id] = pod
+            for episode in episodes:
+                key = (episode.bvid, episode.quality, episode.format)
+                if key in committed:
+                    continue
+                if key in waiting:
+                    waiting[key].add(pod.feed_id)
+                    continue
+                waiting[key] = {pod.feed_id}
+                await download_queue.put(episode)
+                QUEUE_DEPTH.set(download_queue.qsize(), queue="download")
+            # The listing itself may have changed the feed
+            await publish_queue.put(pod.feed_id)
+        for _ in range(workers):
+            await download_queue.put(_DONE)
+
+    async def download_stage():
+        nonlocal downloaded
+        paced = False
+        while (episode := await download_queue.get()) is not _DONE:
+            QUEUE_DEPTH.set(download_queue.qsize(), queue="download")
+            # Pace requests to bilibili like the former download batches
+            if paced:
+                await asyncio.sleep(downloader.CHUNK_INTERVAL)
+            paced = True
+            if await _download(episode, credential, max_attempts):
+                downloaded += 1
+            await commit_queue.put(episode)
+
+    async def commit_stage():
+        finished = False
+        while not finished:
+            batch = [await commit_queue.get()]
+            while not commit_queue.empty():
+                batch.append(commit_queue.get_nowait())
+            finished = _DONE in batch
+            batch = [episode for episode in batch if episode is not _DONE]
+            if not batch:
+                continue
+            await db_write(episode_tbl, _commit_episodes, batch, episode_tbl)
+            feed_ids = set()
+            for episode in batch:
+                key = (episode.bvid, episode.quality, episode.format)
+                committed.add(key)
+                feed_ids |= waiting.pop(key, set())
+            for feed_id in sorted(feed_ids):
+                await publish_queue.put(feed_id)
+        await publish_queue.put(_DONE)
+
+    async def publish_stage():
+        finished = False
+        while not finished:
+            feed_ids = [await publish_queue.get()]
+            while not publish_queue.empty():
+                feed_ids.append(publish_queue.get_nowait())
+            finished = _DONE in feed_ids
+            for feed_id in dict.fromkeys(feed_ids):
+                if feed_id is _DONE:
+                    continue
+                with span("feed_generation", feed_id):
+                    await asyncio.to_thread(
+                        generate_feed_xml, pod=pods[feed_id], episode_tbl=episode_tbl
+                    )
+                logger.debug(f"Feed {feed_id} published.")
+
+    async def finish_downloads():
+        await asyncio.gather(*download_tasks)
+        await commit_queue.put(_DONE)
+
+    download_tasks = [
+        asyncio.create_task(download_stage()) for _ in range(workers)
+    ]
+    tasks = [
+        *download_tasks,
+        asyncio.create_task(list_stage()),
+        asyncio.create_task(finish_downloads()),
+        asyncio.create_task(commit_stage()),
+        asyncio.create_task(publish_stage()),
+    ]
+    try:
+        # The first stage to fail stops the others
+        await asyncio.gather(*tasks[len(download_tasks) :])
+    finally:
+        for task in tasks:
+            task.cancel()
+        QUEUE_DEPTH.set(0, queue="download")
+    return downloaded
@@ -0,0 +1,115 @@
+"""
+keep_last retention.
+
+A feed keeps the newest `keep_last` episodes of its listing by pubdate.
+`retain_episodes` trims the listing whenever a pod is refreshed and queues the
+episodes that just fell out of it; `prune_expired_episodes` marks their rows
+deleted and removes their media. Each pass only touches newly expired
+episodes, never the whole episode table.
+"""
+
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from tinydb import Query, table
+
+from ..bp_class import Pod
+from ..utils.bp_log import Logger
+from ..utils.db_writer import db_write
+from ..utils.quota import STORAGE_BUDGET
+from .clean import episode_key, tracked_episode_keys
+
+logger = Logger().get_logger()
+
+# (bvid, quality, format) of episodes dropped by keep_last, not yet pruned
+_expired: set = set()
+_expired_lock = threading.Lock()
+
+
+def retention_limit(keep_last) -> Optional[int]:
+    """keep_last as a positive count, or None to keep every episode."""
+    try:
+        limit = int(keep_last)
+    except (TypeError, ValueError):  # None / "None"
+        return None
+    return limit if limit > 0 else None
+
+
+def expire_episodes(keys: Iterable[tuple]) -> None:
+    """Queue (bvid, quality, format) keys for `prune_expired_episodes`."""
+    with _expired_lock:
+        _expired.update(keys)
+
+
+def retain_episodes(
+    pod: Pod,
+    episodes: Sequence[dict],
+    previous_episodes: Optional[Sequence[dict]] = None,
+) -> list:
+    """
+    The newest `pod.keep_last` of `episodes`, in listing order. Dropped
+    episodes that `previous_episodes` still kept are queued for pruning.
+    """
+    episodes = list(episodes or [])
+    limit = retention_limit(pod.keep_last)
+    if limit is None or len(episodes) <= limit:
+        return episodes
+
+    newest = sorted(
+        episodes, key=lambda episode: episode.get("pubdate") or 0, reverse=True
+    )
+    kept_bvids = {episode["bvid"] for episode in newest[:limit]}
+    previous_bvids = {episode["bvid"] for episode in previous_episodes or []}
+    expired = {
+        (episode["bvid"], pod.quality, pod.format)
+        for episode in episodes
+        if episode["bvid"] not in kept_bvids and episode["bvid"] in previous_bvids
+    }
+    if expired:
+        expire_episodes(expired)
+        logger.debug(f"Pod {pod.feed_id}: {len(expired)} episodes expired.")
+    return [episode for episode in episodes if episode["bvid"] in kept_bvids]
+
+
+def _mark_expired(
+    pod_tbl: table.Table, episode_tbl: table.Table, keys: set
+) -> list:
+    # Another feed may still keep the same stream
+    keys = keys - tracked_episode_keys(pod_tbl)
+    if not keys:
+        return []
+    bvids = [bvid for bvid, _, _ in keys]
+    expired = [
+        episode_info
+        for episode_info in episode_tbl.search(Query().bvid.one_of(bvids))
+        if episode_key(episode_info) in keys
+        and episode_info.get("status") != "deleted"
+    ]
+    if expired:
+        episode_tbl.update(
+            {"status": "deleted"},
+            doc_ids=[episode_info.doc_id for episode_info in expired],
+        )
+    return expired
+
+
+async def prune_expired_episodes(
+    pod_tbl: table.Table, episode_tbl: table.Table
+) -> int:
+    """Mark queued expired episodes deleted and remove their media files."""
+    with _expired_lock:
+        keys = set(_expired)
+        _expired.clear()
+    if not keys:
+        return 0
+
+    expired = await db_write(episode_tbl, _mark_expired, pod_tbl, episode_tbl, keys)
+    for episode_info in expired:
+        location = episode_info.get("location")
+        if location and Path(location).exists():
+            STORAGE_BUDGET.remove_file(location)
+            logger.debug(f"Deleted expired episode: {location}")
+
+    logger.debug(f"Pruned {len(expired)} expired episodes.")
+    return len(expired)
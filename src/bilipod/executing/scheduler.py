@@ -9,6 +9,9 @@ from ..utils.bp_log import Logger
 
 logger = Logger().get_logger()
 schedule_lock = threading.RLock()
+# Update period in seconds of each scheduled feed, by feed id; the web server
+# derives feed max-ages from it instead of querying the pod table per request
+_feed_periods: dict[str, int] = {}
 
 
 def feed_job_tag(feed_id: str) -> str:
@@ -37,6 +40,24 @@ def clear_jobs(tag: str | None = None) -> None:
 
 def clear_feed_job(feed_id: str) -> None:
     clear_jobs(feed_job_tag(feed_id))
+    _feed_periods.pop(feed_id, None)
+
+
+def set_feed_period(feed_id: str, update_interval: str | None) -> None:
+    try:
+        _feed_periods[feed_id] = update_period_seconds(update_interval or "12h")
+    except ValueError:
+        _feed_periods.pop(feed_id, None)
+
+
+def load_feed_periods(pod_tbl) -> None:
+    """Record the update period of every stored pod."""
+    for pod_info in pod_tbl.all():
+        set_feed_period(pod_info["feed_id"], pod_info.get("update_period"))
+
+
+def feed_period(feed_id: str) -> int | None:
+    return _feed_periods.get(feed_id)
 
 
 def run_pending() -> None:
@@ -105,6 +126,27 @@ def schedule_job(update_interval, job=None, *args, tags=None, **kwargs):
         return _tag_job(scheduled_job, tags)
 
 
+def update_period_seconds(update_interval: str) -> int:
+    """
+    Returns how often a job scheduled with `update_interval` runs, in seconds.
+
+    Intervals with a time-of-day component ("1d2h", "2h45m") run once per
+    leading unit; a bare time of day ("12:00") runs daily.
+    """
+    if re.match(r"^\d{1,2}:\d{2}$", update_interval):
+        return 24 * 60 * 60
+
+    match = re.match(
+        r"^(\d{1,2})(?:d(?:\d{1,2}h(?:\d{1,2}m)?)?|h(?:\d{1,2}m)?|m)$",
+        update_interval,
+    )
+    if not match:
+        raise ValueError(f"Invalid update interval format: {update_interval}")
+
+    unit_seconds = {"d": 24 * 60 * 60, "h": 60 * 60, "m": 60}
+    return int(match.group(1)) * unit_seconds[update_interval[len(match.group(1))]]
+
+
 def run_async(job, *args, **kwargs):
     """
     Wrapper function to run an async job in a separate event loop.
@@ -1,108 +1,187 @@
 import asyncio
 import threading
 import time
-from typing import List
+from typing import Dict, Iterable, List, Optional
 
 from bilibili_api import Credential
 from tinydb import Query, table
 
 from ..bp_class import Episode, Pod
-from ..downloader import download_episodes
-from ..feed import generate_feed_xml, generate_opml  # noqa: F401
 from ..utils.biliuser import get_episode_list, get_pod_info
 from ..utils.bp_log import Logger
 from ..utils.db_query import query_episode
+from ..utils.db_writer import db_write
+from ..utils.metrics import FEED_REFRESH_SECONDS, QUEUE_DEPTH
+from ..utils.storage import flush_storage
+from ..utils.tracing import span, stamp_discovered
 from .clean import clean_untracked_episodes
+from .pipeline import run_pipeline
+from .retention import prune_expired_episodes, retain_episodes
 
 logger = Logger().get_logger()
 
-MAX_DELAY = 5 * 60
-episode_tbl_lock = threading.Lock()
-update_event = asyncio.Event()
-
-
-async def update_pod(pod: Pod, pod_tbl: table.Table, credential: Credential) -> None:
+# Feeds with episode diffs waiting for the download stage
+EPISODE_DIFF_QUEUE_SIZE = 100
+# Seconds to collect more diffs after the first one before downloading
+COALESCE_WINDOW = 2
+
+
+class EpisodeDiffQueue:
+    """
+    Bounded queue of per-feed "episodes added" diffs. `update_pod` puts a
+    diff whenever a refresh changes a feed's listing; `update_episodes` takes
+    them in batches. Diffs of a feed that is already queued are merged into
+    the queued one, so a feed is queued at most once.
+
+    Scheduled refreshes run in their own event loop in the scheduler thread,
+    so `put` hands the feed id to the consumer's loop and waits there while
+    the queue is full.
+    """
+
+    def __init__(self, maxsize: int = EPISODE_DIFF_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pending: Dict[str, set] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    def bind(self) -> None:
+        """Consume in the running event loop."""
+        with self._lock:
+            # Diffs put before the consumer started
+            pending = list(self._pending)
+            queue = asyncio.Queue(max(self.maxsize, len(pending)))
+            for feed_id in pending:
+                queue.put_nowait(feed_id)
+            # Publish the loop last; `put` reads both under the lock
+            self._queue = queue
+            self._loop = asyncio.get_running_loop()
+
+    async def put(self, feed_id: str, bvids: Iterable[str]) -> None:
+        with self._lock:
+            queued = feed_id in self._pending
+            self._pending.setdefault(feed_id, set()).update(bvids)
+            loop, queue = self._loop, self._queue
+        if queued or loop is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await queue.put(feed_id)
+        else:
+            future = asyncio.run_coroutine_threadsafe(queue.put(feed_id), loop)
+            await asyncio.wrap_future(future)
+
+    async def get_batch(self, window: float = 0) -> Dict[str, set]:
+        """
+        Wait for a diff, then for `window` seconds more; returns {feed_id:
+        added bvids} of every queued feed.
+        """
+        feed_ids = [await self._queue.get()]
+        if window:
+            with span("coalesce"):
+                await asyncio.sleep(window)
+        while not self._queue.empty():
+            feed_ids.append(self._queue.get_nowait())
+        with self._lock:
+            return {feed_id: self._pending.pop(feed_id) for feed_id in feed_ids}
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+EPISODE_DIFFS = EpisodeDiffQueue()
+
+
+async def update_pod(
+    pod: Pod, pod_tbl: table.Table, credential: Credential, queue_diff: bool = True
+) -> Optional[List[str]]:
+    """
+    Refresh a pod's listing. Returns the bvids it added, or None if the
+    listing failed; unless `queue_diff` is False, a changed listing is put on
+    EPISODE_DIFFS for `update_episodes`.
+    """
 
     logger.debug(f"Updating pod {pod.feed_id}...")
+    started = time.perf_counter()
 
     # update pod info and episodes list
     try:
-        updated_pod_info = await get_pod_info(
-            uid=pod.uid,
-            sid=pod.sid,
-            fid=pod.fid,
-            playlist_type=pod.playlist_type,
-            page_size=pod.page_size,
-            keyword=pod.keyword,
-            playlist_sort=pod.playlist_sort,
-            credential=credential,
-        )
+        with span("listing", pod.feed_id):
+            updated_pod_info = await get_pod_info(
+                uid=pod.uid,
+                sid=pod.sid,
+                fid=pod.fid,
+                playlist_type=pod.playlist_type,
+                page_size=pod.page_size,
+                keyword=pod.keyword,
+                playlist_sort=pod.playlist_sort,
+                credential=credential,
+            )
     except Exception as e:
         logger.error(f"Failed to update pod {pod.feed_id}.")
         logger.error(e)
-        return
+        FEED_REFRESH_SECONDS.observe(
+            time.perf_counter() - started, feed_id=pod.feed_id, result="error"
+        )
+        return None
 
-    pod.episodes = updated_pod_info["episodes"]
+    previous_bvids = {episode["bvid"] for episode in pod.episodes or []}
+    stamp_discovered(updated_pod_info["episodes"], pod.episodes)
+    pod.episodes = retain_episodes(pod, updated_pod_info["episodes"], pod.episodes)
+    bvids = [episode["bvid"] for episode in pod.episodes]
     pod.update_at = time.time()
     # update eposide list in pod_tbl, query only by feed_id
-    pod_tbl.update(
+    await db_write(
+        pod_tbl,
+        pod_tbl.update,
         {"episodes": pod.episodes, "update_at": pod.update_at},
         Query().feed_id == pod.feed_id,
     )
 
-    update_event.set()
+    flush_storage(pod_tbl)
+    added = [bvid for bvid in bvids if bvid not in previous_bvids]
+    # Episodes that fell out of the listing still need the feed regenerated
+    if queue_diff and set(bvids) != previous_bvids:
+        await EPISODE_DIFFS.put(pod.feed_id, added)
 
+    FEED_REFRESH_SECONDS.observe(
+        time.perf_counter() - started, feed_id=pod.feed_id, result="ok"
+    )
     logger.info(f"Pod {pod.feed_id} updated")
+    return added
 
 
 async def update_episodes(
     pod_tbl: table.Table, episode_tbl: table.Table, credential: Credential
 ) -> None:
+    EPISODE_DIFFS.bind()
     while True:
-        logger.debug("Waiting for update signal...")
-        await update_event.wait()
-        logger.debug("Update signal received.")
-
-        await asyncio.sleep(MAX_DELAY)
-
-        update_event.clear()
-        logger.debug("Event cleared, fetching updated podcasts.")
-
-        # Fetch updated pods from pod_tbl
-        updated_pods = [
-            Pod.from_dict(pod_info)
-            for pod_info in pod_tbl.search(
-                Query().update_at >= (time.time() - (MAX_DELAY + 10))
-            )
-        ]
-
-        if not updated_pods:
-            logger.debug("No feed to update.")
-            continue
-
-        # gather the episode list to download
-        episode_to_update: List[Episode] = []
-        for pod in updated_pods:
-            episode_list: List[Episode] = get_episode_list(pod)
-            for episode in episode_list:
-                if not episode_tbl.search(query_episode(episode)):
-                    episode_to_update.append(episode)
-
-        if episode_to_update:
-            episode_to_update = list(set(episode_to_update))
-            logger.debug(f"Episodes to update: {episode_to_update}")
-            await download_episodes(episode_to_update, credential=credential, max_attempts=10)
-
-            # update episode list in episode_tbl
-            episode_tbl.insert_multiple(
-                [episode.to_dict() for episode in episode_to_update]
-            )
-
-            # update feed xml
-            for pod in updated_pods:
-                generate_feed_xml(pod=pod, episode_tbl=episode_tbl)
-                logger.info(f"Feed {pod.feed_id} updated.")
-
-            clean_untracked_episodes(pod_tbl, episode_tbl)
-        else:
-            logger.info("No episodes to update.")
+        logger.debug("Waiting for episode diffs...")
+        diffs = await EPISODE_DIFFS.get_batch(COALESCE_WINDOW)
+        logger.debug(f"Episode diffs received for {len(diffs)} feeds.")
+
+        # drop the files of episodes the refreshed pods no longer keep
+        await prune_expired_episodes(pod_tbl, episode_tbl)
+
+        # list the added episodes of each feed into the pipeline
+        async def listing():
+            for feed_id, added in diffs.items():
+                pod_info = pod_tbl.get(Query().feed_id == feed_id)
+                if pod_info is None:  # removed from the config meanwhile
+                    continue
+                pod = Pod.from_dict(pod_info)
+                episode_list: List[Episode] = [
+                    episode
+                    for episode in get_episode_list(pod)
+                    if episode.bvid in added
+                    and not episode_tbl.search(query_episode(episode))
+                ]
+                logger.debug(f"Feed {feed_id}: episodes to update: {episode_list}")
+                yield pod, episode_list
+
+        QUEUE_DEPTH.set(len(diffs), queue="episode_updates")
+        downloaded = await run_pipeline(listing(), episode_tbl, credential)
+        logger.info(f"{len(diffs)} feeds updated, {downloaded} episodes downloaded.")
+
+        await clean_untracked_episodes(pod_tbl, episode_tbl)
+        flush_storage(episode_tbl)
+        QUEUE_DEPTH.set(0, queue="episode_updates")
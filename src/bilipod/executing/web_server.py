@@ -1,23 +1,63 @@
+import asyncio
+import gzip
+import hmac
+import http.client
 import http.server
+import io
+import ipaddress
 import json
 import mimetypes
-import socketserver
+import os
+import posixpath
 import ssl
+import time
+import uuid
+from dataclasses import dataclass, field
+from http import HTTPStatus
 from pathlib import Path
-from socketserver import ThreadingMixIn
-from urllib.parse import urlparse
+from typing import BinaryIO, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
 
 import jinja2
 
 from ..utils.auth_status import get_auth_status
 from ..utils.bp_log import Logger
+from ..utils.compress import PRECOMPRESSED_SUFFIXES, precompressed_path
+from ..utils.file_cache import FILE_CACHE, CachedFile, cache_key
+from ..utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_CONNECTIONS,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS,
+    render_metrics,
+)
+from ..utils.http_utils import (
+    cache_control,
+    choose_encoding,
+    content_range,
+    format_http_date,
+    if_range_matches,
+    is_not_modified,
+    make_etag,
+    parse_range_header,
+)
+from ..utils.media_layout import find_media
+from ..utils.quota import STORAGE_BUDGET
 from ..utils.url import join_url, sanitize_url
+from .admin import ADMIN_JOBS, pods_listing, stored_pod
+from .scheduler import feed_period, load_feed_periods
 
 logger = Logger().get_logger()
 
-
-class ThreadedHTTPServer(ThreadingMixIn, socketserver.TCPServer):
-    """Handle requests in a separate thread."""
+MEDIA_MAX_AGE = 7 * 24 * 60 * 60
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+STATIC_MAX_AGE = 24 * 60 * 60
+# Feeds are cached for this fraction of their update_period
+FEED_MAX_AGE_FRACTION = 10
+STATIC_DIR = Path(__file__).parent.parent.resolve() / "web"
+OFFLOAD_HEADERS = {"x-accel-redirect": "X-Accel-Redirect", "x-sendfile": "X-Sendfile"}
+DEFAULT_ACCEL_PREFIX = "/internal"
 
 
 def _build_base_url(server_config, server_address=None) -> str:
@@ -36,121 +76,726 @@ def _build_base_url(server_config, server_address=None) -> str:
     return sanitize_url(f"{scheme}://{host}:{port}")
 
 
-def run_web_server(server_config, data_dir: Path):
-    # Set up the Jinja2 environment to load templates from the 'web' folder
-    # Assuming index.html is directly in the 'web' folder,
-    # and 'static' subfolder is for other assets.
-    template_loader = jinja2.FileSystemLoader(
-        Path(__file__).parent.parent.resolve() / "web" / "static"
+def _fresh_precompressed(path: Path, source_stat: os.stat_result) -> List[str]:
+    """
+    Encodings with a pre-compressed sibling of path, in preference order.
+
+    Siblings older than the source file are ignored, so a failed compression
+    never hides a freshly generated feed.
+    """
+    encodings = []
+    for encoding in PRECOMPRESSED_SUFFIXES:
+        try:
+            sibling_stat = precompressed_path(path, encoding).stat()
+        except FileNotFoundError:
+            continue
+        if sibling_stat.st_mtime_ns >= source_stat.st_mtime_ns:
+            encodings.append(encoding)
+    return encodings
+
+
+def _is_compressible(mimetype: str) -> bool:
+    return mimetype.startswith("text/") or mimetype in (
+        "application/javascript",
+        "application/json",
+        "application/xml",
+        "image/svg+xml",
     )
-    jinja_env = jinja2.Environment(loader=template_loader)
 
-    class Handler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            # The directory is set to data_dir to serve assets and listed files
-            super().__init__(*args, directory=str(data_dir), **kwargs)
 
-        def do_GET(self):
-            request_path = urlparse(self.path).path
-            if request_path == "/" or request_path == "/index.html":
-                try:
-                    template = jinja_env.get_template("index.html")
-                    base_url = _build_base_url(server_config)
+def _feed_max_age(server_config, feed_name: str) -> int:
+    """
+    Cache lifetime for a feed XML: server.cache_max_age if set, otherwise a
+    tenth of the feed's update_period, so a client polling right after a
+    refresh still sees new episodes well before the next one. 0 (no-cache)
+    for unknown feeds.
+    """
+    if server_config.cache_max_age is not None:
+        return int(server_config.cache_max_age)
+
+    for feed_id in (feed_name, f"feed.{feed_name}"):
+        period = feed_period(feed_id)
+        if period is not None:
+            return period // FEED_MAX_AGE_FRACTION
+    return 0
+
+
+def _route_label(request_path: str) -> str:
+    """Low-cardinality route name for metrics."""
+    if request_path in ("/", "/index.html", "/auth/status", "/metrics"):
+        return request_path
+    if request_path.startswith("/admin/"):
+        return "admin"
+    if request_path == "/podcast.opml":
+        return "opml"
+    if request_path.endswith(".xml"):
+        return "feed"
+    if request_path.startswith("/static"):
+        return "static"
+    if request_path.startswith("/media/"):
+        return "media"
+    return "other"
+
+
+def _resolve_path(root: Path, url_path: str) -> Optional[Path]:
+    """Map a URL path onto root, refusing anything that escapes it."""
+    parts = [
+        part
+        for part in posixpath.normpath(unquote(url_path)).split("/")
+        if part and part != "."
+    ]
+    if any(part == ".." or os.sep in part for part in parts):
+        return None
+    return root.joinpath(*parts)
+
 
-                    output = template.render(base_url=base_url)
+@dataclass
+class Request:
+    method: str
+    target: str
+    version: str
+    headers: http.client.HTTPMessage
+    body: bytes = b""
+    # Address of the connected peer
+    client: Optional[str] = None
 
-                    self.send_response(200)
-                    self.send_header("Content-type", "text/html; charset=utf-8")
-                    self.send_header("Cache-Control", "no-store")
-                    self.end_headers()
-                    self.wfile.write(output.encode("utf-8"))
+    @property
+    def path(self) -> str:
+        return urlsplit(self.target).path
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+
+def _is_local_client(request: Request) -> bool:
+    """A loopback peer whose request was not forwarded by a reverse proxy."""
+    if request.headers.get("Forwarded") or request.headers.get("X-Forwarded-For"):
+        return False
+    try:
+        address = ipaddress.ip_address(request.client or "")
+    except ValueError:
+        return False
+    # ::ffff:127.0.0.1 from a dual-stack socket
+    return (getattr(address, "ipv4_mapped", None) or address).is_loopback
+
+
+@dataclass
+class Response:
+    """
+    An HTTP response. File bodies are sent as (prefix, offset, count) parts
+    with loop.sendfile, followed by `trailer`.
+    """
+
+    status: int
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    body: bytes = b""
+    file: Optional[BinaryIO] = None
+    file_parts: List[Tuple[bytes, int, int]] = field(default_factory=list)
+    trailer: bytes = b""
+
+    def content_length(self) -> int:
+        return (
+            len(self.body)
+            + sum(len(prefix) + count for prefix, _, count in self.file_parts)
+            + len(self.trailer)
+        )
+
+
+def _json_response(status: int, data) -> Response:
+    return Response(
+        status,
+        [
+            ("Content-type", "application/json; charset=utf-8"),
+            ("Cache-Control", "no-store"),
+        ],
+        json.dumps(data).encode("utf-8"),
+    )
+
+
+def _is_authorized(authorization: Optional[str], token: str) -> bool:
+    scheme, _, credentials = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        credentials.strip().encode("utf-8"), token.encode("utf-8")
+    )
+
+
+def _error_response(status: int, message: Optional[str] = None) -> Response:
+    phrase = HTTPStatus(status).phrase
+    body = (
+        http.server.DEFAULT_ERROR_MESSAGE
+        % {
+            "code": status,
+            "message": message or phrase,
+            "explain": HTTPStatus(status).description,
+        }
+    ).encode("utf-8", "replace")
+    return Response(
+        status,
+        [("Content-type", http.server.DEFAULT_ERROR_CONTENT_TYPE)],
+        body,
+    )
+
+
+class WebServer:
+    """
+    Asynchronous HTTP/1.1 server for feeds, media and the status page.
+
+    Runs on the service's event loop and keeps connections alive between
+    requests. Connections beyond server.max_connections are answered with
+    503, and clients that stall while sending a request are disconnected.
+    """
+
+    def __init__(self, server_config, data_dir: Path, pod_tbl=None):
+        self.server_config = server_config
+        self.data_dir = Path(data_dir)
+        self.pod_tbl = pod_tbl
+        self.file_cache = FILE_CACHE
+        self.file_cache.resize(server_config.file_cache_size)
+        self.jinja_env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(STATIC_DIR / "static")
+        )
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections: set = set()
+
+    @property
+    def server_address(self) -> Tuple[str, int]:
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self) -> None:
+        if self.pod_tbl is not None:
+            # Feeds stored by a previous run, until their updates are scheduled
+            load_feed_periods(self.pod_tbl)
+        ssl_context = None
+        if self.server_config.tls:
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(
+                certfile=self.server_config.certificate_path,
+                keyfile=self.server_config.key_file_path,
+            )
+
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host=self.server_config.bind_address,
+            port=self.server_config.port,
+            ssl=ssl_context,
+            limit=MAX_HEADER_SIZE,
+        )
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer) -> None:
+        if len(self._connections) >= self.server_config.max_connections:
+            response = _error_response(503, "Too many connections")
+            response.headers.append(("Retry-After", "1"))
+            await self._send_response(writer, "GET", response, keep_alive=False)
+            writer.close()
+            return
+
+        self._connections.add(writer)
+        HTTP_CONNECTIONS.set(len(self._connections))
+        try:
+            timeout = self.server_config.request_timeout
+            keep_alive = True
+            while keep_alive:
+                request = await self._read_request(reader, writer, timeout)
+                if request is None:
+                    break
+                keep_alive = request.keep_alive
+
+                started = time.perf_counter()
+                try:
+                    response = self._dispatch(request)
                 except Exception as e:
-                    logger.error(f"Error serving index.html: {e}")
-                    self.send_error(500, "Error serving index.html")
-            elif request_path == "/auth/status":
-                body = json.dumps(get_auth_status()).encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-type", "application/json; charset=utf-8")
-                self.send_header("Cache-Control", "no-store")
-                self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-            elif request_path == "/podcast.opml":
-                opml_path = data_dir / "podcast.opml"
-                logger.info(f"Serving OPML file: {opml_path}")
-                if opml_path.is_file():
-                    try:
-                        with open(opml_path, "rb") as f:
-                            self.send_response(200)
-                            self.send_header(
-                                "Content-type", "application/xml; charset=utf-8"
-                            )
-                            self.send_header("Cache-Control", "no-store")
-                            self.end_headers()
-                            self.wfile.write(f.read())
-                    except Exception as e:
-                        logger.error(f"Error serving podcast.opml: {e}")
-                        self.send_error(500, "Error serving opml.xml")
-                else:
-                    self.send_error(404, "podcast.opml not found")
-            elif request_path.endswith(".xml"):
-                # Serve other XML files directly from the data directory
-                xml_file_name = request_path.lstrip("/")
-                xml_path = Path(data_dir) / xml_file_name
-                if xml_path.is_file():
-                    try:
-                        with open(xml_path, "rb") as f:
-                            self.send_response(200)
-                            self.send_header(
-                                "Content-type", "application/xml; charset=utf-8"
-                            )
-                            self.send_header("Cache-Control", "no-store")
-                            self.end_headers()
-                            self.wfile.write(f.read())
-                    except Exception as e:
-                        logger.error(f"Error serving {xml_file_name}: {e}")
-                        self.send_error(500, f"Error serving {xml_file_name}")
-                else:
-                    logger.warning(f"XML file not found: {xml_path}")
-                    self.send_error(404, f"{xml_file_name} not found")
-            elif request_path.startswith("/static"):
-                static_file_path = (
-                    Path(__file__).parent.parent.resolve()
-                    / "web"
-                    / request_path.lstrip("/")
+                    logger.exception(f"Error serving {request.path}: {e}")
+                    response = _error_response(500)
+
+                await self._send_response(writer, request.method, response, keep_alive)
+                route = _route_label(request.path)
+                HTTP_REQUESTS.inc(route=route, status=response.status)
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, route=route
+                )
+                logger.debug(
+                    f'[Web Server] "{request.method} {request.target} {request.version}" '
+                    f"{response.status} {time.perf_counter() - started:.3f}s"
                 )
-                if static_file_path.is_file():
-                    self.send_response(200)
-                    mimetype, _ = mimetypes.guess_type(static_file_path)
-                    self.send_header(
-                        "Content-type", mimetype or "application/octet-stream"
+                timeout = self.server_config.keepalive_timeout
+        except (OSError, RuntimeError, asyncio.TimeoutError):
+            # Client went away mid-response
+            pass
+        finally:
+            self._connections.discard(writer)
+            HTTP_CONNECTIONS.set(len(self._connections))
+            writer.close()
+
+    async def _read_request(self, reader, writer, timeout) -> Optional[Request]:
+        """Read one request; returns None when the connection should close."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return None
+        except asyncio.LimitOverrunError:
+            await self._send_response(
+                writer, "GET", _error_response(431), keep_alive=False
+            )
+            return None
+
+        request_line, _, header_block = head.partition(b"\r\n")
+        words = request_line.decode("latin-1").split()
+        if len(words) != 3 or not words[2].startswith("HTTP/1."):
+            await self._send_response(
+                writer, "GET", _error_response(400), keep_alive=False
+            )
+            return None
+
+        try:
+            headers = http.client.parse_headers(io.BytesIO(header_block))
+        except http.client.HTTPException:
+            await self._send_response(
+                writer, "GET", _error_response(400), keep_alive=False
+            )
+            return None
+
+        peer = writer.get_extra_info("peername")
+        request = Request(
+            words[0], words[1], words[2], headers, client=peer[0] if peer else None
+        )
+        if headers.get("Transfer-Encoding"):
+            await self._send_response(
+                writer, request.method, _error_response(501), keep_alive=False
+            )
+            return None
+
+        try:
+            content_length = int(headers.get("Content-Length") or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0 or content_length > MAX_BODY_SIZE:
+            await self._send_response(
+                writer, request.method, _error_response(413), keep_alive=False
+            )
+            return None
+        if content_length:
+            try:
+                request.body = await asyncio.wait_for(
+                    reader.readexactly(content_length), timeout
+                )
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return None
+        return request
+
+    async def _send_response(
+        self, writer, method: str, response: Response, keep_alive: bool
+    ) -> None:
+        lines = [f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}"]
+        lines.append("Server: bilipod")
+        lines.append(f"Date: {format_http_date(time.time())}")
+        lines.extend(f"{name}: {value}" for name, value in response.headers)
+        if response.status != 304:
+            lines.append(f"Content-Length: {response.content_length()}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        try:
+            if method != "HEAD":
+                writer.write(response.body)
+                for prefix, offset, count in response.file_parts:
+                    writer.write(prefix)
+                    if count <= 0:
+                        continue
+                    await writer.drain()
+                    await asyncio.get_running_loop().sendfile(
+                        writer.transport, response.file, offset, count
                     )
-                    self.end_headers()
-                    with open(static_file_path, "rb") as f:
-                        self.wfile.write(f.read())
-                else:
-                    logger.warning(f"Static asset not found: {static_file_path}")
-                    self.send_error(404, "Static asset not found")
+                writer.write(response.trailer)
+            await writer.drain()
+        finally:
+            if response.file is not None:
+                response.file.close()
+
+    def _dispatch(self, request: Request) -> Response:
+        if request.path.startswith("/admin/"):
+            return self._admin(request)
+        if request.method not in ("GET", "HEAD"):
+            response = _error_response(405)
+            response.headers.append(("Allow", "GET, HEAD"))
+            return response
+
+        request_path = request.path
+        if request_path == "/" or request_path == "/index.html":
+            return self._index(request)
+        if request_path == "/auth/status":
+            body = json.dumps(get_auth_status()).encode("utf-8")
+            return Response(
+                200,
+                [
+                    ("Content-type", "application/json; charset=utf-8"),
+                    ("Cache-Control", "no-store"),
+                ],
+                body,
+            )
+        if request_path == "/metrics":
+            metrics = self.server_config.metrics
+            if metrics == "off" or (
+                metrics == "local" and not _is_local_client(request)
+            ):
+                # Feed ids are in the labels; do not advertise the endpoint
+                return _error_response(404)
+            return Response(
+                200,
+                [
+                    ("Content-type", METRICS_CONTENT_TYPE),
+                    ("Cache-Control", "no-store"),
+                ],
+                render_metrics().encode("utf-8"),
+            )
+        if request_path == "/podcast.opml":
+            opml_path = self.data_dir / "podcast.opml"
+            logger.info(f"Serving OPML file: {opml_path}")
+            return self._xml_file(
+                request, opml_path, "podcast.opml", self.server_config.cache_max_age
+            )
+        if request_path.endswith(".xml"):
+            # Serve other XML files directly from the data directory
+            xml_file_name = request_path.lstrip("/")
+            xml_path = _resolve_path(self.data_dir, xml_file_name)
+            if xml_path is None:
+                return _error_response(404, f"{xml_file_name} not found")
+            return self._xml_file(
+                request,
+                xml_path,
+                xml_file_name,
+                _feed_max_age(self.server_config, xml_path.stem),
+            )
+        if request_path.startswith("/static"):
+            static_file_path = _resolve_path(STATIC_DIR, request_path)
+            if static_file_path is None or not static_file_path.is_file():
+                logger.warning(f"Static asset not found: {request_path}")
+                return _error_response(404, "Static asset not found")
+            entry = self._cached_file(static_file_path, self._load_static)
+            return self._cached_response(request, entry, STATIC_MAX_AGE)
+
+        # Media and any other regular file under data_dir
+        file_path = _resolve_path(self.data_dir, request_path)
+        is_media = request_path.startswith("/media/")
+        if file_path is not None and is_media and not file_path.is_file():
+            # /media/<name> URLs stay the same under every media layout
+            file_path = find_media(self.data_dir / "media", file_path.name)
+        if file_path is None or not file_path.is_file():
+            return _error_response(404, "File not found")
+        if is_media:
+            STORAGE_BUDGET.record_access(file_path)
+        if self.server_config.offload:
+            content_type = (
+                mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            )
+            response = self._offload(file_path, content_type, MEDIA_MAX_AGE)
+            if response is not None:
+                return response
+        return self._media_file(request, file_path)
+
+    def _admin(self, request: Request) -> Response:
+        """
+        /admin endpoints: queue refresh, regenerate and retry jobs and report
+        their status. Disabled (404) unless server.admin_token is set.
+        """
+        token = self.server_config.admin_token
+        if not token or self.pod_tbl is None:
+            return _error_response(404, "File not found")
+        if not _is_authorized(request.headers.get("Authorization"), token):
+            response = _error_response(401)
+            response.headers.append(("WWW-Authenticate", 'Bearer realm="bilipod"'))
+            return response
+
+        parts = [unquote(part) for part in request.path.strip("/").split("/")[1:]]
+        if parts and parts[0] == "jobs" and len(parts) <= 2:
+            if request.method not in ("GET", "HEAD"):
+                response = _error_response(405)
+                response.headers.append(("Allow", "GET, HEAD"))
+                return response
+            if len(parts) == 1:
+                return _json_response(200, ADMIN_JOBS.status())
+            job = ADMIN_JOBS.get(parts[1])
+            if job is None:
+                return _error_response(404, "Job not found")
+            return _json_response(200, job.to_dict())
+
+        if len(parts) == 3 and (parts[0], parts[2]) in (
+            ("feeds", "refresh"),
+            ("feeds", "regenerate"),
+            ("episodes", "retry"),
+        ):
+            if request.method != "POST":
+                response = _error_response(405)
+                response.headers.append(("Allow", "POST"))
+                return response
+            if parts[0] == "feeds":
+                pod = stored_pod(self.pod_tbl, parts[1])
+                if pod is None:
+                    return _error_response(404, "Feed not found")
+                target = pod.feed_id
             else:
-                # For all other paths, fall back to serving files from data_dir
-                super().do_GET()
+                if not pods_listing(self.pod_tbl, parts[1]):
+                    return _error_response(404, "Episode not found")
+                target = parts[1]
+            job = ADMIN_JOBS.submit(parts[2], target)
+            if job is None:
+                response = _error_response(503, "Admin jobs are not available")
+                response.headers.append(("Retry-After", "5"))
+                return response
+            response = _json_response(202, job.to_dict())
+            response.headers.append(("Location", f"/admin/jobs/{job.id}"))
+            return response
+
+        return _error_response(404, "File not found")
 
-        def log_message(self, format, *args):
-            logger.debug(f"[Web Server] {format % args}")
+    def _index(self, request: Request) -> Response:
+        try:
+            entry = self._cached_file(
+                STATIC_DIR / "static" / "index.html", self._load_index
+            )
+        except Exception as e:
+            logger.error(f"Error serving index.html: {e}")
+            return _error_response(500, "Error serving index.html")
+        return self._cached_response(request, entry, validators=False)
 
-    server_address = (server_config.bind_address, server_config.port)
+    @staticmethod
+    def _validators(etag: str, last_modified: float, max_age) -> list:
+        return [
+            ("ETag", etag),
+            ("Last-Modified", format_http_date(last_modified)),
+            ("Cache-Control", cache_control(max_age)),
+        ]
 
-    if server_config.tls:
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(
-            certfile=server_config.certificate_path, keyfile=server_config.key_file
+    @staticmethod
+    def _not_modified(request: Request, etag: str, last_modified: float) -> bool:
+        return is_not_modified(
+            request.headers.get("If-None-Match"),
+            request.headers.get("If-Modified-Since"),
+            etag,
+            last_modified,
         )
-        httpd = ThreadedHTTPServer(server_address, Handler)
-        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
-    else:
-        httpd = ThreadedHTTPServer(server_address, Handler)
 
-    base_url = _build_base_url(server_config, server_address)
+    def _cached_file(self, path: Path, loader) -> CachedFile:
+        """
+        Look path up in the hot-file cache, (re)building the entry with
+        loader(path, stat) when it is missing or the file changed on disk.
+        """
+        source_stat = path.stat()
+        stat_key = (source_stat.st_mtime_ns, source_stat.st_size)
+        key = cache_key(path)
+        entry = self.file_cache.get(key, stat_key)
+        if entry is None:
+            entry = loader(path, source_stat)
+            self.file_cache.put(key, entry)
+        return entry
+
+    def _cached_response(
+        self, request: Request, entry: CachedFile, max_age=None, validators=True
+    ) -> Response:
+        encoding = choose_encoding(
+            request.headers.get("Accept-Encoding"),
+            [encoding for encoding in entry.variants if encoding is not None],
+        )
+        body, etag = entry.variants[encoding]
+        headers = list(entry.headers)
+        if validators:
+            headers.extend(self._validators(etag, entry.last_modified, max_age))
+            if self._not_modified(request, etag, entry.last_modified):
+                return Response(
+                    304, [header for header in headers if header[0] != "Content-type"]
+                )
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        return Response(200, headers, body)
+
+    def _load_xml(self, path: Path, source_stat: os.stat_result) -> CachedFile:
+        entry = CachedFile(
+            stat_key=(source_stat.st_mtime_ns, source_stat.st_size),
+            last_modified=source_stat.st_mtime,
+            headers=[
+                ("Content-type", "application/xml; charset=utf-8"),
+                ("Vary", "Accept-Encoding"),
+            ],
+        )
+        entry.variants[None] = (path.read_bytes(), make_etag(source_stat))
+        for encoding in _fresh_precompressed(path, source_stat):
+            entry.variants[encoding] = (
+                precompressed_path(path, encoding).read_bytes(),
+                make_etag(source_stat, encoding),
+            )
+        return entry
+
+    def _load_static(self, path: Path, source_stat: os.stat_result) -> CachedFile:
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        body = path.read_bytes()
+        entry = CachedFile(
+            stat_key=(source_stat.st_mtime_ns, source_stat.st_size),
+            last_modified=source_stat.st_mtime,
+            headers=[("Content-type", mimetype)],
+        )
+        entry.variants[None] = (body, make_etag(source_stat))
+        if _is_compressible(mimetype):
+            entry.headers.append(("Vary", "Accept-Encoding"))
+            entry.variants["gzip"] = (
+                gzip.compress(body, mtime=0),
+                make_etag(source_stat, "gzip"),
+            )
+        return entry
+
+    def _load_index(self, path: Path, source_stat: os.stat_result) -> CachedFile:
+        template = self.jinja_env.get_template(path.name)
+        body = template.render(
+            base_url=_build_base_url(self.server_config)
+        ).encode("utf-8")
+        return CachedFile(
+            stat_key=(source_stat.st_mtime_ns, source_stat.st_size),
+            last_modified=source_stat.st_mtime,
+            headers=[
+                ("Content-type", "text/html; charset=utf-8"),
+                ("Cache-Control", "no-store"),
+                ("Vary", "Accept-Encoding"),
+            ],
+            variants={
+                None: (body, make_etag(source_stat)),
+                "gzip": (gzip.compress(body, mtime=0), make_etag(source_stat, "gzip")),
+            },
+        )
+
+    def _xml_file(self, request: Request, path: Path, name: str, max_age=None):
+        if not path.is_file():
+            logger.warning(f"XML file not found: {path}")
+            return _error_response(404, f"{name} not found")
+        if self.server_config.offload and self.server_config.offload_feeds:
+            response = self._offload(path, "application/xml; charset=utf-8", max_age)
+            if response is not None:
+                return response
+
+        try:
+            entry = self._cached_file(path, self._load_xml)
+        except Exception as e:
+            logger.error(f"Error serving {name}: {e}")
+            return _error_response(500, f"Error serving {name}")
+        return self._cached_response(request, entry, max_age)
+
+    def _offload_target(self, file_path: Path) -> str:
+        relative_path = file_path.relative_to(self.data_dir).as_posix()
+        if self.server_config.offload == "x-sendfile":
+            root = self.server_config.offload_prefix or str(self.data_dir.resolve())
+            return posixpath.join(root, relative_path)
+        prefix = self.server_config.offload_prefix or DEFAULT_ACCEL_PREFIX
+        return posixpath.join(prefix, quote(relative_path))
+
+    def _offload(
+        self, file_path: Path, content_type: str, max_age=None
+    ) -> Optional[Response]:
+        """
+        Hand the file over to the reverse proxy: the response only carries an
+        X-Accel-Redirect/X-Sendfile header and the proxy streams the bytes,
+        including ranges and conditional requests, from disk. Returns None
+        when the target cannot be expressed in a header.
+        """
+        header = OFFLOAD_HEADERS[self.server_config.offload]
+        target = self._offload_target(file_path)
+        try:
+            target.encode("latin-1")
+        except UnicodeEncodeError:
+            logger.warning(f"Cannot offload {file_path}, serving it directly")
+            return None
+        return Response(
+            200,
+            [
+                ("Content-type", content_type),
+                ("Cache-Control", cache_control(max_age)),
+                (header, target),
+            ],
+        )
+
+    def _media_file(self, request: Request, media_path: Path) -> Response:
+        try:
+            f = open(media_path, "rb")
+        except OSError:
+            return _error_response(404, "File not found")
+
+        try:
+            media_stat = os.fstat(f.fileno())
+            size = media_stat.st_size
+            etag = make_etag(media_stat)
+            validators = self._validators(etag, media_stat.st_mtime, MEDIA_MAX_AGE)
+            if self._not_modified(request, etag, media_stat.st_mtime):
+                f.close()
+                return Response(304, validators)
+
+            ranges = None
+            if_range = request.headers.get("If-Range")
+            if if_range is None or if_range_matches(
+                if_range, etag, media_stat.st_mtime
+            ):
+                ranges = parse_range_header(request.headers.get("Range"), size)
+
+            if ranges == []:
+                f.close()
+                return Response(416, [("Content-Range", f"bytes */{size}")])
+        except Exception:
+            f.close()
+            raise
+
+        content_type = mimetypes.guess_type(media_path)[0] or "application/octet-stream"
+        response = Response(200, file=f)
+        if ranges is None:
+            response.headers.append(("Content-type", content_type))
+            response.file_parts = [(b"", 0, size)]
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response.status = 206
+            response.headers.append(("Content-type", content_type))
+            response.headers.append(("Content-Range", content_range(start, end, size)))
+            response.file_parts = [(b"", start, end - start + 1)]
+        else:
+            boundary = uuid.uuid4().hex
+            response.status = 206
+            response.headers.append(
+                ("Content-type", f"multipart/byteranges; boundary={boundary}")
+            )
+            response.file_parts = [
+                (
+                    (
+                        f"\r\n--{boundary}\r\n"
+                        f"Content-type: {content_type}\r\n"
+                        f"Content-Range: {content_range(start, end, size)}\r\n\r\n"
+                    ).encode("latin-1"),
+                    start,
+                    end - start + 1,
+                )
+                for start, end in ranges
+            ]
+            response.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+
+        response.headers.append(("Accept-Ranges", "bytes"))
+        response.headers.extend(validators)
+        return response
+
+
+async def run_web_server(server_config, data_dir: Path, pod_tbl=None):
+    server = WebServer(server_config, data_dir, pod_tbl)
+    await server.start()
+    base_url = _build_base_url(server_config, server.server_address)
 
     logger.info(f"Web server running at: {base_url}")
-    httpd.serve_forever()
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -3,6 +3,8 @@ from xml.etree import ElementTree as ET
 from tinydb import table
 
 from ..bp_class import Pod
+from ..utils.compress import write_precompressed
+from ..utils.file_cache import invalidate_cached_file
 
 
 def generate_opml(pod_tbl: table.Table, filename) -> str:
@@ -33,3 +35,5 @@ def generate_opml(pod_tbl: table.Table, filename) -> str:
     tree = ET.ElementTree(root)
     ET.indent(tree, space="\t", level=0)
     tree.write(filename, encoding="utf-8", xml_declaration=False)
+    write_precompressed(filename)
+    invalidate_cached_file(filename)
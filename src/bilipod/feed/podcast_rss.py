@@ -4,6 +4,7 @@ Make a podcast XML feed with feedgen
 
 import datetime
 import re
+import time
 from pathlib import Path
 
 import tzlocal
@@ -13,7 +14,12 @@ from tinydb import table
 from ..bp_class import Episode, Pod
 from ..utils.biliuser import get_episode_list
 from ..utils.bp_log import Logger
+from ..utils.compress import write_precompressed
 from ..utils.db_query import query_episode
+from ..utils.db_writer import db_write_sync
+from ..utils.file_cache import invalidate_cached_file
+from ..utils.metrics import FEED_GENERATION_SECONDS
+from ..utils.tracing import mark, span
 from ..utils.url import sanitize_url
 
 logger = Logger().get_logger()
@@ -46,6 +52,20 @@ def convert_timestamp_to_localtime(timestamp: int) -> str:
     return local_dt
 
 
+def _mark_published(episodes: list[Episode], episode_tbl: table.Table) -> None:
+    """Persist published_at for episodes appearing in a feed for the first time."""
+    updates = []
+    for episode in episodes:
+        if episode.timings is None or "published_at" in episode.timings:
+            continue
+        timings = dict(episode.timings)
+        mark(timings, "published_at")
+        updates.append(({"timings": timings}, query_episode(episode)))
+    if updates:
+        # Blocks; async callers run feed generation with asyncio.to_thread
+        db_write_sync(episode_tbl, episode_tbl.update_multiple, updates)
+
+
 def generate_feed_xml(
     pod: Pod,
     episode_tbl: table.Table,
@@ -60,6 +80,7 @@ def generate_feed_xml(
     }
     """
     logger.debug(f"Generating feed for {pod.feed_id}")
+    started = time.perf_counter()
 
     fg = FeedGenerator()
     fg.load_extension("podcast", atom=False, rss=True)
@@ -89,16 +110,19 @@ def generate_feed_xml(
     for episode in get_episode_list(pod):
         matches = episode_tbl.search(query_episode(episode))
         if not matches:
-            logger.warning(f"Episode {episode.bvid} in pod {pod.feed_id} not found")
+            # Still downloading; the feed is published again once it is committed
+            logger.debug(f"Episode {episode.bvid} in pod {pod.feed_id} not found")
             continue
         else:
             full_episode = Episode.from_dict(matches[0])
             matched_episodes.append(full_episode)
 
+    published_episodes: list[Episode] = []
     for episode in matched_episodes:
         if not episode.exists():
             logger.warning(f"Episode {episode.bvid} is not downloaded")
             continue
+        published_episodes.append(episode)
 
         pubdate = convert_timestamp_to_localtime(episode.pubdate)
         fe = fg.add_entry()
@@ -118,12 +142,14 @@ def generate_feed_xml(
         fe.podcast.itunes_explicit(episode.explicit)
 
     feed_name = f"{pod.feed_id.replace('feed.', '', 1)}"
+    xml_path = Path(pod.data_dir) / f"{feed_name}.xml"
 
     try:
-        fg.rss_file(
-            filename=str(Path(pod.data_dir) / f"{feed_name}.xml"),
-            pretty=True,
-        )
+        with span("feed_write", pod.feed_id):
+            fg.rss_file(
+                filename=str(xml_path),
+                pretty=True,
+            )
     except Exception as e:
         logger.error(f"Failed to generate feed for {pod.feed_id}: {e}")
         # print all fg attributes to debug
@@ -132,6 +158,18 @@ def generate_feed_xml(
             logger.debug(fg.rss_str(pretty=True))
         except Exception as debug_error:
             logger.debug(f"Failed to render RSS debug output: {debug_error}")
+        FEED_GENERATION_SECONDS.observe(
+            time.perf_counter() - started, feed_id=pod.feed_id, result="error"
+        )
         return
     else:
+        try:
+            write_precompressed(xml_path)
+        except OSError as e:
+            logger.warning(f"Failed to write compressed feed for {feed_name}: {e}")
+        invalidate_cached_file(xml_path)
+        _mark_published(published_episodes, episode_tbl)
+        FEED_GENERATION_SECONDS.observe(
+            time.perf_counter() - started, feed_id=pod.feed_id, result="ok"
+        )
         logger.info(f"Generated feed for {feed_name}")
@@ -7,8 +7,6 @@ import time
 from pathlib import Path
 
 from bilibili_api import request_settings
-from tinydb import TinyDB
-
 from .bp_class import Pod
 from .executing import (
     data_initialize,
@@ -18,10 +16,16 @@ from .executing import (
     update_episodes,
     watch_feed_config_changes,
 )
+from .executing.admin import run_admin_jobs
+from .executing.eviction import enable_eviction
 from .executing.scheduler import run_pending
 from .utils.bp_log import Logger
 from .utils.config_parser import BiliPodConfig
 from .utils.login import get_credential, update_credential
+from .utils.media_layout import set_media_layout
+from .utils.quota import STORAGE_BUDGET
+from .utils.stream_cache import STREAM_CACHE
+from .utils.storage import close_database, open_database
 
 BANNER = r"""
 .______    __   __       __  .______     ______    _______
@@ -56,22 +60,7 @@ async def run_service(config: BiliPodConfig, db_path: str, config_path: str):
 
     data_dir = Path(config.storage.data_dir)
     data_dir.mkdir(parents=True, exist_ok=True)
-
-    web_server_thread = threading.Thread(
-        target=run_web_server,
-        args=(
-            config.server,
-            data_dir,
-        ),
-        daemon=True,
-    )
-    web_server_thread.start()
-
-    # load and check credential
-    credential = await get_credential(config=config)
-
-    logger.info(BANNER)
-    logger.info("Start initializing...")
+    set_media_layout(config.storage.media_layout)
 
     # init db
     db_path = Path(db_path)
@@ -82,14 +71,35 @@ async def run_service(config: BiliPodConfig, db_path: str, config_path: str):
     else:
         db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    db = TinyDB(db_path)
+    db = open_database(db_path, flush_interval=config.storage.flush_interval)
     pod_tbl = db.table("pod")
     episode_tbl = db.table("episode")
 
+    web_server_task = asyncio.create_task(
+        run_web_server(config.server, data_dir, pod_tbl)
+    )
+
+    # load and check credential
+    credential = await get_credential(config=config)
+
+    logger.info(BANNER)
+    logger.info("Start initializing...")
+
     # media dir init
     media_dir = data_dir / "media"
     if not media_dir.exists():
         media_dir.mkdir(parents=True, exist_ok=True)
+    STORAGE_BUDGET.configure(
+        media_dir,
+        max_size=config.storage.max_size,
+        min_free=config.storage.min_free,
+    )
+    enable_eviction(pod_tbl, episode_tbl)
+    STREAM_CACHE.configure(
+        data_dir / "cache", max_size=config.storage.stream_cache_size
+    )
+    # Cached outputs of deleted media count against the cache's max_size
+    STORAGE_BUDGET.removed = STREAM_CACHE.media_removed
 
     # initialize pod and episodes
     await data_initialize(
@@ -104,6 +114,9 @@ async def run_service(config: BiliPodConfig, db_path: str, config_path: str):
     # create task to update episodes when pod is updated
     asyncio.create_task(update_episodes(pod_tbl, episode_tbl, credential))
 
+    # run jobs queued through the admin endpoints
+    asyncio.create_task(run_admin_jobs(pod_tbl, episode_tbl, credential))
+
     # update pod by scheduler
     logger.info("Starting scheduler...")
     for pod_info in pod_tbl.all():
@@ -137,6 +150,9 @@ async def run_service(config: BiliPodConfig, db_path: str, config_path: str):
     except (KeyboardInterrupt, SystemExit):
         logger.info("Received KeyboardInterrupt. Stopping...")
         stop_event.set()
+    finally:
+        web_server_task.cancel()
+        close_database(db)
 
 
 def main():
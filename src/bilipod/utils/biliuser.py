@@ -4,6 +4,7 @@ from bilibili_api import Credential, channel_series, favorite_list, user
 
 from ..bp_class import Episode, Pod
 from .bp_log import Logger
+from .metrics import track_api_call
 
 logger = Logger().get_logger()
 
@@ -65,11 +66,17 @@ async def get_user_info(
 ) -> dict:
     user_obj = user.User(uid=uid, credential=credential)
 
-    info = await user_obj.get_user_info()
+    info = await track_api_call("user.get_user_info", user_obj.get_user_info())
 
     if keyword:
-        video_list = await user_obj.get_videos(
-            pn=page_number, ps=page_size, keyword=keyword, order=user.VideoOrder.PUBDATE
+        video_list = await track_api_call(
+            "user.get_videos",
+            user_obj.get_videos(
+                pn=page_number,
+                ps=page_size,
+                keyword=keyword,
+                order=user.VideoOrder.PUBDATE,
+            ),
         )
         v_list = video_list["list"]["vlist"]
         episodes_info = [
@@ -85,8 +92,11 @@ async def get_user_info(
         ]
 
     else:
-        media_list = await user_obj.get_media_list(
-            ps=page_size, desc={"desc": True, "asc": False}[playlist_sort]
+        media_list = await track_api_call(
+            "user.get_media_list",
+            user_obj.get_media_list(
+                ps=page_size, desc={"desc": True, "asc": False}[playlist_sort]
+            ),
         )
         v_list = media_list["media_list"]
 
@@ -133,15 +143,18 @@ async def get_series_info(
         type_=channel_series.ChannelSeriesType.SEASON if playlist_type == "season" else channel_series.ChannelSeriesType.SERIES,
         credential=credential,
     )
-    info = await series.get_meta()
+    info = await track_api_call("channel_series.get_meta", series.get_meta())
 
-    video_list = await series.get_videos(
-        pn=page_number,
-        ps=page_size,
-        sort={
-            "desc": channel_series.ChannelOrder.DEFAULT,
-            "asc": channel_series.ChannelOrder.CHANGE,
-        }[playlist_sort],
+    video_list = await track_api_call(
+        "channel_series.get_videos",
+        series.get_videos(
+            pn=page_number,
+            ps=page_size,
+            sort={
+                "desc": channel_series.ChannelOrder.DEFAULT,
+                "asc": channel_series.ChannelOrder.CHANGE,
+            }[playlist_sort],
+        ),
     )
     v_list = video_list["archives"]
     episodes_info = [
@@ -157,8 +170,10 @@ async def get_series_info(
     ]
     
     if playlist_type == "series":
-        owner = await series.get_owner()
-        owner_info = await owner.get_user_info()
+        owner = await track_api_call("channel_series.get_owner", series.get_owner())
+        owner_info = await track_api_call(
+            "user.get_user_info", owner.get_user_info()
+        )
         author = owner_info["name"]
         return {
             "sid": sid,
@@ -192,12 +207,15 @@ async def get_favorite_list_info(
     response = {}
 
     while len(episodes_info) < page_size:
-        response = await favorite_list.get_video_favorite_list_content(
-            media_id=fid,
-            page=page,
-            keyword=keyword,
-            order=favorite_list.FavoriteListContentOrder.MTIME,
-            credential=credential,
+        response = await track_api_call(
+            "favorite_list.get_video_favorite_list_content",
+            favorite_list.get_video_favorite_list_content(
+                media_id=fid,
+                page=page,
+                keyword=keyword,
+                order=favorite_list.FavoriteListContentOrder.MTIME,
+                credential=credential,
+            ),
         )
         medias = response.get("medias") or []
         if not medias:
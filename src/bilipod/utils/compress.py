@@ -0,0 +1,63 @@
+import gzip
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+# Content-Encoding -> file suffix, in server preference order
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def precompressed_path(path: Union[str, Path], encoding: str) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes) -> None:
+    """Write data to path through a temporary file and an atomic rename."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _compress(data: bytes, encoding: str) -> Optional[bytes]:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+    return None
+
+
+def write_precompressed(path: Union[str, Path]) -> None:
+    """
+    Write compressed siblings (e.g. feed.xml.gz, feed.xml.br) next to path.
+
+    Encodings whose compressor is unavailable have their stale sibling removed,
+    so the web server never serves an outdated variant.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    for encoding in PRECOMPRESSED_SUFFIXES:
+        compressed = _compress(data, encoding)
+        if compressed is None:
+            precompressed_path(path, encoding).unlink(missing_ok=True)
+        else:
+            atomic_write_bytes(precompressed_path(path, encoding), compressed)
+
+
+def remove_precompressed(path: Union[str, Path]) -> None:
+    for encoding in PRECOMPRESSED_SUFFIXES:
+        precompressed_path(path, encoding).unlink(missing_ok=True)
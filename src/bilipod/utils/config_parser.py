@@ -5,9 +5,14 @@ from typing import Any, Dict, Literal, Optional, Sequence, Union
 
 import yaml
 
+from .media_layout import MEDIA_LAYOUTS
 from .parse_netscape import parse_netscape_cookies
 
 ENV_VAR_PATTERN = re.compile(r"\$env\{([A-Za-z_][A-Za-z0-9_]*)\}")
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+OFFLOAD_MODES = ("x-accel-redirect", "x-sendfile")
+METRICS_MODES = ("local", "public", "off")
 
 
 def _has_config_value(value) -> bool:
@@ -20,6 +25,19 @@ def _optional_str(value) -> Optional[str]:
     return str(value)
 
 
+def parse_size(value) -> Optional[int]:
+    """Bytes of a size given as a number or a string like "500M" or "2GiB"."""
+    if not _has_config_value(value):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = SIZE_PATTERN.match(str(value))
+    if match is None:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
 def _expand_env_values(value: Any) -> Any:
     if isinstance(value, str):
         return ENV_VAR_PATTERN.sub(
@@ -41,12 +59,37 @@ class ServerConfig:
     tls: bool = False
     certificate_path: Optional[str] = None
     key_file_path: Optional[str] = None
+    cache_max_age: Optional[int] = None
+    max_connections: int = 1024
+    request_timeout: float = 30
+    keepalive_timeout: float = 15
+    file_cache_size: int = 32 * 1024 * 1024
+    # "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd)
+    offload: Optional[str] = None
+    offload_prefix: Optional[str] = None
+    offload_feeds: bool = False
+    # Bearer token for the /admin endpoints; unset disables them
+    admin_token: Optional[str] = None
+    # Who may read /metrics: "local" (loopback clients not behind a proxy),
+    # "public" or "off"
+    metrics: str = "local"
 
 
 @dataclass
 class StorageConfig:
     type: str
     data_dir: str
+    # Seconds between database flushes; 0 writes through on every change
+    flush_interval: float = 5.0
+    # Seconds a media file must be untouched before the orphan sweep deletes it
+    orphan_grace_period: float = 600
+    # Media storage budget in bytes, and free space to leave on the volume
+    max_size: Optional[int] = None
+    min_free: Optional[int] = None
+    # "flat" or "hashed" (media files spread over subdirectories)
+    media_layout: str = "flat"
+    # Bytes of downloaded streams and unshared outputs kept for reuse
+    stream_cache_size: int = 0
 
 
 @dataclass
@@ -139,14 +182,47 @@ class BiliPodConfig:
             tls=server_data.get("tls", False),
             certificate_path=server_data.get("certificate_path"),
             key_file_path=server_data.get("key_file_path"),
+            cache_max_age=server_data.get("cache_max_age"),
+            max_connections=server_data.get("max_connections", 1024),
+            request_timeout=server_data.get("request_timeout", 30),
+            keepalive_timeout=server_data.get("keepalive_timeout", 15),
+            file_cache_size=server_data.get("file_cache_size", 32 * 1024 * 1024),
+            offload=_optional_str(server_data.get("offload")),
+            offload_prefix=_optional_str(server_data.get("offload_prefix")),
+            offload_feeds=server_data.get("offload_feeds", False),
+            admin_token=_optional_str(server_data.get("admin_token")),
+            metrics=str(server_data.get("metrics") or "local").lower(),
         )
+        if server_config.offload is not None:
+            server_config.offload = server_config.offload.lower()
+            if server_config.offload not in OFFLOAD_MODES:
+                raise ValueError(
+                    f"Unsupported server offload mode: {server_config.offload}. "
+                    f"Use one of: {', '.join(OFFLOAD_MODES)}"
+                )
+        if server_config.metrics not in METRICS_MODES:
+            raise ValueError(
+                f"Unsupported server metrics mode: {server_config.metrics}. "
+                f"Use one of: {', '.join(METRICS_MODES)}"
+            )
 
         # Parse and create StorageConfig
         storage_data = config_data.get("storage", {})
         storage_config = StorageConfig(
             type=storage_data.get("type", "local"),
             data_dir=storage_data.get("storage.local", {}).get("data_dir", "/app/data"),
+            flush_interval=storage_data.get("flush_interval", 5.0),
+            orphan_grace_period=storage_data.get("orphan_grace_period", 600),
+            max_size=parse_size(storage_data.get("max_size")),
+            min_free=parse_size(storage_data.get("min_free")),
+            media_layout=str(storage_data.get("media_layout") or "flat").lower(),
+            stream_cache_size=parse_size(storage_data.get("stream_cache_size")) or 0,
         )
+        if storage_config.media_layout not in MEDIA_LAYOUTS:
+            raise ValueError(
+                f"Unsupported media layout: {storage_config.media_layout}. "
+                f"Use one of: {', '.join(MEDIA_LAYOUTS)}"
+            )
 
         # Parse and create TokenConfig
         token_data = config_data.get("token")
@@ -0,0 +1,148 @@
+"""
+Single writer for the pod/episode database.
+
+Every mutation is queued to one writer thread, which runs whatever has queued
+up as a batch and publishes it as one commit. With CoalescingStorage the batch
+works on a private copy of the data, so readers on any thread or event loop
+keep seeing the last committed snapshot without locking.
+
+Call sites pass a table of the database and the operation to run:
+
+    await db_write(pod_tbl, pod_tbl.update, fields, cond)
+    db_write_sync(episode_tbl, episode_tbl.insert_multiple, rows)
+
+Without a running writer (tests, scripts) the operation runs inline.
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from .bp_log import Logger
+from .metrics import DB_WRITE_BATCH, QUEUE_DEPTH
+
+logger = Logger().get_logger()
+
+DEFAULT_MAX_BATCH = 256
+_STOP = object()
+
+
+def _run_operation(future: Future, operation, args, kwargs) -> None:
+    try:
+        future.set_result(operation(*args, **kwargs))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+class DBWriter:
+    """Applies queued database operations on a dedicated thread, in batches."""
+
+    def __init__(self, db, max_batch: int = DEFAULT_MAX_BATCH):
+        self.storage = db.storage
+        self.max_batch = max_batch
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "DBWriter":
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        self.storage.writer = self
+        return self
+
+    def stop(self) -> None:
+        """Apply everything queued so far, then stop; later writes run inline."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        self.storage.writer = None
+        # Writes queued behind the stop marker
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                _run_operation(*item)
+
+    def in_writer(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, operation, *args, **kwargs) -> Future:
+        future: Future = Future()
+        if self.in_writer():
+            # Nested write from a queued operation joins the current batch
+            _run_operation(future, operation, args, kwargs)
+        else:
+            self._queue.put((future, operation, args, kwargs))
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = batch[: batch.index(_STOP)]
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch: list) -> None:
+        QUEUE_DEPTH.set(self._queue.qsize(), queue="db_writes")
+        DB_WRITE_BATCH.observe(len(batch))
+        begin = getattr(self.storage, "begin", None)
+        commit = getattr(self.storage, "commit", None)
+        if begin is not None:
+            begin()
+        done = []
+        try:
+            for future, operation, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    done.append((future, operation(*args, **kwargs), None))
+                except BaseException as e:
+                    done.append((future, None, e))
+        finally:
+            if commit is not None:
+                try:
+                    commit()
+                except Exception as e:
+                    logger.error(f"Failed to commit database writes: {e}")
+        # Resolve after the commit so callers read their own writes
+        for future, result, error in done:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def _writer(table) -> Optional[DBWriter]:
+    writer = getattr(table.storage, "writer", None)
+    if isinstance(writer, DBWriter) and not writer.in_writer():
+        return writer
+    return None
+
+
+async def db_write(table, operation, *args, **kwargs):
+    """Run a write operation on the table's database writer and await it."""
+    writer = _writer(table)
+    if writer is None:
+        return operation(*args, **kwargs)
+    return await asyncio.wrap_future(writer.submit(operation, *args, **kwargs))
+
+
+def db_write_sync(table, operation, *args, **kwargs):
+    """Blocking variant of `db_write` for synchronous code."""
+    writer = _writer(table)
+    if writer is None:
+        return operation(*args, **kwargs)
+    return writer.submit(operation, *args, **kwargs).result()
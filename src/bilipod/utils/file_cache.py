@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+
+
+@dataclass
+class CachedFile:
+    """
+    A served artifact kept in memory.
+
+    Attributes:
+        stat_key: (mtime_ns, size) of the source file the entry was built from.
+        last_modified: Source mtime, for Last-Modified.
+        headers: Response headers shared by every variant (Content-type, ...).
+        variants: Content-Encoding (None for identity) -> (body, ETag).
+    """
+
+    stat_key: Tuple[int, int]
+    last_modified: float
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    variants: Dict[Optional[str], Tuple[bytes, str]] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body, _ in self.variants.values())
+
+
+def cache_key(path: Union[str, Path]) -> str:
+    return os.path.abspath(path)
+
+
+class FileCache:
+    """LRU cache of CachedFile entries bounded by total body size."""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._size = 0
+        self.max_bytes = max_bytes
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, stat_key: Tuple[int, int]) -> Optional[CachedFile]:
+        """Return the entry for key if it was built from the same file version."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stat_key != stat_key:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedFile) -> bool:
+        """Store entry, evicting least recently used ones; False if too large."""
+        # One entry may not take more than a quarter of the cache
+        if entry.size > self.max_bytes // 4:
+            return False
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            self._evict()
+        return True
+
+    def invalidate(self, path: Union[str, Path]) -> None:
+        with self._lock:
+            self._remove(cache_key(path))
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+
+
+FILE_CACHE = FileCache()
+
+
+def invalidate_cached_file(path: Union[str, Path]) -> None:
+    FILE_CACHE.invalidate(path)
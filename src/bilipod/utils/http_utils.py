@@ -0,0 +1,158 @@
+import os
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Larger range sets are answered with the full body instead of a multipart one
+MAX_RANGES = 16
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into a {coding: qvalue} mapping."""
+    encodings = {}
+    if not header:
+        return encodings
+
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        encodings[coding] = qvalue
+    return encodings
+
+
+def choose_encoding(
+    accept_encoding: Optional[str], available: Iterable[str]
+) -> Optional[str]:
+    """
+    Return the first encoding in `available` the client accepts, or None when
+    the identity representation should be served.
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in available:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def make_etag(stat_result: os.stat_result, variant: Optional[str] = None) -> str:
+    """Build a strong ETag from a file's mtime and size."""
+    tag = f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+    if variant:
+        tag = f"{tag}-{variant}"
+    return f'"{tag}"'
+
+
+def format_http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def cache_control(max_age: Optional[int]) -> str:
+    """Cache-Control value; without a max-age clients must revalidate."""
+    if not max_age:
+        return "no-cache"
+    return f"max-age={int(max_age)}"
+
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: float,
+) -> bool:
+    """
+    Evaluate conditional GET headers (RFC 9110 section 13.2.2).
+
+    If-Modified-Since is only consulted when If-None-Match is absent.
+    """
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(
+            tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates
+        )
+
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(last_modified) <= since.timestamp()
+
+    return False
+
+
+def parse_range_header(
+    header: Optional[str], size: int, max_ranges: int = MAX_RANGES
+) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a `Range: bytes=...` header into inclusive (start, end) pairs.
+
+    Returns None when the header is absent, malformed or asks for too many
+    ranges (the full representation should be sent), and an empty list when
+    no range is satisfiable (416).
+    """
+    if not header:
+        return None
+
+    unit, _, range_set = header.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set.strip():
+        return None
+
+    specs = [spec.strip() for spec in range_set.split(",") if spec.strip()]
+    if not specs or len(specs) > max_ranges:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                suffix_length = int(last)
+                if suffix_length > 0 and size > 0:
+                    ranges.append((max(size - suffix_length, 0), size - 1))
+                continue
+
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start < size:
+            ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    return ranges
+
+
+def if_range_matches(if_range: str, etag: str, last_modified: float) -> bool:
+    """If-Range uses strong comparison: weak tags never match."""
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return not etag.startswith("W/") and if_range == etag
+
+    try:
+        since = parsedate_to_datetime(if_range)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(last_modified) == int(since.timestamp())
+
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end}/{size}"
@@ -317,14 +317,19 @@ async def password_login(
     )
 
     if choice == "pwd":
-        username = username or input("Username: ")
-        password = password if password is not None else getpass("Password: ")
+        username = username or await asyncio.to_thread(input, "Username: ")
+        if password is None:
+            password = await asyncio.to_thread(getpass, "Password: ")
         cred = await login_v2.login_with_password(
             username=username, password=password, geetest=gee
         )
     elif choice == "sms":
-        phone_number = phone_number or input("Phone number: ")
-        country_code = country_code or input("Country code (default +86): ") or "+86"
+        phone_number = phone_number or await asyncio.to_thread(input, "Phone number: ")
+        country_code = (
+            country_code
+            or await asyncio.to_thread(input, "Country code (default +86): ")
+            or "+86"
+        )
         phone = login_v2.PhoneNumber(phone_number, country_code)
         captcha_id = await login_v2.send_sms(phonenumber=phone, geetest=gee)
         logger.info("SMS code sent.")
@@ -482,7 +487,8 @@ async def get_credential(config: BiliPodConfig) -> Credential:
             sys.exit()
     else:
         try:
-            method = _resolve_login_method(config.login)
+            # May prompt on stdin; keep the event loop (and web server) running
+            method = await asyncio.to_thread(_resolve_login_method, config.login)
         except ValueError as e:
             logger.error(str(e))
             sys.exit()
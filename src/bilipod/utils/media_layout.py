@@ -0,0 +1,97 @@
+"""
+Layout of the files in data_dir/media.
+
+"flat" keeps every media file directly in media/. "hashed" spreads them over
+up to 256 subdirectories named after the first two hex digits of the md5 of
+the file name, so no directory holds more than a small fraction of the files.
+
+Media URLs are /media/<name> under either layout; the web server finds the
+file with `find_media`, so enclosure URLs do not change when the layout does.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from .bp_log import Logger
+
+logger = Logger().get_logger()
+
+MEDIA_LAYOUTS = ("flat", "hashed")
+_media_layout = "flat"
+
+
+def set_media_layout(layout: str) -> None:
+    global _media_layout
+    if layout not in MEDIA_LAYOUTS:
+        raise ValueError(
+            f"Unsupported media layout: {layout}. Use one of: "
+            f"{', '.join(MEDIA_LAYOUTS)}"
+        )
+    _media_layout = layout
+
+
+def get_media_layout() -> str:
+    return _media_layout
+
+
+def media_shard(name: str) -> str:
+    return hashlib.md5(name.encode("utf-8")).hexdigest()[:2]
+
+
+def media_relpath(name: str, layout: Optional[str] = None) -> str:
+    """Path of a media file relative to data_dir/media."""
+    if (layout or _media_layout) == "hashed":
+        return f"{media_shard(name)}/{name}"
+    return name
+
+
+def find_media(media_dir: Path, name: str) -> Optional[Path]:
+    """The media file called `name` under either layout, if it exists."""
+    for relpath in (media_relpath(name), name, f"{media_shard(name)}/{name}"):
+        path = media_dir / relpath
+        if path.is_file():
+            return path
+    return None
+
+
+def migrate_media_layout(
+    media_dir: Path, layout: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Move media files into `layout` (the current one by default). Each move is
+    a rename, so the file stays servable throughout. Returns {old path: new
+    path} for the files moved.
+    """
+    media_dir = Path(media_dir)
+    if not media_dir.is_dir():
+        return {}
+    sources = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(media_dir)
+        for name in files
+    ]
+    moved = {}
+    for source in sources:
+        name = os.path.basename(source)
+        target = os.path.join(media_dir, media_relpath(name, layout))
+        if source == target:
+            continue
+        if os.path.exists(target):
+            logger.warning(f"Not moving {source}: {target} already exists")
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        moved[source] = target
+    # Shards left empty by a move back to the flat layout
+    for entry in os.scandir(media_dir):
+        if len(entry.name) == 2 and entry.is_dir(follow_symlinks=False):
+            try:
+                os.rmdir(entry.path)
+            except OSError:
+                pass
+    if moved:
+        layout = layout or _media_layout
+        logger.info(f"Moved {len(moved)} media files to the {layout} media layout.")
+    return moved
@@ -0,0 +1,330 @@
+"""
+In-process metrics exposed in the Prometheus text format on /metrics.
+
+Metrics are plain objects guarded by a lock, so recording a sample is a dict
+lookup and a few additions and can stay enabled in production.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from tinydb.middlewares import Middleware
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request handling and database access
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Seconds; API listings, downloads, transcodes
+JOB_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Bytes per second
+THROUGHPUT_BUCKETS = tuple(2**exponent for exponent in range(16, 28, 2))
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            pass
+        raise ValueError(
+            f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (bucket_counts, total, count) in self._values.items():
+            cumulative = 0
+            for upper_bound, bucket_count in zip(
+                self.buckets + (math.inf,), bucket_counts
+            ):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(upper_bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+FEED_REFRESH_SECONDS = REGISTRY.histogram(
+    "bilipod_feed_refresh_seconds",
+    "Time spent refreshing a feed's episode list.",
+    ("feed_id", "result"),
+    JOB_BUCKETS,
+)
+FEED_GENERATION_SECONDS = REGISTRY.histogram(
+    "bilipod_feed_generation_seconds",
+    "Time spent rendering a feed's XML file.",
+    ("feed_id", "result"),
+)
+API_CALLS = REGISTRY.counter(
+    "bilibili_api_calls_total",
+    "Bilibili API calls by endpoint and response code.",
+    ("endpoint", "code"),
+)
+API_CALL_SECONDS = REGISTRY.histogram(
+    "bilibili_api_call_seconds",
+    "Bilibili API call latency.",
+    ("endpoint",),
+)
+DOWNLOAD_BYTES = REGISTRY.counter(
+    "bilipod_download_bytes_total",
+    "Bytes received from media CDNs.",
+    ("host",),
+)
+DOWNLOAD_SECONDS = REGISTRY.histogram(
+    "bilipod_download_seconds",
+    "Duration of successful stream downloads.",
+    ("host",),
+    JOB_BUCKETS,
+)
+DOWNLOAD_THROUGHPUT = REGISTRY.histogram(
+    "bilipod_download_throughput_bytes_per_second",
+    "Throughput of successful stream downloads.",
+    ("host",),
+    THROUGHPUT_BUCKETS,
+)
+DOWNLOAD_RETRIES = REGISTRY.counter(
+    "bilipod_download_retries_total",
+    "Failed stream download attempts that were retried or fell back to a backup URL.",
+    ("host", "reason"),
+)
+EPISODE_RETRIES = REGISTRY.counter(
+    "bilipod_episode_download_retries_total",
+    "Episodes queued again after a failed download attempt.",
+)
+FFMPEG_SECONDS = REGISTRY.histogram(
+    "bilipod_ffmpeg_seconds",
+    "Duration of ffmpeg runs.",
+    ("result",),
+    JOB_BUCKETS,
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "bilipod_queue_depth",
+    "Items waiting in a processing queue.",
+    ("queue",),
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "bilipod_http_requests_total",
+    "HTTP requests served by route and status.",
+    ("route", "status"),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "bilipod_http_request_seconds",
+    "HTTP request latency, including sending the response.",
+    ("route",),
+)
+HTTP_CONNECTIONS = REGISTRY.gauge(
+    "bilipod_http_connections",
+    "Open HTTP client connections.",
+)
+DB_OPERATION_SECONDS = REGISTRY.histogram(
+    "bilipod_db_operation_seconds",
+    "Latency of database storage reads and writes.",
+    ("operation",),
+)
+DB_WRITE_BATCH = REGISTRY.histogram(
+    "bilipod_db_write_batch_size",
+    "Database write operations committed together.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+MEDIA_BYTES = REGISTRY.gauge(
+    "bilipod_media_bytes",
+    "Media bytes stored, and reserved by downloads in progress.",
+    ("state",),
+)
+STREAM_CACHE_LOOKUPS = REGISTRY.counter(
+    "bilipod_stream_cache_lookups_total",
+    "Stream and transcoded output cache lookups.",
+    ("kind", "result"),
+)
+EVICTED_EPISODES = REGISTRY.counter(
+    "bilipod_evicted_episodes_total",
+    "Episodes evicted to keep media within the storage budget.",
+)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def url_host(url: str) -> str:
+    return urlsplit(url).hostname or "unknown"
+
+
+async def track_api_call(endpoint: str, awaitable):
+    """Await an API call, counting it by endpoint and Bilibili response code."""
+    started = time.perf_counter()
+    code = "0"
+    try:
+        return await awaitable
+    except Exception as e:
+        code = str(getattr(e, "code", type(e).__name__))
+        raise
+    finally:
+        API_CALLS.inc(endpoint=endpoint, code=code)
+        API_CALL_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+class TimedStorage(Middleware):
+    """TinyDB middleware recording storage read/write latency."""
+
+    def read(self) -> Optional[dict]:
+        with DB_OPERATION_SECONDS.time(operation="read"):
+            return self.storage.read()
+
+    def write(self, data: dict) -> None:
+        with DB_OPERATION_SECONDS.time(operation="write"):
+            self.storage.write(data)
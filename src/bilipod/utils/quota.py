@@ -0,0 +1,201 @@
+"""
+Storage budget for the media directory.
+
+The budget tracks the bytes stored under data_dir/media incrementally: one
+scan at startup, then the size of every finished download and every removed
+file. Downloads reserve their estimated size first; when the projected usage
+would exceed `max_size` or leave less than `min_free` bytes free on the
+volume, the budget asks its evictor to free space and otherwise pauses the
+download until space is available.
+
+The web server records when each media file was last served, which the
+evictor uses to remove least-recently-served episodes first.
+"""
+
+import asyncio
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from .bp_log import Logger
+from .metrics import MEDIA_BYTES
+
+logger = Logger().get_logger()
+
+# Seconds between admission checks while downloads are paused
+ADMISSION_RETRY_INTERVAL = 30
+# Bytes per second of media, for estimating a download before it starts
+AUDIO_BYTES_PER_SECOND = {"64K": 8_000, "132K": 16_500, "192K": 24_000}
+VIDEO_BYTES_PER_SECOND = {"360P": 60_000, "720P": 180_000, "4K": 1_200_000}
+
+
+def duration_seconds(duration) -> int:
+    """Seconds of an episode duration given as seconds or "[h:]m:ss"."""
+    if duration is None:
+        return 0
+    if isinstance(duration, (int, float)):
+        return int(duration)
+    seconds = 0
+    try:
+        for part in str(duration).split(":"):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return 0
+    return seconds
+
+
+def estimate_size(episode) -> int:
+    """Rough size of an episode's media file before it is downloaded."""
+    if episode.format == "video":
+        rate = VIDEO_BYTES_PER_SECOND.get(episode.video_quality, 0)
+    else:
+        rate = AUDIO_BYTES_PER_SECOND.get(episode.audio_quality, 0)
+    return duration_seconds(episode.duration) * rate
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class StorageBudget:
+    """Media bytes in use, download admission and last-served times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.media_dir: Optional[Path] = None
+        self.max_size: Optional[int] = None
+        self.min_free: Optional[int] = None
+        # Awaited with the number of bytes to free; returns the bytes freed
+        self.evict: Optional[Callable[[int], Awaitable[int]]] = None
+        # Called with the stat of every file `remove_file` deleted
+        self.removed: Optional[Callable[[os.stat_result], None]] = None
+        self.used = 0
+        self.reserved = 0
+        self._last_served: Dict[str, float] = {}
+
+    def configure(
+        self,
+        media_dir: Union[str, Path],
+        max_size: Optional[int] = None,
+        min_free: Optional[int] = None,
+    ) -> None:
+        self.media_dir = Path(media_dir)
+        self.max_size = max_size or None
+        self.min_free = min_free or None
+        with self._lock:
+            self.used = _directory_size(self.media_dir)
+            self.reserved = 0
+        self._publish()
+        if self.enabled:
+            logger.info(
+                f"Storage budget: {self.used} bytes used, max_size={self.max_size}, "
+                f"min_free={self.min_free}"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.media_dir is not None and bool(self.max_size or self.min_free)
+
+    def _publish(self) -> None:
+        MEDIA_BYTES.set(self.used, state="stored")
+        MEDIA_BYTES.set(self.reserved, state="reserved")
+
+    def overflow(self, size: int = 0) -> int:
+        """Bytes over budget if `size` more bytes were stored; 0 if it fits."""
+        if not self.enabled:
+            return 0
+        over = 0
+        if self.max_size:
+            over = self.used + self.reserved + size - self.max_size
+        if self.min_free:
+            free = shutil.disk_usage(self.media_dir).free
+            over = max(over, self.min_free - (free - self.reserved - size))
+        return max(over, 0)
+
+    def _try_reserve(self, size: int) -> int:
+        with self._lock:
+            over = self.overflow(size)
+            if over <= 0:
+                self.reserved += size
+                self._publish()
+            return over
+
+    async def admit(self, size: int) -> bool:
+        """
+        Reserve `size` bytes, evicting or waiting for space as needed. False if
+        the budget could never hold `size` bytes.
+        """
+        if not self.enabled:
+            return True
+        if self.max_size and size > self.max_size:
+            return False
+        paused = False
+        while True:
+            over = self._try_reserve(size)
+            if over <= 0:
+                if paused:
+                    logger.info("Storage budget available, resuming downloads.")
+                return True
+            if self.evict is not None and await self.evict(over) > 0:
+                continue
+            if not paused:
+                paused = True
+                logger.warning(
+                    f"Storage budget exceeded by {over} bytes, pausing downloads."
+                )
+            await asyncio.sleep(ADMISSION_RETRY_INTERVAL)
+
+    def settle(self, reserved: int, path: Union[str, Path, None]) -> None:
+        """Replace a reservation with the size of the file written to `path`."""
+        try:
+            size = os.stat(path).st_size if path is not None else 0
+        except OSError:
+            size = 0
+        with self._lock:
+            self.reserved = max(self.reserved - reserved, 0)
+            self.used += size
+            self._publish()
+
+    async def reserve(self, episode) -> Optional[int]:
+        """
+        Reserve room for an episode's download; returns the bytes reserved, to
+        pass to `settle`, or None if the budget cannot take the episode.
+        """
+        size = estimate_size(episode) if self.enabled else 0
+        return size if await self.admit(size) else None
+
+    def remove_file(self, path: Union[str, Path]) -> int:
+        """Delete a media file and release its bytes; returns the bytes freed."""
+        try:
+            media_stat = os.stat(path)
+            os.unlink(path)
+        except FileNotFoundError:
+            return 0
+        size = media_stat.st_size
+        if self.removed is not None:
+            self.removed(media_stat)
+        with self._lock:
+            self.used = max(self.used - size, 0)
+            self._last_served.pop(os.path.basename(path), None)
+            self._publish()
+        return size
+
+    def record_access(self, path: Union[str, Path]) -> None:
+        self._last_served[os.path.basename(path)] = time.time()
+
+    def last_served(self, path: Union[str, Path], default: float = 0) -> float:
+        """When `path` was last served, or `default` if not since startup."""
+        return self._last_served.get(os.path.basename(path), default)
+
+
+STORAGE_BUDGET = StorageBudget()
@@ -0,0 +1,57 @@
+"""
+Helpers for converting the Episode/Pod dataclasses to and from the plain
+dicts stored in the database, without the generic `dataclasses.asdict` walk.
+"""
+
+import sys
+from dataclasses import fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+
+def to_path(value):
+    return Path(value) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=1024)
+def _shared_path(value: str) -> Path:
+    return Path(value)
+
+
+def shared_path(value):
+    """
+    Like `to_path`, but equal strings map to one shared Path object. For the
+    per-pod directory repeated on every episode.
+    """
+    return _shared_path(value) if isinstance(value, str) else value
+
+
+def intern_str(value):
+    """Intern strings repeated on many records (base URLs)."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def field_converters(
+    cls, **overrides: Callable
+) -> Tuple[Tuple[str, Optional[Callable]], ...]:
+    """
+    (field name, converter) for every dataclass field, used by `from_dict`.
+    Path-typed fields convert strings to Path unless overridden.
+    """
+    converters = []
+    for f in fields(cls):
+        convert = overrides.get(f.name)
+        if convert is None and "Path" in str(f.type):
+            convert = to_path
+        converters.append((f.name, convert))
+    return tuple(converters)
+
+
+def plain_copy(value):
+    """Copy nested dicts/lists/tuples so the record and its dict share nothing."""
+    if isinstance(value, dict):
+        return {key: plain_copy(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(plain_copy(item) for item in value)
+    return value
@@ -0,0 +1,222 @@
+"""
+TinyDB storage for the pod/episode database.
+
+`FastJSONStorage` reads and writes the JSON file with orjson when it is
+installed (stdlib json otherwise) and replaces the file atomically.
+`CoalescingStorage` keeps the database in memory and writes it out on
+`flush()` - called at the end of each feed update - on a timer, and on close,
+instead of re-serializing the whole document after every mutation. It also
+gives the database writer (see db_writer.py) copy-on-write batches, so readers
+never see a half-applied batch.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from tinydb import TinyDB
+from tinydb.middlewares import Middleware
+from tinydb.storages import Storage
+
+from .bp_log import Logger
+from .db_writer import DBWriter
+from .metrics import TimedStorage
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+logger = Logger().get_logger()
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def loads(raw: bytes):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class FastJSONStorage(Storage):
+    """Drop-in replacement for tinydb's JSONStorage with a faster codec."""
+
+    def __init__(self, path, create_dirs: bool = False, **kwargs):
+        self.path = Path(path)
+        if create_dirs:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+
+    def read(self) -> Optional[dict]:
+        raw = self.path.read_bytes()
+        if not raw.strip():
+            return None
+        return loads(raw)
+
+    def write(self, data: dict) -> None:
+        temp_path = self.path.with_name(f".{self.path.name}.tmp")
+        temp_path.write_bytes(dumps(data))
+        os.replace(temp_path, self.path)
+
+
+class _CopyOnAccess(dict):
+    """
+    Tables of a write batch. A table's documents are copied the first time the
+    batch touches it, because tinydb updates documents in place.
+    """
+
+    def __init__(self, data: dict):
+        super().__init__(data)
+        self._copied = set()
+
+    def __getitem__(self, name):
+        table = super().__getitem__(name)
+        if name not in self._copied:
+            self._copied.add(name)
+            table = {doc_id: dict(doc) for doc_id, doc in table.items()}
+            super().__setitem__(name, table)
+        return table
+
+    def __setitem__(self, name, table) -> None:
+        self._copied.add(name)
+        super().__setitem__(name, table)
+
+
+class CoalescingStorage(Middleware):
+    """
+    TinyDB middleware that serves reads from memory and defers writes.
+
+    Pending writes are persisted by `flush()`, every `flush_interval` seconds
+    from a background thread, and on `close()`. A flush_interval of 0 writes
+    through on every change.
+
+    Between `begin()` and `commit()` the calling thread reads and writes a
+    private copy of the data; other threads keep reading the committed data.
+    """
+
+    writer: Optional[DBWriter] = None
+
+    def __init__(self, storage_cls, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        super().__init__(storage_cls)
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._data: Optional[dict] = None
+        self._loaded = False
+        self._dirty = False
+        self._working: Optional[dict] = None
+        self._batch_thread: Optional[int] = None
+        self._batch_changed = False
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __call__(self, *args, **kwargs):
+        super().__call__(*args, **kwargs)
+        if self.flush_interval > 0:
+            self._thread = threading.Thread(
+                target=self._flush_periodically, name="db-flush", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def read(self) -> Optional[dict]:
+        if self._batch_thread == threading.get_ident():
+            return self._working
+        if self._loaded:
+            return self._data
+        with self._lock:
+            if not self._loaded:
+                self._data = self.storage.read()
+                self._loaded = True
+            return self._data
+
+    def write(self, data: dict) -> None:
+        if self._batch_thread == threading.get_ident():
+            self._working = data
+            self._batch_changed = True
+            return
+        with self._lock:
+            self._data = data
+            self._loaded = True
+            self._dirty = True
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def begin(self) -> None:
+        """Start a write batch on the calling thread."""
+        self._working = _CopyOnAccess(self.read() or {})
+        self._batch_changed = False
+        self._batch_thread = threading.get_ident()
+
+    def commit(self) -> None:
+        """Publish the batch started by `begin()` to readers."""
+        working, self._working = self._working, None
+        self._batch_thread = None
+        if self._batch_changed:
+            self.write(dict(working))
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.storage.write(self._data)
+            self._dirty = False
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush database: {e}")
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self.storage.close()
+
+
+def flush_storage(db_or_table) -> None:
+    """Persist deferred writes now if the database uses CoalescingStorage."""
+    flush = getattr(db_or_table.storage, "flush", None)
+    if callable(flush):
+        flush()
+
+
+def open_database(path, flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> TinyDB:
+    """
+    Open the service database with a running DBWriter; close it with
+    `close_database`.
+    """
+    db = TinyDB(
+        path,
+        storage=CoalescingStorage(
+            TimedStorage(FastJSONStorage), flush_interval=flush_interval
+        ),
+    )
+    # Snapshots change under the tables' backs, so their query caches are off
+    for name in ("pod", "episode"):
+        db.table(name, cache_size=0)
+    DBWriter(db).start()
+    return db
+
+
+def close_database(db: TinyDB) -> None:
+    writer = getattr(db.storage, "writer", None)
+    if writer is not None:
+        writer.stop()
+    db.close()
@@ -0,0 +1,369 @@
+"""
+Content-addressed cache of downloaded streams and transcoded outputs.
+
+The same video is often in several feeds, at different qualities or formats.
+Raw streams are stored under data_dir/cache/streams/<bvid>/ keyed by stream
+id and codec, so every output derived from a stream (MP3s at any audio
+quality, the remuxed MP4) is produced from the cached copy without another
+transfer. Finished outputs are hardlinked under data_dir/cache/outputs/ by a
+hash of their source streams and ffmpeg arguments; an identical output is
+linked from there instead of transcoded again.
+
+Bytes held only by the cache (streams, and outputs whose media file is gone)
+are bounded by `max_size` and pruned least-recently-used first; with the
+default of 0 streams are dropped once the download that fetched them is
+done and only outputs shared with media files are kept.
+
+Entries are indexed in memory with their size, inode and last use: the cache
+directory is walked once in `configure`, and pruning and eviction then work
+from the index without touching the file system. Recency lives only in the
+index, not in file mtimes: cache entries share inodes with published media,
+whose mtime is their Last-Modified and ETag.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .bp_log import Logger
+from .metrics import STREAM_CACHE_LOOKUPS
+
+logger = Logger().get_logger()
+
+# Audio stream ids from lowest to highest quality
+AUDIO_QUALITY_RANK = {30216: 0, 30232: 1, 30280: 2, 30250: 3, 30251: 4}
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def stream_key(stream) -> str:
+    """File-name-safe key of a stream: kind, quality id and codec."""
+    codecs = _UNSAFE_CHARS.sub("_", getattr(stream, "codecs", None) or "")
+    video_quality = getattr(stream, "video_quality", None)
+    if video_quality is not None:
+        return f"v{video_quality.value}_{codecs}"
+    audio_quality = getattr(stream, "audio_quality", None)
+    if audio_quality is not None:
+        return f"a{audio_quality.value}_{codecs}"
+    return type(stream).__name__.replace("StreamDownloadURL", "").lower()
+
+
+def _audio_rank(key: str) -> int:
+    try:
+        return AUDIO_QUALITY_RANK.get(int(key[1:].split("_", 1)[0]), -1)
+    except ValueError:
+        return -1
+
+
+@dataclass
+class CacheEntry:
+    size: int
+    inode: Tuple[int, int]
+    last_used: float
+    # Also linked from the media directory, so it holds no bytes of its own
+    shared: bool = False
+
+
+class StreamCache:
+    """Streams and outputs under one cache directory; see the module doc."""
+
+    def __init__(self):
+        self.root: Optional[Path] = None
+        self.max_size = 0
+        self._lock = threading.Lock()
+        self._fetching: Dict[Path, asyncio.Lock] = {}
+        self._pinned: Counter = Counter()
+        self._entries: Dict[Path, CacheEntry] = {}
+        # Cache paths of each (st_dev, st_ino)
+        self._inodes: Dict[Tuple[int, int], Set[Path]] = {}
+
+    def configure(self, root: Union[str, Path], max_size: Optional[int] = 0) -> None:
+        self.root = Path(root)
+        self.max_size = max_size or 0
+        (self.root / "streams").mkdir(parents=True, exist_ok=True)
+        (self.root / "outputs").mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._entries.clear()
+            self._inodes.clear()
+        for path in self.root.glob("*/**/*"):
+            if path.suffix == ".part":
+                # Partial download of a previous run
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                entry_stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                # Not used since startup: last used when it was written
+                with self._lock:
+                    self._index(path, entry_stat, entry_stat.st_mtime)
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def _index(self, path: Path, entry_stat: os.stat_result, last_used: float) -> None:
+        # Called with self._lock held
+        self._forget(path)
+        inode = (entry_stat.st_dev, entry_stat.st_ino)
+        self._inodes.setdefault(inode, set()).add(path)
+        self._entries[path] = CacheEntry(entry_stat.st_size, inode, last_used)
+        self._share(inode, entry_stat.st_nlink)
+
+    def _share(self, inode: Tuple[int, int], nlink: int) -> None:
+        # Called with self._lock held; links beyond the cache's are media files
+        paths = self._inodes.get(inode, ())
+        for path in paths:
+            self._entries[path].shared = nlink > len(paths)
+
+    def _forget(self, path: Path) -> Optional[CacheEntry]:
+        # Called with self._lock held
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            paths = self._inodes[entry.inode]
+            paths.discard(path)
+            if not paths:
+                del self._inodes[entry.inode]
+        return entry
+
+    def _record(self, path: Path) -> None:
+        """Index a new or changed entry as just used."""
+        try:
+            entry_stat = path.stat()
+        except OSError:
+            return
+        with self._lock:
+            self._index(path, entry_stat, time.time())
+
+    def _touch(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                entry.last_used = time.time()
+        if entry is None:
+            self._record(path)
+
+    def _better_audio(self, bvid: str, key: str) -> Optional[Path]:
+        """A cached audio stream of at least the quality of `key`."""
+        stream_dir = self.root / "streams" / bvid
+        wanted = _audio_rank(key)
+        if wanted < 0 or not stream_dir.is_dir():
+            return None
+        candidates = [
+            path
+            for path in stream_dir.glob("a*")
+            if path.suffix != ".part" and _audio_rank(path.stem) >= wanted
+        ]
+        return min(candidates, key=lambda path: _audio_rank(path.stem), default=None)
+
+    async def fetch(
+        self,
+        bvid: str,
+        key: str,
+        suffix: str,
+        download: Callable[[Path], Awaitable[None]],
+        fallback_dir: Path,
+        any_audio: bool = False,
+    ) -> Path:
+        """
+        Path of the stream `key` of `bvid`, calling `download(path)` on a miss.
+        With `any_audio`, a cached audio stream of higher quality will do.
+        Cached paths stay pinned until `release`. Without a cache directory
+        the stream is downloaded into `fallback_dir`.
+        """
+        if not self.enabled:
+            path = fallback_dir / f"{bvid}_{key}{suffix}"
+            await download(path)
+            return path
+
+        path = self.root / "streams" / bvid / f"{key}{suffix}"
+        with self._lock:
+            lock = self._fetching.setdefault(path, asyncio.Lock())
+        async with lock:
+            if not path.exists() and any_audio:
+                path = self._better_audio(bvid, key) or path
+            if path.exists():
+                STREAM_CACHE_LOOKUPS.inc(kind="stream", result="hit")
+            else:
+                STREAM_CACHE_LOOKUPS.inc(kind="stream", result="miss")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                part = path.with_name(path.name + ".part")
+                try:
+                    await download(part)
+                    os.replace(part, path)
+                finally:
+                    part.unlink(missing_ok=True)
+                self._record(path)
+            self._touch(path)
+            with self._lock:
+                self._pinned[path] += 1
+        return path
+
+    def release(self, paths: Iterable[Path]) -> None:
+        with self._lock:
+            for path in paths:
+                self._pinned[path] -= 1
+                if self._pinned[path] <= 0:
+                    del self._pinned[path]
+
+    def output_key(self, args: List, sources: Dict[Path, str]) -> Optional[str]:
+        """
+        Hash of an output made by ffmpeg `args` (output path last) from the
+        cached `sources`; None when the cache is off.
+        """
+        if not self.enabled:
+            return None
+        recipe = [sources.get(arg, str(arg)) for arg in args[:-1]]
+        recipe.append(Path(args[-1]).suffix)
+        return hashlib.sha1(json.dumps(recipe).encode("utf-8")).hexdigest()
+
+    def _output_path(self, output_key: str, outfile: Path) -> Path:
+        return self.root / "outputs" / f"{output_key}{outfile.suffix}"
+
+    def link_output(self, output_key: Optional[str], outfile: Path) -> bool:
+        """Hardlink an identical earlier output to `outfile` if there is one."""
+        if output_key is None:
+            return False
+        cached = self._output_path(output_key, outfile)
+        if not cached.exists():
+            STREAM_CACHE_LOOKUPS.inc(kind="output", result="miss")
+            return False
+        try:
+            outfile.unlink(missing_ok=True)
+            os.link(cached, outfile)
+        except OSError as e:
+            logger.debug(f"Cannot link {cached} to {outfile}: {e}")
+            return False
+        STREAM_CACHE_LOOKUPS.inc(kind="output", result="hit")
+        # One more media link, and just used
+        self._record(cached)
+        return True
+
+    def store_output(self, output_key: Optional[str], outfile: Path) -> None:
+        if output_key is None:
+            return
+        cached = self._output_path(output_key, outfile)
+        try:
+            cached.unlink(missing_ok=True)
+            os.link(outfile, cached)
+        except OSError as e:
+            logger.debug(f"Cannot cache output {outfile}: {e}")
+            return
+        self._record(cached)
+
+    def media_removed(self, media_stat: os.stat_result) -> None:
+        """
+        A media file with `media_stat` was deleted; cache entries on its inode
+        may now hold its bytes alone.
+        """
+        inode = (media_stat.st_dev, media_stat.st_ino)
+        with self._lock:
+            if inode in self._inodes:
+                self._share(inode, media_stat.st_nlink - 1)
+
+    def _unlink(self, path: Path) -> bool:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.debug(f"Cannot remove cache entry {path}: {e}")
+            return False
+        with self._lock:
+            self._forget(path)
+        if path.parent.parent == self.root / "streams":
+            with self._lock:
+                busy = any(
+                    other.parent == path.parent
+                    for other in (*self._fetching, *self._pinned)
+                )
+            if not busy:
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass  # other streams of the video are still cached
+        return True
+
+    def unlink_shared(self, path: Union[str, Path]) -> int:
+        """
+        Remove the cache entries that share `path`'s inode, so deleting `path`
+        frees its bytes; returns the number of entries removed.
+        """
+        if not self.enabled:
+            return 0
+        try:
+            media_stat = os.stat(path)
+        except OSError:
+            return 0
+        inode = (media_stat.st_dev, media_stat.st_ino)
+        with self._lock:
+            shared = [
+                entry
+                for entry in self._inodes.get(inode, ())
+                if entry not in self._pinned
+            ]
+        return sum(self._unlink(entry) for entry in shared)
+
+    def prune(self) -> int:
+        """
+        Remove least-recently-used entries until the bytes held only by the
+        cache fit in `max_size`; returns the bytes freed. Never raises.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            entries = [
+                (entry.last_used, entry.size, path)
+                for path, entry in self._entries.items()
+                if not entry.shared and path not in self._pinned
+            ]
+            self._fetching = {
+                path: lock
+                for path, lock in self._fetching.items()
+                if lock.locked() or path in self._pinned
+            }
+        held = sum(size for _, size, _ in entries)
+        if held <= self.max_size:
+            return 0
+        freed = 0
+        for _, size, path in sorted(entries):
+            if held <= self.max_size:
+                break
+            # Only the entries about to go are checked on disk
+            try:
+                entry_stat = path.stat()
+            except OSError:
+                with self._lock:
+                    self._forget(path)
+                held -= size
+                continue
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None:
+                    # Linked into the media directory since it was indexed
+                    self._share(entry.inode, entry_stat.st_nlink)
+                    if entry.shared:
+                        held -= size
+                        continue
+            if self._unlink(path):
+                held -= size
+                freed += size
+        return freed
+
+STREAM_CACHE = StreamCache()
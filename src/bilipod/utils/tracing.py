@@ -0,0 +1,120 @@
+"""
+Lightweight stage spans and per-episode pipeline timings.
+
+Spans time a pipeline stage (listing, coalesce, download URL lookup, CDN
+transfer, transcode, feed generation) into the bilipod_stage_seconds metric
+and a debug log line. Episode timings are wall-clock timestamps stored in the
+episode's `timings` dict and persisted with the episode row:
+
+    discovered_at       first listing that contained the episode
+    download_started    download of the episode began
+    download_finished   all streams were fetched from the CDN
+    transcode_finished  ffmpeg produced the output file
+    published_at        first feed XML that included the episode
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from tinydb import table
+
+from .bp_log import Logger
+from .metrics import JOB_BUCKETS, REGISTRY
+
+logger = Logger().get_logger()
+
+TIMING_FIELDS = (
+    "discovered_at",
+    "download_started",
+    "download_finished",
+    "transcode_finished",
+    "published_at",
+)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "bilipod_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ("stage",),
+    JOB_BUCKETS,
+)
+
+
+def record_stage(stage: str, seconds: float, subject: str = "") -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    logger.debug(f"[trace] {stage} {subject} took {seconds:.3f}s")
+
+
+@contextmanager
+def span(stage: str, subject: str = ""):
+    """Time a pipeline stage; `subject` (feed id, bvid) only goes to the log."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, subject)
+
+
+def mark(timings: Optional[dict], name: str, timestamp: Optional[float] = None):
+    """Record `name` in a timings dict unless it was already recorded."""
+    if timings is not None and name not in timings:
+        timings[name] = time.time() if timestamp is None else timestamp
+
+
+def stamp_discovered(
+    episodes: Iterable[dict],
+    previous_episodes: Optional[Iterable[dict]] = None,
+    timestamp: Optional[float] = None,
+) -> None:
+    """
+    Give every listed episode a `timings` dict with `discovered_at`, keeping the
+    timings of episodes that were already in the previous listing.
+    """
+    previous_timings = {
+        episode["bvid"]: episode["timings"]
+        for episode in previous_episodes or []
+        if episode.get("timings")
+    }
+    now = time.time() if timestamp is None else timestamp
+    for episode in episodes:
+        timings = dict(previous_timings.get(episode["bvid"]) or {})
+        mark(timings, "discovered_at", now)
+        episode["timings"] = timings
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sequence."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def episode_durations(
+    episode_tbl: table.Table,
+    start: str = "discovered_at",
+    end: str = "published_at",
+) -> List[float]:
+    """Seconds between two timing marks, for every episode that has both."""
+    durations = []
+    for row in episode_tbl.all():
+        timings = row.get("timings") or {}
+        if start in timings and end in timings:
+            durations.append(timings[end] - timings[start])
+    return durations
+
+
+def latency_percentiles(
+    episode_tbl: table.Table,
+    start: str = "discovered_at",
+    end: str = "published_at",
+    percents: Sequence[float] = (50, 95),
+) -> Dict[float, Optional[float]]:
+    """
+    End-to-end (or per-stage, with other marks) latency percentiles over the
+    stored episodes, e.g. {50: 312.0, 95: 1240.5}.
+    """
+    durations = episode_durations(episode_tbl, start, end)
+    return {percent: percentile(durations, percent) for percent in percents}
@@ -1,11 +1,17 @@
 import re
 from urllib.parse import urlsplit, urlunsplit
 
+# Absolute http(s) URLs without repeated slashes, query, fragment or
+# whitespace are returned unchanged by sanitize_url; skip the split/unsplit
+_CLEAN_URL = re.compile(r"https?://[\w.:@%-]+(?:/[^/\s?#]+)*/?")
+
 
 def sanitize_url(url) -> str:
     """Collapse repeated path slashes without changing the URL scheme."""
     if not isinstance(url, str):
         return ""
+    if _CLEAN_URL.fullmatch(url):
+        return url
 
     stripped_url = url.strip()
     if not stripped_url:
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Pod
+from src.bilipod.executing import admin
+
+
+def test_job_queue_runs_jobs_in_order_and_records_results():
+    jobs = admin.JobQueue(maxsize=2, history=1)
+    ran = []
+
+    async def handler(target):
+        ran.append(target)
+        if target == "bad":
+            raise LookupError("no such feed")
+        return f"refreshed {target}"
+
+    async def scenario():
+        jobs.start()
+        first = jobs.submit("refresh", "a")
+        second = jobs.submit("refresh", "bad")
+        assert jobs.submit("refresh", "c") is None  # full
+        runner = asyncio.create_task(jobs.run({"refresh": handler}))
+        while second.status in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        runner.cancel()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert ran == ["a", "bad"]
+    assert (second.status, second.result) == ("failed", "no such feed")
+    assert first.result == "refreshed a"
+    # Only the latest finished job is kept
+    assert jobs.jobs() == [second]
+    with pytest.raises(ValueError):
+        jobs.submit("delete", "a")
+
+
+def test_regenerate_and_retry_resolve_feeds(tmp_path, monkeypatch):
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+    pod_tbl.insert(
+        Pod(
+            feed_id="feed.test",
+            base_url="http://localhost",
+            data_dir=tmp_path,
+            episodes=[{"bvid": "BV1", "pubdate": 1}],
+        ).to_dict()
+    )
+    generated = []
+    pipelines = []
+
+    async def fake_run_pipeline(listing, episode_tbl, credential):
+        async for pod, episodes in listing:
+            pipelines.append((pod.feed_id, [episode.bvid for episode in episodes]))
+        return 1
+
+    monkeypatch.setattr(
+        admin,
+        "generate_feed_xml",
+        lambda pod, episode_tbl: generated.append(pod.feed_id),
+    )
+    monkeypatch.setattr(admin, "run_pipeline", fake_run_pipeline)
+
+    async def scenario():
+        await admin.regenerate_feed("test", pod_tbl, episode_tbl)
+        result = await admin.retry_episode("BV1", pod_tbl, episode_tbl, None)
+        with pytest.raises(LookupError):
+            await admin.retry_episode("BV2", pod_tbl, episode_tbl, None)
+        return result
+
+    assert asyncio.run(scenario()) == "1 variants of BV1 downloaded"
+    assert generated == ["feed.test"]
+    assert pipelines == [("feed.test", ["BV1"])]
@@ -1,8 +1,12 @@
+import asyncio
+import os
+import time
+
 from tinydb import Query, TinyDB
 from tinydb.storages import MemoryStorage
 
 from src.bilipod.bp_class import Episode, Pod
-from src.bilipod.executing.clean import clean_untracked_episodes
+from src.bilipod.executing.clean import clean_untracked_episodes, clean_unused_episodes
 
 
 def _episode(bvid, data_dir):
@@ -45,9 +49,73 @@ def test_clean_untracked_episodes_removes_rows_and_existing_files(tmp_path):
         ]
     )
 
-    clean_untracked_episodes(pod_tbl, episode_tbl)
+    asyncio.run(clean_untracked_episodes(pod_tbl, episode_tbl))
 
     assert episode_tbl.search(Query().bvid == tracked_episode.bvid)
     assert not episode_tbl.search(Query().bvid == untracked_existing_episode.bvid)
     assert not episode_tbl.search(Query().bvid == untracked_missing_episode.bvid)
     assert not untracked_existing_episode.location.exists()
+
+
+class CountingStorage(MemoryStorage):
+    writes = 0
+
+    def write(self, data):
+        CountingStorage.writes += 1
+        super().write(data)
+
+
+def test_clean_untracked_episodes_matches_quality_and_writes_once(tmp_path):
+    db = TinyDB(storage=CountingStorage)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+    pod_tbl.insert(
+        Pod(
+            feed_id="feed.test",
+            data_dir=tmp_path,
+            base_url="http://localhost",
+            episodes=[{"bvid": f"BV{index}"} for index in range(50)],
+        ).to_dict()
+    )
+    rows = [_episode(f"BV{index}", tmp_path).to_dict() for index in range(100)]
+    high_quality = _episode("BV0", tmp_path).to_dict() | {"quality": "high"}
+    episode_tbl.insert_multiple(rows + [high_quality])
+    CountingStorage.writes = 0
+
+    asyncio.run(clean_untracked_episodes(pod_tbl, episode_tbl))
+
+    assert CountingStorage.writes == 1
+    assert sorted(row["bvid"] for row in episode_tbl.all()) == sorted(
+        f"BV{index}" for index in range(50)
+    )
+    assert {row["quality"] for row in episode_tbl.all()} == {"low"}
+
+
+def test_clean_unused_episodes_deletes_old_orphans_only(tmp_path):
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    known_episode = _episode("BVKNOWN", tmp_path)
+    known_episode.location.write_text("audio", encoding="utf-8")
+    old_orphan = media_dir / "old.mp3"
+    old_orphan.write_text("audio", encoding="utf-8")
+    fresh_orphan = media_dir / "fresh.mp3"
+    fresh_orphan.write_text("audio", encoding="utf-8")
+    (media_dir / "subdir").mkdir()
+    an_hour_ago = time.time() - 3600
+    os.utime(old_orphan, (an_hour_ago, an_hour_ago))
+    os.utime(known_episode.location, (an_hour_ago, an_hour_ago))
+
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    episode_tbl.insert(known_episode.to_dict())
+
+    clean_unused_episodes(episode_tbl, tmp_path, grace_period=600)
+
+    assert known_episode.location.exists()
+    assert not old_orphan.exists()
+    assert fresh_orphan.exists()
+    assert (media_dir / "subdir").is_dir()
+
+    clean_unused_episodes(episode_tbl, tmp_path)
+
+    assert not fresh_orphan.exists()
+    assert known_episode.location.exists()
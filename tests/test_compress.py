@@ -0,0 +1,61 @@
+import gzip
+import os
+
+from src.bilipod.executing.web_server import _fresh_precompressed
+from src.bilipod.utils import compress
+from src.bilipod.utils.http_utils import choose_encoding, parse_accept_encoding
+
+
+def test_write_precompressed_creates_gzip_sibling(tmp_path):
+    xml_path = tmp_path / "feed.xml"
+    xml_path.write_text("<rss>" + "episode " * 200 + "</rss>", encoding="utf-8")
+
+    compress.write_precompressed(xml_path)
+
+    gz_path = tmp_path / "feed.xml.gz"
+    assert gzip.decompress(gz_path.read_bytes()) == xml_path.read_bytes()
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_write_precompressed_removes_stale_brotli_without_codec(
+    tmp_path, monkeypatch
+):
+    xml_path = tmp_path / "feed.xml"
+    xml_path.write_text("<rss></rss>", encoding="utf-8")
+    (tmp_path / "feed.xml.br").write_bytes(b"stale")
+    monkeypatch.setattr(compress, "brotli", None)
+
+    compress.write_precompressed(xml_path)
+
+    assert not (tmp_path / "feed.xml.br").exists()
+    assert (tmp_path / "feed.xml.gz").exists()
+
+
+def test_parse_accept_encoding_reads_qvalues():
+    assert parse_accept_encoding("gzip;q=0.5, br, identity;q=0") == {
+        "gzip": 0.5,
+        "br": 1.0,
+        "identity": 0.0,
+    }
+
+
+def test_choose_encoding_respects_refusals_and_wildcard():
+    assert choose_encoding("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("*", ["br", "gzip"]) == "br"
+    assert choose_encoding("*, br;q=0", ["br", "gzip"]) == "gzip"
+    assert choose_encoding(None, ["br", "gzip"]) is None
+
+
+def test_fresh_precompressed_ignores_stale_sibling(tmp_path):
+    xml_path = tmp_path / "feed.xml"
+    xml_path.write_text("<rss></rss>", encoding="utf-8")
+    compress.write_precompressed(xml_path)
+
+    assert "gzip" in _fresh_precompressed(xml_path, xml_path.stat())
+
+    stale = xml_path.stat().st_mtime_ns - 10**9
+    for sibling in tmp_path.glob("feed.xml.*"):
+        os.utime(sibling, ns=(stale, stale))
+
+    assert _fresh_precompressed(xml_path, xml_path.stat()) == []
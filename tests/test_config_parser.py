@@ -1,6 +1,10 @@
 import pytest
 
-from src.bilipod.utils.config_parser import BiliPodConfig, load_feed_configs
+from src.bilipod.utils.config_parser import (
+    BiliPodConfig,
+    load_feed_configs,
+    parse_size,
+)
 
 
 def test_blank_token_config_uses_login_config(tmp_path):
@@ -139,3 +143,55 @@ feeds:
     assert list(feeds) == ["feed1"]
     assert feeds["feed1"].uid == 123
     assert feeds["feed1"].update_period == "5m"
+
+
+def test_server_offload_mode_is_validated(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        """
+server:
+  offload: X-Accel-Redirect
+storage: {}
+login: {}
+feeds: {}
+""",
+        encoding="utf-8",
+    )
+    config = BiliPodConfig.from_yaml(str(config_file))
+    assert config.server.offload == "x-accel-redirect"
+
+    config_file.write_text(
+        """
+server:
+  offload: proxy
+storage: {}
+login: {}
+feeds: {}
+""",
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="Unsupported server offload mode"):
+        BiliPodConfig.from_yaml(str(config_file))
+
+
+def test_storage_budget_sizes_are_parsed(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        """
+server: {}
+storage:
+  max_size: 1.5G
+  min_free: 500MiB
+feeds: {}
+""",
+        encoding="utf-8",
+    )
+
+    config = BiliPodConfig.from_yaml(str(config_file))
+
+    assert config.storage.max_size == int(1.5 * 1024**3)
+    assert config.storage.min_free == 500 * 1024**2
+    assert parse_size(4096) == 4096
+    assert parse_size(None) is None
+    with pytest.raises(ValueError):
+        parse_size("lots")
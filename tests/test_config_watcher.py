@@ -1,4 +1,6 @@
 import asyncio
+import importlib
+import os
 
 from tinydb import Query, TinyDB
 from tinydb.storages import MemoryStorage
@@ -88,10 +90,11 @@ feeds:
         "clean_unused_rss",
         lambda pod_tbl, data_dir: cleaned_rss.append(data_dir),
     )
+    async def fake_clean_untracked_episodes(pod_tbl, episode_tbl):
+        cleaned_untracked.append(True)
+
     monkeypatch.setattr(
-        config_watcher,
-        "clean_untracked_episodes",
-        lambda pod_tbl, episode_tbl: cleaned_untracked.append(True),
+        config_watcher, "clean_untracked_episodes", fake_clean_untracked_episodes
     )
 
     current_feeds = {
@@ -118,3 +121,188 @@ feeds:
     assert regenerated_opml == [tmp_path / "podcast.opml"]
     assert cleaned_rss == [tmp_path]
     assert cleaned_untracked == [True]
+
+
+def test_config_file_watcher_ignores_touches_and_waits_for_writes(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("feeds: {}\n", encoding="utf-8")
+    watcher = config_watcher.ConfigFileWatcher(
+        config_file, poll_interval=0.01, debounce=0.05
+    )
+
+    async def wait(timeout):
+        try:
+            await asyncio.wait_for(watcher.wait_for_change(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def scenario():
+        # Same content with a new mtime
+        os.utime(config_file, ns=(0, 0))
+        touched = await wait(0.3)
+
+        async def edit():
+            for content in ("feeds:\n", "feeds:\n  a:\n", "feeds:\n  a:\n    uid: 1\n"):
+                config_file.write_text(content, encoding="utf-8")
+                await asyncio.sleep(0.02)
+
+        changed, _ = await asyncio.gather(wait(1), edit())
+        return touched, changed
+
+    touched, changed = asyncio.run(scenario())
+    assert not touched
+    assert changed
+    assert watcher._digest == config_watcher.config_file_digest(config_file)
+
+
+def test_feed_change_action_picks_cheapest_action():
+    current = FeedConfig(uid=1, title="Old", update_period="1h")
+
+    def action(**changes):
+        latest = FeedConfig(**{**current.to_dict(), **changes})
+        return config_watcher.feed_change_action(current, latest)
+
+    assert action() == "reschedule"
+    assert action(update_period="2h") == "reschedule"
+    assert action(title="New", update_period="2h") == "feed_xml"
+    assert action(title="New", quality="high") == "variants"
+    assert action(title="New", keep_last=3) == "refresh"
+    assert action(uid=2) == "refresh"
+    # Dropping an override falls back to the value from bilibili
+    assert action(title=None) == "refresh"
+
+
+def test_sync_feed_config_applies_settings_without_listing(tmp_path, monkeypatch):
+    initialize = importlib.import_module("src.bilipod.executing.initialize")
+    pipeline = importlib.import_module("src.bilipod.executing.pipeline")
+    downloader = importlib.import_module("src.bilipod.downloader.downloader")
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        """
+feeds:
+  feed_renamed:
+    uid: 1
+    title: New title
+  feed_requality:
+    uid: 2
+    quality: high
+""",
+        encoding="utf-8",
+    )
+
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+    for feed_id, uid in (("feed_renamed", 1), ("feed_requality", 2)):
+        pod_tbl.insert(
+            Pod(
+                feed_id=feed_id,
+                data_dir=tmp_path,
+                base_url="http://localhost",
+                uid=uid,
+                title="Old title",
+                episodes=[{"bvid": f"BV{uid}", "title": "episode", "pubdate": 1}],
+            ).to_dict()
+        )
+    old_media = tmp_path / "BV2_low.mp3"
+    old_media.write_bytes(b"old")
+    episode_tbl.insert(
+        {
+            "bvid": "BV2",
+            "quality": "low",
+            "format": "audio",
+            "status": "downloaded",
+            "location": str(old_media),
+        }
+    )
+
+    downloaded = []
+    feed_xml = []
+
+    async def fake_download_episode(episode, credential):
+        downloaded.append((episode.bvid, episode.quality))
+
+    async def fail_initialize_or_update_feed(**kwargs):
+        raise AssertionError("the listing should not be fetched again")
+
+    monkeypatch.setattr(downloader, "download_episode", fake_download_episode)
+    for module in (initialize, pipeline):
+        monkeypatch.setattr(
+            module,
+            "generate_feed_xml",
+            lambda pod, episode_tbl: feed_xml.append((pod.feed_id, pod.title)),
+        )
+    monkeypatch.setattr(
+        config_watcher, "initialize_or_update_feed", fail_initialize_or_update_feed
+    )
+    monkeypatch.setattr(config_watcher, "schedule_pod_update", lambda **kwargs: None)
+    monkeypatch.setattr(config_watcher, "clear_feed_job", lambda feed_id: None)
+    monkeypatch.setattr(config_watcher, "generate_opml", lambda **kwargs: None)
+
+    def fail_clean(*args):
+        raise AssertionError("no episodes to clean")
+
+    monkeypatch.setattr(config_watcher, "clean_untracked_episodes", fail_clean)
+    monkeypatch.setattr(config_watcher, "clean_unused_rss", fail_clean)
+
+    updated_feeds = asyncio.run(
+        config_watcher.sync_feed_config(
+            config_path=config_file,
+            server_config=ServerConfig(),
+            data_dir=tmp_path,
+            pod_tbl=pod_tbl,
+            episode_tbl=episode_tbl,
+            credential=None,
+            current_feeds={
+                "feed_renamed": FeedConfig(uid=1, title="Old title"),
+                "feed_requality": FeedConfig(uid=2),
+            },
+        )
+    )
+
+    assert updated_feeds["feed_renamed"].title == "New title"
+    assert pod_tbl.get(Query().feed_id == "feed_renamed")["title"] == "New title"
+    assert sorted(set(feed_xml)) == [
+        ("feed_renamed", "New title"),
+        ("feed_requality", "Old title"),
+    ]
+    # Only the new variant is downloaded; the old one is expired
+    assert downloaded == [("BV2", "high")]
+    assert pod_tbl.get(Query().feed_id == "feed_requality")["quality"] == "high"
+    assert not old_media.exists()
+    assert episode_tbl.get(Query().quality == "low")["status"] == "deleted"
+
+
+def test_watch_feed_config_applies_edits_made_during_startup(tmp_path, monkeypatch):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("feeds:\n  edited:\n    uid: 2\n", encoding="utf-8")
+    synced = []
+
+    async def fake_sync_feed_config(current_feeds, **kwargs):
+        synced.append(sorted(current_feeds))
+        return config_watcher.load_feed_configs(str(config_file))
+
+    monkeypatch.setattr(config_watcher, "sync_feed_config", fake_sync_feed_config)
+
+    async def scenario():
+        watcher = asyncio.create_task(
+            config_watcher.watch_feed_config_changes(
+                config_path=config_file,
+                server_config=ServerConfig(),
+                data_dir=tmp_path,
+                pod_tbl=None,
+                episode_tbl=None,
+                credential=None,
+                # Loaded before startup, ahead of the edit
+                initial_feeds={"original": FeedConfig(uid=1)},
+                poll_interval=0.01,
+                debounce=0.01,
+            )
+        )
+        await asyncio.sleep(0.1)
+        watcher.cancel()
+
+    asyncio.run(scenario())
+    # Reconciled once at start, then idle while the file is unchanged
+    assert synced == [["original"]]
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from tinydb import Query, TinyDB
+from tinydb.table import Document
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.utils.db_writer import db_write, db_write_sync
+from src.bilipod.utils.storage import close_database, open_database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = open_database(tmp_path / "db.json", flush_interval=60)
+    yield db
+    close_database(db)
+
+
+def test_writes_from_many_threads_are_applied(db):
+    episode_tbl = db.table("episode")
+
+    def insert(start):
+        for index in range(start, start + 50):
+            db_write_sync(episode_tbl, episode_tbl.insert, {"bvid": f"BV{index}"})
+
+    threads = [threading.Thread(target=insert, args=(n * 50,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(episode_tbl) == 200
+    assert len({doc.doc_id for doc in episode_tbl.all()}) == 200
+
+
+def test_readers_see_committed_snapshots_only(db):
+    pod_tbl = db.table("pod")
+    db_write_sync(pod_tbl, pod_tbl.insert, {"feed_id": "a", "update_at": 0})
+    in_batch, release = threading.Event(), threading.Event()
+
+    def slow_update():
+        pod_tbl.update({"update_at": 1}, Query().feed_id == "a")
+        pod_tbl.insert({"feed_id": "b", "update_at": 1})
+        in_batch.set()
+        release.wait(timeout=2)
+
+    future = db.storage.writer.submit(slow_update)
+    assert in_batch.wait(timeout=2)
+    assert pod_tbl.all() == [{"feed_id": "a", "update_at": 0}]
+    release.set()
+    future.result(timeout=2)
+
+    assert sorted(pod["feed_id"] for pod in pod_tbl.all()) == ["a", "b"]
+    assert all(pod["update_at"] == 1 for pod in pod_tbl.all())
+
+
+def test_db_write_returns_results_and_errors(db):
+    pod_tbl = db.table("pod")
+
+    async def run():
+        doc_id = await db_write(pod_tbl, pod_tbl.insert, {"feed_id": "a"})
+        assert pod_tbl.get(doc_id=doc_id)["feed_id"] == "a"
+        with pytest.raises(ValueError):
+            await db_write(pod_tbl, pod_tbl.insert, Document({}, doc_id=doc_id))
+
+    asyncio.run(run())
+    assert len(pod_tbl) == 1
+
+
+def test_close_flushes_committed_writes(tmp_path):
+    db_path = tmp_path / "db.json"
+    db = open_database(db_path, flush_interval=60)
+    episode_tbl = db.table("episode")
+    db_write_sync(episode_tbl, episode_tbl.insert, {"bvid": "BV1"})
+    close_database(db)
+
+    assert json.loads(db_path.read_bytes())["episode"] == {"1": {"bvid": "BV1"}}
+
+
+def test_db_write_runs_inline_without_writer():
+    pod_tbl = TinyDB(storage=MemoryStorage).table("pod")
+
+    assert db_write_sync(pod_tbl, pod_tbl.insert, {"feed_id": "a"}) == 1
+    assert asyncio.run(db_write(pod_tbl, pod_tbl.insert, {"feed_id": "b"})) == 2
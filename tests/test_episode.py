@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+
+from src.bilipod.bp_class import Episode, Pod
+
+
+def _episode(data_dir, **kwargs):
+    return Episode(
+        bvid="BV11NV86tEjW",
+        base_url="http://localhost:7001",
+        title="Title",
+        format="audio",
+        quality="high",
+        data_dir=data_dir,
+        **kwargs,
+    )
+
+
+def test_episode_round_trips_through_dict(tmp_path):
+    episode = _episode(tmp_path, endorse=["like"], timings={"discovered_at": 1.0})
+
+    data = episode.to_dict()
+    restored = Episode.from_dict(data)
+
+    assert data["data_dir"] == str(tmp_path)
+    assert data["location"] == str(tmp_path / "media" / "BV11NV86tEjW_192K.mp3")
+    assert restored.to_dict() == data
+    assert isinstance(restored.data_dir, Path)
+    assert isinstance(restored.location, Path)
+
+
+def test_episode_to_dict_copies_nested_values(tmp_path):
+    episode = _episode(tmp_path, endorse=["like"], timings={"discovered_at": 1.0})
+
+    data = episode.to_dict()
+    data["timings"]["published_at"] = 2.0
+    data["endorse"].append("coin")
+
+    assert episode.timings == {"discovered_at": 1.0}
+    assert episode.endorse == ["like"]
+
+
+def test_records_are_slotted_and_share_repeated_fields(tmp_path):
+    rows = [
+        _episode(str(tmp_path)).to_dict() | {"bvid": bvid} for bvid in ("BV1a", "BV1b")
+    ]
+    first, second = (Episode.from_dict(row) for row in rows)
+
+    assert first.data_dir is second.data_dir
+    assert first.base_url is second.base_url
+    with pytest.raises(AttributeError):
+        first.unknown = 1
+    assert not hasattr(Pod(feed_id="test", base_url="http://x"), "__dict__")
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode
+from src.bilipod.executing.initialize import migrate_media
+from src.bilipod.utils import media_layout
+from src.bilipod.utils.media_layout import (
+    find_media,
+    media_relpath,
+    media_shard,
+    migrate_media_layout,
+    set_media_layout,
+)
+
+
+@pytest.fixture
+def hashed_layout():
+    set_media_layout("hashed")
+    yield
+    set_media_layout("flat")
+
+
+def _episode(bvid, data_dir):
+    return Episode(
+        bvid=bvid,
+        format="audio",
+        quality="low",
+        data_dir=data_dir,
+        base_url="http://localhost",
+    )
+
+
+def test_hashed_layout_changes_location_but_not_url(tmp_path, hashed_layout):
+    episode = _episode("BVHASH", tmp_path)
+    name = "BVHASH_64K.mp3"
+
+    assert media_relpath(name) == f"{media_shard(name)}/{name}"
+    assert episode.location == tmp_path / "media" / media_shard(name) / name
+    assert episode.url == "http://localhost/media/BVHASH_64K.mp3"
+
+
+def test_set_media_layout_rejects_unknown_layout():
+    with pytest.raises(ValueError):
+        set_media_layout("by-date")
+    assert media_layout.get_media_layout() == "flat"
+
+
+def test_migrate_media_moves_files_and_rows(tmp_path, hashed_layout):
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    set_media_layout("flat")
+    flat = _episode("BVMOVE", tmp_path)
+    flat.location.write_text("audio", encoding="utf-8")
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    episode_tbl.insert(flat.to_dict())
+
+    set_media_layout("hashed")
+    asyncio.run(migrate_media(tmp_path, episode_tbl))
+
+    hashed = _episode("BVMOVE", tmp_path)
+    assert not flat.location.exists()
+    assert hashed.location.read_text(encoding="utf-8") == "audio"
+    assert episode_tbl.all()[0]["location"] == str(hashed.location)
+    assert find_media(media_dir, "BVMOVE_64K.mp3") == hashed.location
+
+    # And back, removing the emptied shard directory
+    assert migrate_media_layout(media_dir, "flat") == {
+        str(hashed.location): str(flat.location)
+    }
+    assert flat.location.exists()
+    assert [path.name for path in media_dir.iterdir()] == ["BVMOVE_64K.mp3"]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.utils import metrics
+from src.bilipod.utils.metrics import (
+    Counter,
+    Histogram,
+    MetricsRegistry,
+    TimedStorage,
+    track_api_call,
+)
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests.", ("route",))
+    latency = registry.histogram(
+        "test_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1)
+    )
+
+    requests.inc(route="feed")
+    requests.inc(2, route="feed")
+    latency.observe(0.05, route="feed")
+    latency.observe(0.5, route="feed")
+    latency.observe(5, route="feed")
+
+    text = registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{route="feed"} 3' in text
+    assert 'test_latency_seconds_bucket{route="feed",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="feed",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{route="feed",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="feed"} 3' in text
+    assert 'test_latency_seconds_sum{route="feed"} 5.55' in text
+
+
+def test_metric_labels_are_checked_and_escaped():
+    counter = Counter("test_total", "Test.", ("name",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+    counter.inc(name='a "quoted"\nname')
+    assert 'test_total{name="a \\"quoted\\"\\nname"} 1' in counter.render()
+
+
+def test_track_api_call_records_response_code():
+    class ResponseCodeError(Exception):
+        code = -352
+
+    async def ok():
+        return "data"
+
+    async def rejected():
+        raise ResponseCodeError()
+
+    before = metrics.API_CALLS.value(endpoint="test.endpoint", code="-352")
+    assert asyncio.run(track_api_call("test.endpoint", ok())) == "data"
+    with pytest.raises(ResponseCodeError):
+        asyncio.run(track_api_call("test.endpoint", rejected()))
+
+    assert metrics.API_CALLS.value(endpoint="test.endpoint", code="0") >= 1
+    assert metrics.API_CALLS.value(endpoint="test.endpoint", code="-352") == before + 1
+
+
+def test_timed_storage_records_db_latency():
+    before = metrics.DB_OPERATION_SECONDS.count(operation="write")
+    db = TinyDB(storage=TimedStorage(MemoryStorage))
+    db.table("episode").insert({"bvid": "BV1"})
+
+    assert db.table("episode").all() == [{"bvid": "BV1"}]
+    assert metrics.DB_OPERATION_SECONDS.count(operation="write") > before
+
+
+def test_histogram_time_context_manager():
+    histogram = Histogram("test_seconds", "Test.")
+    with histogram.time():
+        pass
+    assert histogram.count() == 1
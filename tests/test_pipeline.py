@@ -0,0 +1,97 @@
+import asyncio
+import importlib
+
+from tinydb import Query, TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Pod
+from src.bilipod.utils.biliuser import get_episode_list
+
+pipeline = importlib.import_module("src.bilipod.executing.pipeline")
+downloader = importlib.import_module("src.bilipod.downloader.downloader")
+
+
+def _pod(tmp_path, feed_id, bvids):
+    return Pod(
+        feed_id=feed_id,
+        data_dir=tmp_path,
+        base_url="http://localhost",
+        episodes=[{"bvid": bvid, "pubdate": 1} for bvid in bvids],
+    )
+
+
+def test_pipeline_publishes_each_feed_while_the_next_is_listed(
+    tmp_path, monkeypatch
+):
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    downloads = []
+    published = []
+    first_published = asyncio.Event()
+
+    async def fake_download_episode(episode, credential):
+        downloads.append(episode.bvid)
+        if episode.bvid == "BV_fail":
+            return episode
+        episode.status = "downloaded"
+
+    def fake_generate_feed_xml(pod, episode_tbl):
+        listed = {episode["bvid"] for episode in pod.episodes}
+        stored = {row["bvid"] for row in episode_tbl.all()}
+        published.append((pod.feed_id, sorted(listed & stored)))
+        first_published.set()
+
+    monkeypatch.setattr(downloader, "download_episode", fake_download_episode)
+    monkeypatch.setattr(downloader, "CHUNK_INTERVAL", 0)
+    monkeypatch.setattr(pipeline, "generate_feed_xml", fake_generate_feed_xml)
+
+    async def listing():
+        pod_a = _pod(tmp_path, "a", ["BV1", "BV_shared"])
+        yield pod_a, get_episode_list(pod_a)
+        # Feed a is out before feed b is even listed
+        await asyncio.wait_for(first_published.wait(), 5)
+        pod_b = _pod(tmp_path, "b", ["BV_shared", "BV_fail"])
+        yield pod_b, get_episode_list(pod_b)
+
+    downloaded = asyncio.run(
+        pipeline.run_pipeline(listing(), episode_tbl, max_attempts=2, workers=2)
+    )
+
+    assert downloaded == 2
+    assert sorted(downloads) == ["BV1", "BV_fail", "BV_fail", "BV_shared"]
+    assert ("a", ["BV1", "BV_shared"]) in published
+    assert published[-1][0] == "b"
+    assert sorted(row["bvid"] for row in episode_tbl.all()) == [
+        "BV1",
+        "BV_fail",
+        "BV_shared",
+    ]
+    assert episode_tbl.get(Query().bvid == "BV_fail")["status"] is None
+
+
+def test_pipeline_bounds_episodes_waiting_for_download(tmp_path, monkeypatch):
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    downloads = []
+    ahead = []
+
+    async def slow_download_episode(episode, credential):
+        await asyncio.sleep(0.001)
+        downloads.append(episode.bvid)
+        episode.status = "downloaded"
+
+    async def listing():
+        for index in range(30):
+            pod = _pod(tmp_path, f"feed{index}", [f"BV{index}"])
+            # Episodes listed but not downloaded yet
+            ahead.append(index - len(downloads))
+            yield pod, get_episode_list(pod)
+
+    monkeypatch.setattr(downloader, "download_episode", slow_download_episode)
+    monkeypatch.setattr(downloader, "CHUNK_INTERVAL", 0)
+    monkeypatch.setattr(pipeline, "STAGE_QUEUE_SIZE", 2)
+    monkeypatch.setattr(pipeline, "generate_feed_xml", lambda **kwargs: None)
+
+    asyncio.run(pipeline.run_pipeline(listing(), episode_tbl, workers=1))
+
+    assert len(episode_tbl) == 30
+    # The queued episodes plus the one being downloaded
+    assert max(ahead) <= 2 + 1
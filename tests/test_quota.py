@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode, Pod
+from src.bilipod.executing import eviction
+from src.bilipod.utils import quota
+from src.bilipod.utils.quota import StorageBudget, duration_seconds, estimate_size
+
+
+def _episode(bvid, tmp_path, size=0, duration="1:00"):
+    episode = Episode(
+        bvid=bvid,
+        format="audio",
+        quality="low",
+        data_dir=tmp_path,
+        base_url="http://localhost",
+        duration=duration,
+        pubdate=int(bvid[2:]),
+    )
+    if size:
+        episode.location.write_bytes(b"x" * size)
+        episode.status = "downloaded"
+    return episode
+
+
+def test_estimate_size_from_duration(tmp_path):
+    assert duration_seconds("1:02:03") == 3723
+    assert duration_seconds("12:05") == 725
+    assert duration_seconds(None) == 0
+    assert duration_seconds("live") == 0
+    assert estimate_size(_episode("BV1", tmp_path, duration="10:00")) == 600 * 8000
+
+
+def test_budget_tracks_files_and_reservations(tmp_path):
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    (media_dir / "old.mp3").write_bytes(b"x" * 100)
+    budget = StorageBudget()
+    budget.configure(media_dir, max_size=1000)
+    assert budget.used == 100
+
+    episode = _episode("BV1", tmp_path, duration="0:00")
+    reserved = asyncio.run(budget.reserve(episode))
+    episode.location.write_bytes(b"x" * 300)
+    budget.settle(reserved, episode.location)
+    assert (budget.used, budget.reserved) == (400, 0)
+
+    assert budget.overflow(600) == 0
+    assert budget.overflow(700) == 100
+    assert budget.remove_file(media_dir / "old.mp3") == 100
+    assert budget.remove_file(media_dir / "old.mp3") == 0
+    assert budget.used == 300
+
+
+def test_admission_evicts_before_reserving(tmp_path):
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    budget = StorageBudget()
+    budget.configure(media_dir, max_size=1000)
+    budget.used = 900
+    requests = []
+
+    async def evict(needed):
+        requests.append(needed)
+        budget.used -= needed
+        return needed
+
+    budget.evict = evict
+
+    assert asyncio.run(budget.admit(300)) is True
+    assert requests == [200]
+    assert budget.reserved == 300
+    # Larger than the whole budget: never admitted
+    assert asyncio.run(budget.admit(2000)) is False
+
+
+def test_eviction_removes_least_recently_served_first(tmp_path, monkeypatch):
+    (tmp_path / "media").mkdir()
+    budget = StorageBudget()
+    monkeypatch.setattr(quota, "STORAGE_BUDGET", budget)
+    monkeypatch.setattr(eviction, "STORAGE_BUDGET", budget)
+    monkeypatch.setattr(eviction, "generate_feed_xml", lambda **kwargs: None)
+
+    episodes = [_episode(f"BV{index}", tmp_path, size=100) for index in range(1, 5)]
+    for age, episode in enumerate(reversed(episodes)):
+        os.utime(episode.location, (1000 - age, 1000 - age))
+    budget.configure(tmp_path / "media", max_size=400)
+    # BV1 is the oldest file but was just played
+    budget.record_access(episodes[0].location)
+
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+    episode_tbl.insert_multiple(episode.to_dict() for episode in episodes)
+    pod_tbl.insert(
+        Pod(
+            feed_id="feed.test",
+            data_dir=tmp_path,
+            base_url="http://localhost",
+            keep_last=1,
+            episodes=[{"bvid": e.bvid, "pubdate": e.pubdate} for e in episodes],
+        ).to_dict()
+    )
+
+    freed = asyncio.run(
+        eviction.evict_least_recently_served(pod_tbl, episode_tbl, 150)
+    )
+
+    assert freed == 200
+    assert budget.used == 200
+    statuses = {row["bvid"]: row["status"] for row in episode_tbl.all()}
+    # BV4 is the feed's newest (keep_last) episode and is never evicted
+    assert statuses == {
+        "BV1": "downloaded",
+        "BV2": "deleted",
+        "BV3": "deleted",
+        "BV4": "downloaded",
+    }
+    assert episodes[0].location.exists()
+    assert not episodes[1].location.exists()
+    assert not episodes[2].location.exists()
@@ -0,0 +1,91 @@
+import asyncio
+
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode, Pod
+from src.bilipod.executing import retention
+from src.bilipod.executing.retention import (
+    prune_expired_episodes,
+    retain_episodes,
+    retention_limit,
+)
+
+
+def _listing(count):
+    return [{"bvid": f"BV{index}", "pubdate": 1000 + index} for index in range(count)]
+
+
+def _pod(tmp_path, feed_id="feed.test", keep_last=2, episodes=None):
+    return Pod(
+        feed_id=feed_id,
+        data_dir=tmp_path,
+        base_url="http://localhost",
+        keep_last=keep_last,
+        episodes=episodes or [],
+    )
+
+
+def _downloaded(bvid, tmp_path):
+    episode = Episode(
+        bvid=bvid,
+        format="audio",
+        quality="low",
+        data_dir=tmp_path,
+        base_url="http://localhost",
+    )
+    episode.status = "downloaded"
+    episode.location.write_text("audio", encoding="utf-8")
+    return episode
+
+
+def test_retention_limit():
+    assert retention_limit(3) == 3
+    assert retention_limit("5") == 5
+    assert retention_limit(None) is None
+    assert retention_limit("None") is None
+    assert retention_limit(0) is None
+
+
+def test_retain_episodes_keeps_newest_in_listing_order(tmp_path):
+    retention._expired.clear()
+    pod = _pod(tmp_path, keep_last=2)
+    listing = _listing(4)[::-1]  # BV3 BV2 BV1 BV0
+
+    kept = retain_episodes(pod, listing, previous_episodes=_listing(3)[::-1])
+
+    assert [episode["bvid"] for episode in kept] == ["BV3", "BV2"]
+    # Only episodes kept by the previous listing expire; BV0 never was
+    assert retention._expired == {("BV1", "low", "audio"), ("BV0", "low", "audio")}
+    retention._expired.clear()
+
+    assert retain_episodes(_pod(tmp_path, keep_last="None"), listing) == listing
+    assert not retention._expired
+
+
+def test_prune_expired_episodes_marks_rows_and_removes_files(tmp_path):
+    retention._expired.clear()
+    (tmp_path / "media").mkdir()
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    episode_tbl = db.table("episode")
+
+    episodes = {bvid: _downloaded(bvid, tmp_path) for bvid in ("BV0", "BV1", "BV2")}
+    episode_tbl.insert_multiple(episode.to_dict() for episode in episodes.values())
+    previous = _listing(3)
+    pod = _pod(tmp_path, keep_last=1, episodes=previous)
+    pod.episodes = retain_episodes(pod, previous, previous)
+    pod_tbl.insert(pod.to_dict())
+    # A second feed still keeps BV0
+    pod_tbl.insert(
+        _pod(tmp_path, feed_id="feed.other", episodes=[{"bvid": "BV0"}]).to_dict()
+    )
+
+    assert asyncio.run(prune_expired_episodes(pod_tbl, episode_tbl)) == 1
+
+    statuses = {row["bvid"]: row["status"] for row in episode_tbl.all()}
+    assert statuses == {"BV0": "downloaded", "BV1": "deleted", "BV2": "downloaded"}
+    assert episodes["BV0"].location.exists()
+    assert not episodes["BV1"].location.exists()
+    assert episodes["BV2"].location.exists()
+    assert asyncio.run(prune_expired_episodes(pod_tbl, episode_tbl)) == 0
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+from tinydb import TinyDB
+
+from src.bilipod.utils import storage
+from src.bilipod.utils.storage import (
+    CoalescingStorage,
+    FastJSONStorage,
+    flush_storage,
+)
+
+
+@pytest.mark.parametrize("codec", ["orjson", "json"])
+def test_fast_json_storage_round_trips(tmp_path, monkeypatch, codec):
+    if codec == "json":
+        monkeypatch.setattr(storage, "orjson", None)
+    elif storage.orjson is None:
+        pytest.skip("orjson is not installed")
+    db_path = tmp_path / "db.json"
+
+    with TinyDB(db_path, storage=FastJSONStorage) as db:
+        db.table("episode").insert({"bvid": "BV1", "title": "标题", "size": 1.5})
+
+    assert json.loads(db_path.read_text("utf-8"))["episode"]["1"]["title"] == "标题"
+    with TinyDB(db_path, storage=FastJSONStorage) as db:
+        assert db.table("episode").all() == [
+            {"bvid": "BV1", "title": "标题", "size": 1.5}
+        ]
+    assert list(tmp_path.iterdir()) == [db_path]
+
+
+def test_coalescing_storage_defers_writes_until_flush(tmp_path):
+    db_path = tmp_path / "db.json"
+    db = TinyDB(db_path, storage=CoalescingStorage(FastJSONStorage, flush_interval=60))
+    episode_tbl = db.table("episode")
+
+    for index in range(3):
+        episode_tbl.insert({"bvid": f"BV{index}"})
+    assert len(episode_tbl) == 3
+    assert db_path.read_bytes() == b""
+
+    flush_storage(episode_tbl)
+    assert len(json.loads(db_path.read_bytes())["episode"]) == 3
+
+    episode_tbl.insert({"bvid": "BV3"})
+    db.close()
+    assert len(json.loads(db_path.read_bytes())["episode"]) == 4
+
+
+def test_coalescing_storage_flushes_on_a_timer(tmp_path):
+    db_path = tmp_path / "db.json"
+    db = TinyDB(
+        db_path, storage=CoalescingStorage(FastJSONStorage, flush_interval=0.05)
+    )
+    db.table("pod").insert({"feed_id": "test"})
+
+    deadline = time.monotonic() + 2
+    while db.storage.dirty and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(db_path.read_bytes())["pod"]["1"] == {"feed_id": "test"}
+    db.close()
+
+
+def test_coalescing_storage_writes_through_without_interval(tmp_path):
+    db_path = tmp_path / "db.json"
+    db = TinyDB(db_path, storage=CoalescingStorage(FastJSONStorage, flush_interval=0))
+    db.table("pod").insert({"feed_id": "test"})
+
+    assert json.loads(db_path.read_bytes())["pod"]["1"] == {"feed_id": "test"}
+    db.close()
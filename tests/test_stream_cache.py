@@ -0,0 +1,160 @@
+import asyncio
+import importlib
+import os
+from types import SimpleNamespace
+
+from bilibili_api import video
+
+from src.bilipod.utils.quota import StorageBudget
+from src.bilipod.utils.stream_cache import StreamCache, stream_key
+
+# The package re-exports the video_downloader function under the module name
+video_downloader = importlib.import_module(
+    "src.bilipod.downloader.video_downloader"
+)
+
+
+def _audio(quality):
+    return SimpleNamespace(audio_quality=quality, codecs="mp4a.40.2")
+
+
+def _cache(tmp_path, monkeypatch, max_size=0):
+    cache = StreamCache()
+    cache.configure(tmp_path / "cache", max_size=max_size)
+    monkeypatch.setattr(video_downloader, "STREAM_CACHE", cache)
+    return cache
+
+
+def test_stream_key():
+    assert stream_key(_audio(video.AudioQuality._64K)) == "a30216_mp4a.40.2"
+    stream = SimpleNamespace(
+        video_quality=video.VideoQuality._720P,
+        video_codecs=video.VideoCodecs.AVC,
+        codecs="avc1.64001F",
+    )
+    assert stream_key(stream) == "v64_avc1.64001F"
+    assert stream_key(video.FLVStreamDownloadURL(url="http://x")) == "flv"
+
+
+def test_fetch_downloads_each_stream_once(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch, max_size=1024)
+    downloads = []
+
+    async def download(path):
+        downloads.append(path)
+        path.write_bytes(b"stream")
+
+    async def fetch(key, any_audio=False):
+        return await cache.fetch(
+            "BV1", key, ".m4s", download, tmp_path, any_audio=any_audio
+        )
+
+    async def run():
+        first, second = await asyncio.gather(
+            fetch("a30280_mp4a"), fetch("a30280_mp4a")
+        )
+        # A lower audio quality can be made from the cached 192K stream
+        lower = await fetch("a30216_mp4a", any_audio=True)
+        return first, second, lower
+
+    first, second, lower = asyncio.run(run())
+
+    assert len(downloads) == 1
+    assert first == second == lower
+    assert first.read_bytes() == b"stream"
+    # Pinned while in use, so pruning to 0 bytes keeps it
+    cache.max_size = 0
+    cache.prune()
+    assert first.exists()
+    cache.release([first, second, lower])
+    cache.prune()
+    assert not first.exists()
+
+
+def test_transcode_links_identical_outputs(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch)
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    source = tmp_path / "cache" / "streams" / "BV1" / "a30216_mp4a.m4s"
+    source.parent.mkdir()
+    source.write_bytes(b"stream")
+    sources = {source: "BV1/a30216_mp4a.m4s"}
+    runs = []
+
+    async def fake_ffmpeg(args):
+        runs.append(args)
+        with open(args[-1], "wb") as f:
+            f.write(b"mp3")
+
+    monkeypatch.setattr(video_downloader, "run_ffmpeg", fake_ffmpeg)
+
+    first = media_dir / "BV1_132K.mp3"
+    second = media_dir / "BV1_192K.mp3"
+    for outfile in (first, second):
+        asyncio.run(
+            video_downloader.transcode(
+                ["-y", "-i", source, "-vn", "-acodec", "libmp3lame", str(outfile)],
+                sources,
+            )
+        )
+
+    assert len(runs) == 1
+    assert second.read_bytes() == b"mp3"
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+
+    # Outputs still linked from media are kept; unshared ones are pruned
+    cache.prune()
+    assert len(list((tmp_path / "cache" / "outputs").iterdir())) == 1
+    budget = StorageBudget()
+    budget.removed = cache.media_removed
+    budget.remove_file(first)
+    cache.prune()
+    assert len(list((tmp_path / "cache" / "outputs").iterdir())) == 1
+    budget.remove_file(second)
+    cache.prune()
+    assert not list((tmp_path / "cache" / "outputs").iterdir())
+
+
+def test_prune_works_from_the_index(tmp_path, monkeypatch):
+    stream_dir = tmp_path / "cache" / "streams" / "BV1"
+    stream_dir.mkdir(parents=True)
+    for index, name in enumerate(["a30216_mp4a.m4s", "a30232_mp4a.m4s"]):
+        (stream_dir / name).write_bytes(b"x" * 100)
+        os.utime(stream_dir / name, (1000 + index, 1000 + index))
+    (stream_dir / "a30280_mp4a.m4s.part").write_bytes(b"partial")
+    cache = _cache(tmp_path, monkeypatch, max_size=150)
+
+    # Indexed at startup; the partial download of the last run is gone
+    assert sorted(path.name for path in stream_dir.iterdir()) == [
+        "a30216_mp4a.m4s",
+        "a30232_mp4a.m4s",
+    ]
+    # An entry removed behind the cache's back does not break pruning
+    (stream_dir / "a30216_mp4a.m4s").unlink()
+    assert cache.prune() == 0
+    assert cache.prune() == 0
+    assert (stream_dir / "a30232_mp4a.m4s").exists()
+
+    cache.max_size = 0
+    assert cache.prune() == 100
+    # The emptied stream directory goes too
+    assert not stream_dir.exists()
+
+
+def test_cache_hits_leave_published_media_untouched(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch)
+    outfile = tmp_path / "BV1_64K.mp3"
+    outfile.write_bytes(b"mp3")
+    os.utime(outfile, ns=(10**18, 10**18))
+    cache.store_output("recipe", outfile)
+    other = tmp_path / "BV1_132K.mp3"
+
+    assert cache.link_output("recipe", other)
+    # The media file's mtime is its Last-Modified and ETag
+    assert os.stat(outfile).st_mtime_ns == 10**18
+
+    # Evicting the media file also drops the cache's link, freeing the bytes
+    other.unlink()
+    assert cache.unlink_shared(outfile) == 1
+    assert os.stat(outfile).st_nlink == 1
+    assert not list((tmp_path / "cache" / "outputs").iterdir())
@@ -0,0 +1,72 @@
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Episode
+from src.bilipod.feed.podcast_rss import _mark_published
+from src.bilipod.utils.tracing import (
+    STAGE_SECONDS,
+    latency_percentiles,
+    percentile,
+    span,
+    stamp_discovered,
+)
+
+
+def test_stamp_discovered_keeps_earlier_discovery():
+    previous = [{"bvid": "BV1", "timings": {"discovered_at": 100.0}}]
+    listing = [{"bvid": "BV1"}, {"bvid": "BV2"}]
+
+    stamp_discovered(listing, previous, timestamp=200.0)
+
+    assert listing[0]["timings"] == {"discovered_at": 100.0}
+    assert listing[1]["timings"] == {"discovered_at": 200.0}
+    # The previous listing's dicts are not shared
+    assert listing[0]["timings"] is not previous[0]["timings"]
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([7], 95) == 7
+
+
+def test_latency_percentiles_over_stored_episodes():
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    episode_tbl.insert_multiple(
+        [
+            {"bvid": f"BV{i}", "timings": {"discovered_at": 0, "published_at": i}}
+            for i in range(1, 21)
+        ]
+        + [{"bvid": "BVpending", "timings": {"discovered_at": 0}}, {"bvid": "BVold"}]
+    )
+
+    assert latency_percentiles(episode_tbl) == {50: 10, 95: 19}
+
+
+def test_mark_published_persists_first_publication(tmp_path):
+    episode_tbl = TinyDB(storage=MemoryStorage).table("episode")
+    episode = Episode(
+        bvid="BV1",
+        format="audio",
+        quality="low",
+        data_dir=tmp_path,
+        base_url="http://localhost",
+        timings={"discovered_at": 1.0},
+    )
+    episode_tbl.insert(episode.to_dict())
+
+    _mark_published([episode], episode_tbl)
+    published_at = episode_tbl.all()[0]["timings"]["published_at"]
+    assert published_at > 1.0
+
+    stored = Episode.from_dict(episode_tbl.all()[0])
+    _mark_published([stored], episode_tbl)
+    assert episode_tbl.all()[0]["timings"]["published_at"] == published_at
+
+
+def test_span_records_stage_duration():
+    before = STAGE_SECONDS.count(stage="test_stage")
+    with span("test_stage", "BV1"):
+        pass
+    assert STAGE_SECONDS.count(stage="test_stage") == before + 1
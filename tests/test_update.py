@@ -0,0 +1,74 @@
+import asyncio
+import importlib
+import threading
+
+update = importlib.import_module("src.bilipod.executing.update")
+
+
+def test_episode_diff_queue_merges_diffs_of_queued_feeds():
+    diffs = update.EpisodeDiffQueue(maxsize=3)
+
+    async def scenario():
+        await diffs.put("early", ["BV0"])
+        diffs.bind()
+        await diffs.put("a", ["BV1"])
+        await diffs.put("a", ["BV2"])
+        await diffs.put("b", [])
+        first = await diffs.get_batch()
+        await diffs.put("a", ["BV3"])
+        second = await diffs.get_batch()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == {"early": {"BV0"}, "a": {"BV1", "BV2"}, "b": set()}
+    assert second == {"a": {"BV3"}}
+
+
+def test_episode_diff_queue_accepts_diffs_from_other_event_loops():
+    diffs = update.EpisodeDiffQueue(maxsize=1)
+
+    def scheduled_refresh(feed_id):
+        asyncio.run(diffs.put(feed_id, [f"BV_{feed_id}"]))
+
+    async def scenario():
+        diffs.bind()
+        producers = [
+            threading.Thread(target=scheduled_refresh, args=(feed_id,))
+            for feed_id in ("a", "b", "c")
+        ]
+        for producer in producers:
+            producer.start()
+        received = {}
+        while len(received) < 3:
+            received.update(await asyncio.wait_for(diffs.get_batch(), 5))
+        for producer in producers:
+            await asyncio.to_thread(producer.join)
+        return received
+
+    assert asyncio.run(scenario()) == {
+        "a": {"BV_a"},
+        "b": {"BV_b"},
+        "c": {"BV_c"},
+    }
+
+
+def test_episode_diff_queue_blocks_producers_while_full():
+    diffs = update.EpisodeDiffQueue(maxsize=1)
+
+    async def scenario():
+        diffs.bind()
+        await diffs.put("a", ["BV1"])
+        blocked = asyncio.create_task(diffs.put("b", ["BV2"]))
+        await asyncio.sleep(0.05)
+        waited = not blocked.done()
+        # Merging into a queued feed never waits
+        await asyncio.wait_for(diffs.put("a", ["BV3"]), 1)
+        first = await diffs.get_batch()
+        await asyncio.wait_for(blocked, 1)
+        second = await diffs.get_batch()
+        return waited, first, second
+
+    waited, first, second = asyncio.run(scenario())
+    assert waited
+    assert first == {"a": {"BV1", "BV3"}}
+    assert second == {"b": {"BV2"}}
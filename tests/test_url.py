@@ -55,3 +55,11 @@ def test_base_url_builders_sanitize_empty_hostname_path():
 
     assert build_base_url(server_config) == "http://localhost:7001"
     assert _build_base_url(server_config) == "http://localhost:7001"
+
+
+def test_sanitize_url_keeps_clean_urls_and_normalizes_the_rest():
+    clean = "http://localhost:7001/media/BV11NV86tEjW_192K.mp3"
+    assert sanitize_url(clean) is clean
+    assert sanitize_url(f" {clean} ") == clean
+    assert sanitize_url("HTTP://localhost:7001/media") == "http://localhost:7001/media"
+    assert sanitize_url("http://localhost:7001/media?") == "http://localhost:7001/media"
@@ -0,0 +1,495 @@
+import asyncio
+import contextlib
+import email
+import gzip
+import http.client
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import unquote
+from urllib.request import Request, urlopen
+
+import pytest
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from src.bilipod.bp_class import Pod
+from src.bilipod.executing import scheduler
+from src.bilipod.executing import web_server as web_server_module
+from src.bilipod.executing.admin import JobQueue
+from src.bilipod.executing.scheduler import update_period_seconds
+from src.bilipod.executing.web_server import WebServer
+from src.bilipod.utils.compress import write_precompressed
+from src.bilipod.utils.config_parser import ServerConfig
+from src.bilipod.utils.file_cache import FILE_CACHE, CachedFile, FileCache
+from src.bilipod.utils.http_utils import is_not_modified, parse_range_header
+from src.bilipod.utils.media_layout import migrate_media_layout
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "media").mkdir()
+    xml_path = tmp_path / "test.xml"
+    xml_path.write_text("<rss>" + "<item/>" * 100 + "</rss>", encoding="utf-8")
+    write_precompressed(xml_path)
+    (tmp_path / "media" / "BVTEST_64K.mp3").write_bytes(bytes(range(256)) * 4)
+    return tmp_path
+
+
+@contextlib.contextmanager
+def _running_server(server_config, data_dir, pod_tbl=None):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = WebServer(server_config, data_dir, pod_tbl)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=2)
+    try:
+        yield server
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=2)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=2)
+        loop.close()
+
+
+@pytest.fixture
+def web_server(data_dir):
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    pod_tbl.insert(
+        Pod(
+            feed_id="test",
+            base_url="http://localhost",
+            data_dir=data_dir,
+            update_period="2h",
+        ).to_dict()
+    )
+    with _running_server(
+        ServerConfig(bind_address="127.0.0.1", port=0, max_connections=4),
+        data_dir,
+        pod_tbl,
+    ) as server:
+        yield server
+
+
+@pytest.fixture
+def server_url(web_server):
+    return f"http://127.0.0.1:{web_server.server_address[1]}"
+
+
+def _get(url, headers=None):
+    if isinstance(url, str):
+        url = Request(url, headers=headers or {})
+    try:
+        return urlopen(url, timeout=2)
+    except HTTPError as e:
+        return e
+
+
+def test_update_period_seconds():
+    assert update_period_seconds("45m") == 45 * 60
+    assert update_period_seconds("2h45m") == 2 * 60 * 60
+    assert update_period_seconds("1d2h") == 24 * 60 * 60
+    assert update_period_seconds("12:00") == 24 * 60 * 60
+    with pytest.raises(ValueError):
+        update_period_seconds("soon")
+
+
+def test_feed_max_age_defaults_to_a_fraction_of_update_period(monkeypatch):
+    monkeypatch.setattr(scheduler, "_feed_periods", {})
+    scheduler.set_feed_period("feed.test", "2h")
+    feed_max_age = web_server_module._feed_max_age
+
+    assert feed_max_age(ServerConfig(), "test") == 12 * 60
+    assert feed_max_age(ServerConfig(cache_max_age=0), "test") == 0
+    assert feed_max_age(ServerConfig(cache_max_age=86400), "test") == 86400
+    assert feed_max_age(ServerConfig(), "unknown") == 0
+
+    # Rescheduled by the config watcher
+    scheduler.set_feed_period("feed.test", "1d")
+    assert feed_max_age(ServerConfig(), "test") == 24 * 60 * 6
+    scheduler.clear_feed_job("feed.test")
+    assert feed_max_age(ServerConfig(), "test") == 0
+
+
+def test_is_not_modified_prefers_if_none_match():
+    etag = '"abc-10"'
+    assert is_not_modified('"other", W/"abc-10"', None, etag, 100)
+    assert not is_not_modified('"other"', "Thu, 01 Jan 2099 00:00:00 GMT", etag, 100)
+    assert is_not_modified(None, "Thu, 01 Jan 1970 00:01:40 GMT", etag, 100.5)
+    assert not is_not_modified(None, "Thu, 01 Jan 1970 00:01:39 GMT", etag, 100)
+    assert not is_not_modified(None, "not a date", etag, 100)
+
+
+def test_feed_xml_is_served_gzipped_when_accepted(server_url, data_dir):
+    with _get(f"{server_url}/test.xml", {"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(response.read()) == (data_dir / "test.xml").read_bytes()
+
+    with _get(f"{server_url}/test.xml") as response:
+        assert response.headers["Content-Encoding"] is None
+        assert response.read() == (data_dir / "test.xml").read_bytes()
+
+
+def test_feed_xml_conditional_get_returns_304(server_url):
+    with _get(f"{server_url}/test.xml") as response:
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+        # A tenth of the 2h update_period
+        assert response.headers["Cache-Control"] == "max-age=720"
+
+    response = _get(f"{server_url}/test.xml", {"If-None-Match": etag})
+    assert response.status == 304
+    assert response.headers["ETag"] == etag
+
+    response = _get(f"{server_url}/test.xml", {"If-Modified-Since": last_modified})
+    assert response.status == 304
+
+    with _get(f"{server_url}/test.xml", {"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["ETag"] != etag
+
+
+def test_media_conditional_get_returns_304(server_url):
+    with _get(f"{server_url}/media/BVTEST_64K.mp3") as response:
+        etag = response.headers["ETag"]
+        assert len(response.read()) == 1024
+
+    response = _get(f"{server_url}/media/BVTEST_64K.mp3", {"If-None-Match": etag})
+    assert response.status == 304
+
+
+def test_media_url_finds_file_in_hashed_layout(server_url, data_dir):
+    media = data_dir / "media" / "BVTEST_64K.mp3"
+    content = media.read_bytes()
+    migrate_media_layout(data_dir / "media", "hashed")
+    assert not media.exists()
+
+    with _get(f"{server_url}/media/BVTEST_64K.mp3") as response:
+        assert response.read() == content
+
+
+def test_parse_range_header():
+    assert parse_range_header(None, 100) is None
+    assert parse_range_header("bytes=0-9", 100) == [(0, 9)]
+    assert parse_range_header("bytes=90-", 100) == [(90, 99)]
+    assert parse_range_header("bytes=-10, 50-500", 100) == [(90, 99), (50, 99)]
+    assert parse_range_header("bytes=200-300", 100) == []
+    assert parse_range_header("bytes=9-0", 100) is None
+    assert parse_range_header("items=0-9", 100) is None
+
+
+def test_media_single_range_returns_206(server_url, data_dir):
+    content = (data_dir / "media" / "BVTEST_64K.mp3").read_bytes()
+
+    with _get(
+        f"{server_url}/media/BVTEST_64K.mp3", {"Range": "bytes=100-199"}
+    ) as response:
+        assert response.status == 206
+        assert response.headers["Content-Range"] == "bytes 100-199/1024"
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.read() == content[100:200]
+
+    response = _get(f"{server_url}/media/BVTEST_64K.mp3", {"Range": "bytes=5000-"})
+    assert response.status == 416
+    assert response.headers["Content-Range"] == "bytes */1024"
+
+
+def test_media_multi_range_returns_multipart(server_url, data_dir):
+    content = (data_dir / "media" / "BVTEST_64K.mp3").read_bytes()
+
+    with _get(
+        f"{server_url}/media/BVTEST_64K.mp3", {"Range": "bytes=0-9,-10"}
+    ) as response:
+        assert response.status == 206
+        content_type = response.headers["Content-Type"]
+        assert content_type.startswith("multipart/byteranges; boundary=")
+        body = response.read()
+
+    assert int(response.headers["Content-Length"]) == len(body)
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    parts = message.get_payload()
+    assert [part["Content-Range"] for part in parts] == [
+        "bytes 0-9/1024",
+        "bytes 1014-1023/1024",
+    ]
+    assert [part.get_payload(decode=True) for part in parts] == [
+        content[:10],
+        content[-10:],
+    ]
+
+
+def test_media_if_range_mismatch_sends_full_body(server_url):
+    with _get(
+        f"{server_url}/media/BVTEST_64K.mp3",
+        {"Range": "bytes=0-9", "If-Range": '"stale"'},
+    ) as response:
+        assert response.status == 200
+        assert len(response.read()) == 1024
+
+
+def test_keep_alive_serves_several_requests_per_connection(web_server):
+    connection = http.client.HTTPConnection(*web_server.server_address, timeout=2)
+    try:
+        for _ in range(3):
+            connection.request("GET", "/test.xml")
+            response = connection.getresponse()
+            assert response.status == 200
+            assert response.getheader("Connection") == "keep-alive"
+            response.read()
+
+        connection.request("HEAD", "/media/BVTEST_64K.mp3")
+        response = connection.getresponse()
+        assert response.getheader("Content-Length") == "1024"
+        assert response.read() == b""
+    finally:
+        connection.close()
+
+
+def test_connections_beyond_cap_are_rejected(web_server):
+    idle = [
+        socket.create_connection(web_server.server_address, timeout=2)
+        for _ in range(4)
+    ]
+    try:
+        time.sleep(0.2)
+        response = _get(f"http://127.0.0.1:{web_server.server_address[1]}/test.xml")
+        assert response.status == 503
+    finally:
+        for sock in idle:
+            sock.close()
+
+
+def test_paths_outside_data_dir_are_not_served(server_url):
+    assert _get(f"{server_url}/media/../../etc/passwd").status == 404
+    assert _get(f"{server_url}/static/%2e%2e/%2e%2e/main.py").status == 404
+    assert _get(f"{server_url}/static/images/favicon.png").status == 200
+
+
+def test_feed_is_served_from_cache_until_regenerated(server_url, data_dir):
+    xml_path = data_dir / "test.xml"
+    with _get(f"{server_url}/test.xml") as response:
+        assert response.read() == xml_path.read_bytes()
+    assert len(FILE_CACHE) >= 1
+
+    # A rewritten feed changes mtime/size and replaces the cached entry
+    xml_path.write_text("<rss><item/></rss>", encoding="utf-8")
+    with _get(f"{server_url}/test.xml", {"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["Content-Encoding"] is None
+        assert response.read() == b"<rss><item/></rss>"
+
+
+def test_file_cache_evicts_least_recently_used():
+    cache = FileCache(max_bytes=400)
+    for name in "abc":
+        cache.put(name, CachedFile((0, 100), 0, variants={None: (b"x" * 100, '"e"')}))
+    cache.get("a", (0, 100))
+    cache.put("d", CachedFile((0, 100), 0, variants={None: (b"x" * 100, '"e"')}))
+    cache.put("e", CachedFile((0, 100), 0, variants={None: (b"x" * 100, '"e"')}))
+
+    assert cache.get("b", (0, 100)) is None
+    assert cache.get("a", (0, 100)) is not None
+    assert cache.get("a", (1, 100)) is None
+    assert cache.size <= 400
+    big = CachedFile((0, 200), 0, variants={None: (b"x" * 200, '"e"')})
+    assert not cache.put("big", big)
+
+
+def test_static_assets_are_compressed_and_cacheable(server_url):
+    with _get(f"{server_url}/", {"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Cache-Control"] == "no-store"
+        assert b"<html" in gzip.decompress(response.read()).lower()
+
+    with _get(f"{server_url}/static/images/favicon.png") as response:
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "max-age=86400"
+    response = _get(f"{server_url}/static/images/favicon.png", {"If-None-Match": etag})
+    assert response.status == 304
+
+
+@contextlib.contextmanager
+def _accel_proxy(upstream_address, data_dir, internal_prefix="/internal/"):
+    """Stand-in for nginx: forwards requests, resolves X-Accel-Redirect locally."""
+
+    class ProxyHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            upstream = http.client.HTTPConnection(*upstream_address, timeout=2)
+            try:
+                upstream.request("GET", self.path)
+                response = upstream.getresponse()
+                body = response.read()
+                redirect = response.getheader("X-Accel-Redirect")
+                status = response.status
+                content_type = response.getheader("Content-Type")
+            finally:
+                upstream.close()
+
+            if redirect is not None:
+                assert body == b""
+                assert redirect.startswith(internal_prefix)
+                relative_path = unquote(redirect[len(internal_prefix) :])
+                body = (data_dir / relative_path).read_bytes()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    proxy = ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+    thread = threading.Thread(target=proxy.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{proxy.server_address[1]}"
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+        thread.join(timeout=2)
+
+
+def test_accel_redirect_offloads_media_to_proxy(data_dir):
+    config = ServerConfig(
+        bind_address="127.0.0.1", port=0, offload="x-accel-redirect"
+    )
+    with _running_server(config, data_dir) as server:
+        direct_url = f"http://127.0.0.1:{server.server_address[1]}"
+        with _get(f"{direct_url}/media/BVTEST_64K.mp3") as response:
+            assert (
+                response.headers["X-Accel-Redirect"]
+                == "/internal/media/BVTEST_64K.mp3"
+            )
+            assert response.headers["Content-Type"] == "audio/mpeg"
+            assert response.read() == b""
+
+        # Feeds are still served by bilipod unless offload_feeds is set
+        with _get(f"{direct_url}/test.xml") as response:
+            assert response.headers["X-Accel-Redirect"] is None
+
+        with _accel_proxy(server.server_address, data_dir) as proxy_url:
+            with _get(f"{proxy_url}/media/BVTEST_64K.mp3") as response:
+                assert response.read() == (
+                    data_dir / "media" / "BVTEST_64K.mp3"
+                ).read_bytes()
+            assert _get(f"{proxy_url}/media/missing.mp3").status == 404
+            assert _get(f"{proxy_url}/media/../../etc/passwd").status == 404
+
+
+def test_x_sendfile_points_at_data_dir(data_dir):
+    config = ServerConfig(
+        bind_address="127.0.0.1",
+        port=0,
+        offload="x-sendfile",
+        offload_prefix="/srv/bilipod",
+        offload_feeds=True,
+    )
+    with _running_server(config, data_dir) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with _get(f"{url}/media/BVTEST_64K.mp3") as response:
+            assert (
+                response.headers["X-Sendfile"] == "/srv/bilipod/media/BVTEST_64K.mp3"
+            )
+        with _get(f"{url}/test.xml") as response:
+            assert response.headers["X-Sendfile"] == "/srv/bilipod/test.xml"
+
+
+def test_metrics_endpoint_reports_web_requests(server_url):
+    with _get(f"{server_url}/test.xml") as response:
+        response.read()
+
+    with _get(f"{server_url}/metrics") as response:
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.read().decode("utf-8")
+
+    assert 'bilipod_http_requests_total{route="feed",status="200"}' in text
+    assert "# TYPE bilipod_download_bytes_total counter" in text
+
+
+def test_metrics_endpoint_is_local_only_by_default(server_url, data_dir):
+    # Loopback, but relayed by a reverse proxy for a remote client
+    forwarded = _get(f"{server_url}/metrics", {"X-Forwarded-For": "203.0.113.7"})
+    assert forwarded.status == 404
+
+    pod_tbl = TinyDB(storage=MemoryStorage).table("pod")
+    with _running_server(
+        ServerConfig(bind_address="127.0.0.1", port=0, metrics="off"),
+        data_dir,
+        pod_tbl,
+    ) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        assert _get(url).status == 404
+    with _running_server(
+        ServerConfig(bind_address="127.0.0.1", port=0, metrics="public"),
+        data_dir,
+        pod_tbl,
+    ) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with _get(url, {"X-Forwarded-For": "203.0.113.7"}) as response:
+            assert response.status == 200
+
+
+def test_admin_endpoints_queue_jobs_behind_a_token(data_dir, monkeypatch):
+    jobs = JobQueue()
+    monkeypatch.setattr(web_server_module, "ADMIN_JOBS", jobs)
+    db = TinyDB(storage=MemoryStorage)
+    pod_tbl = db.table("pod")
+    pod_tbl.insert(
+        Pod(
+            feed_id="feed.test",
+            base_url="http://localhost",
+            data_dir=data_dir,
+            episodes=[{"bvid": "BVTEST", "pubdate": 1}],
+        ).to_dict()
+    )
+    auth = {"Authorization": "Bearer secret"}
+
+    def post(url, headers=None):
+        return _get(Request(url, data=b"", headers=headers or {}, method="POST"))
+
+    with _running_server(
+        ServerConfig(bind_address="127.0.0.1", port=0, admin_token="secret"),
+        data_dir,
+        pod_tbl,
+    ) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}/admin"
+
+        assert post(f"{url}/feeds/test/refresh").status == 401
+        wrong = {"Authorization": "Bearer wrong"}
+        assert post(f"{url}/feeds/test/refresh", wrong).status == 401
+        # Not accepting jobs until the job runner starts
+        assert post(f"{url}/feeds/test/refresh", auth).status == 503
+
+        jobs.start()
+        with post(f"{url}/feeds/test/refresh", auth) as response:
+            assert response.status == 202
+            job = json.loads(response.read())
+            assert response.headers["Location"] == f"/admin/jobs/{job['id']}"
+        assert (job["kind"], job["target"], job["status"]) == (
+            "refresh",
+            "feed.test",
+            "queued",
+        )
+        assert post(f"{url}/episodes/BVTEST/retry", auth).status == 202
+        assert post(f"{url}/feeds/missing/regenerate", auth).status == 404
+        assert post(f"{url}/episodes/BVMISSING/retry", auth).status == 404
+        assert _get(f"{url}/feeds/test/refresh", auth).status == 405
+
+        with _get(f"{url}/jobs/{job['id']}", auth) as response:
+            assert json.loads(response.read())["id"] == job["id"]
+        with _get(f"{url}/jobs", auth) as response:
+            status = json.loads(response.read())
+        assert status["queues"]["admin_jobs"] == 2
+        assert [entry["kind"] for entry in status["jobs"]] == ["retry", "refresh"]
+
+    with _running_server(
+        ServerConfig(bind_address="127.0.0.1", port=0), data_dir, pod_tbl
+    ) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}/admin"
+        assert _get(f"{url}/jobs", auth).status == 404